@@ -2,11 +2,9 @@ import argparse
 import os
 from typing import Type
 
-from kubedeployer import deploy
+from kubedeployer import deploy, plan
+from kubedeployer.deployer import DEPLOYERS
 from kubedeployer.deployer.abstract_deployer import AbstractDeployer
-from kubedeployer.deployer.kustomize_deployer import KustomizeDeployer
-from kubedeployer.deployer.orthodox_deployer import OrthodoxDeployer
-from kubedeployer.deployer.smart_deployer import SmartDeployer
 
 __all__ = ['run_kubedeployer']
 
@@ -50,24 +48,59 @@ def run_kubedeployer():
     parser.add_argument(
         "--manifest-folder",
         type=str,
-        help="path to folder with manifest, path is relative to current working directory",
+        nargs="+",
+        action="extend",
+        help="path to folder with manifest, path is relative to current working directory, "
+             "several folders are deployed as applications of one plan",
+    )
+
+    parser.add_argument(
+        "--plan",
+        type=str,
+        help="path to plan file with applications deployed at the same time",
+    )
+
+    parser.add_argument(
+        "--kube-url",
+        type=str,
+        nargs="+",
+        action="extend",
+        help="url of Kubernetes cluster, manifests are rendered once and deployed "
+             "to several clusters at the same time",
     )
 
     args = parser.parse_args()
     deployer_type = args.deployer
     dry_run = args.dry_run
-    if args.manifest_folder:
-        os.environ[specification.MANIFEST_FOLDER_ENV_VAR] = args.manifest_folder
+    if args.plan and args.manifest_folder:
+        parser.error("argument --plan: not allowed with argument --manifest-folder")
+    kube_urls = list(dict.fromkeys(args.kube_url or ()))
+    is_plan = args.plan or len(args.manifest_folder or ()) > 1
+    if is_plan and len(kube_urls) > 1:
+        parser.error("argument --kube-url: several clusters are not allowed with several applications")
+    if len(kube_urls) == 1:
+        os.environ[specification.KUBE_URL_ENV_VAR] = kube_urls[0]
+    if args.manifest_folder and len(args.manifest_folder) == 1:
+        os.environ[specification.MANIFEST_FOLDER_ENV_VAR] = args.manifest_folder[0]
     if args.project_dir:
         os.environ[specification.CI_PROJECT_DIR_ENV_VAR] = args.project_dir
     if args.environment:
         os.environ[specification.ENVIRONMENT_ENV_VAR] = args.environment
     if dry_run:
         os.environ[specification.CI_PROJECT_ID_ENV_VAR] = '0'
-    deployer_classes = {
-        'orthodox': OrthodoxDeployer,
-        'kustomize': KustomizeDeployer,
-        'smart': SmartDeployer
-    }
-    deployer: Type[AbstractDeployer] = deployer_classes[deployer_type]
-    deploy.run(deployer=deployer, dry_run=dry_run, env_files=args.env_file)
+
+    if is_plan:
+        if args.plan:
+            deploy_plan = plan.Plan.load(args.plan)
+        else:
+            deploy_plan = plan.Plan.from_folders(args.manifest_folder, deployer=deployer_type)
+        plan.run(deploy_plan, dry_run=dry_run, env_files=args.env_file)
+        return
+
+    deployer: Type[AbstractDeployer] = DEPLOYERS[deployer_type]
+    deploy.run(
+        deployer=deployer,
+        dry_run=dry_run,
+        env_files=args.env_file,
+        kube_urls=kube_urls if len(kube_urls) > 1 else None,
+    )
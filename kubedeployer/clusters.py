@@ -0,0 +1,114 @@
+import threading
+from contextlib import contextmanager, ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from prettytable import PrettyTable, PLAIN_COLUMNS
+
+from kubedeployer import console
+from kubedeployer.environ import override_environ
+from kubedeployer.gitlab_ci import specification
+
+
+class ClusterError(Exception):
+    pass
+
+
+class ClusterSkipped(ClusterError):
+    pass
+
+
+@dataclass
+class Cluster:
+    """
+    Target cluster with its own kubeconfig
+
+    Variables of the cluster override KUBE_URL and KUBECONFIG in the
+    context of the cluster, so kubectl and Kubernetes API clients of
+    clusters deployed at the same time never share configuration.
+    """
+
+    url: str
+    name: str
+    kubeconfig: Path
+    status: str = "pending"
+    error: Optional[str] = None
+
+    def get_variables(self) -> Dict[str, str]:
+        return {
+            specification.KUBE_URL_ENV_VAR: self.url,
+            "KUBECONFIG": str(self.kubeconfig),
+        }
+
+    @contextmanager
+    def context(self) -> Iterator[None]:
+        with override_environ(self.get_variables()), console.prefixed(f"[{self.name}] "):
+            yield
+
+
+def create_clusters(urls: Iterable[str], work_path: Path) -> List[Cluster]:
+    """
+    Returns clusters of unique urls, kubeconfig of every cluster is kept
+    in its own directory of `work_path`
+
+    Example:
+
+        >>> create_clusters(["https://eu.kube.local", "https://us.kube.local:6443"], tmp_path)
+        [Cluster(url='https://eu.kube.local', name='eu.kube.local', ...),
+         Cluster(url='https://us.kube.local:6443', name='us.kube.local:6443', ...)]
+    """
+    clusters = []
+    for i, url in enumerate(dict.fromkeys(urls)):
+        name = urlparse(url).netloc or url
+        directory = work_path / "clusters" / str(i)
+        directory.mkdir(parents=True, exist_ok=True)
+        clusters.append(Cluster(url=url, name=name, kubeconfig=directory / "config"))
+    return clusters
+
+
+class RolloutPolicy:
+    """
+    Limit of clusters applying and rolling out at the same time
+
+    Clusters wait for a free slot, `parallelism` 0 means all clusters
+    at once. With `fail_fast` clusters not started yet are skipped after
+    the failure of any cluster (ex.: to deploy one by one and stop on
+    the first broken region).
+
+    Example:
+
+        >>> policy = RolloutPolicy(parallelism=1, fail_fast=True)
+        >>> with policy.slot():
+        ...     apply_manifests(manifests, manifests_filename)
+        ...     wait_for_rollouts(manifests)
+    """
+
+    def __init__(self, parallelism: int = 0, fail_fast: bool = True):
+        self._semaphore = threading.BoundedSemaphore(parallelism) if parallelism > 0 else None
+        self.fail_fast = fail_fast
+        self._failed = threading.Event()
+
+    def mark_failed(self):
+        self._failed.set()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with ExitStack() as stack:
+            if self._semaphore:
+                stack.enter_context(self._semaphore)
+            if self.fail_fast and self._failed.is_set():
+                raise ClusterSkipped("Skipped after failure on other cluster")
+            yield
+
+
+def format_statuses(clusters: List[Cluster]) -> str:
+    table = PrettyTable(field_names=["Cluster", "Status", "Error"])
+    table.set_style(PLAIN_COLUMNS)
+    table.align["Cluster"] = "l"
+    table.align["Error"] = "l"
+    for cluster in clusters:
+        error = (cluster.error or "").strip().split("\n", maxsplit=1)[0]
+        table.add_row([cluster.name, cluster.status, error])
+    return table.get_string()
@@ -1,11 +1,84 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import partial
-from typing import Callable
+from typing import Callable, Iterator, List, Optional
 
 from kubedeployer.console.wrap import colorize, Color, timestamp, success, TAB, indent
 from kubedeployer.console.wrap import error as error_colorize
 from kubedeployer.console.wrap import warning as warning_colorize
 
-write = partial(print, end="", flush=True)
+_lock = threading.Lock()
+
+# Prefix of every line written in the current context (ex.: name of the
+# application when several applications are deployed at the same time)
+_prefix: ContextVar[str] = ContextVar("console_prefix", default="")
+
+# Text written in the current context is kept here instead of printing
+# when output is buffered (ex.: by a stage running with other stages)
+_buffer: ContextVar[Optional[List[str]]] = ContextVar("console_buffer", default=None)
+
+
+@contextmanager
+def prefixed(prefix: str) -> Iterator[None]:
+    """
+    Prefix lines written in the current context
+
+    Example:
+
+        >>> with prefixed("[api] "):
+        ...     writeln("Manifest files ready")
+        [api] Manifest files ready
+    """
+    token = _prefix.set(prefix)
+    try:
+        yield
+    finally:
+        _prefix.reset(token)
+
+
+@contextmanager
+def buffered() -> Iterator[None]:
+    """
+    Keep text written in the current context and write it at once on exit,
+    so output of concurrent stages isn't mixed
+
+    Example:
+
+        >>> with buffered():
+        ...     writeln("Building manifests..")
+        ...     writeln("Manifest files ready")
+        Building manifests..
+        Manifest files ready
+    """
+    buffer: List[str] = []
+    token = _buffer.set(buffer)
+    try:
+        yield
+    finally:
+        _buffer.reset(token)
+        if buffer:
+            _output("".join(buffer), flush=True)
+
+
+def _output(text: str, flush: bool):
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.append(text)
+        return
+    # Stages can be running concurrently, lock keeps messages unbroken
+    with _lock:
+        print(text, end="", flush=flush)
+
+
+def write(*args, end: str = "", flush: bool = True):
+    text = " ".join(str(a) for a in args) + end
+    prefix = _prefix.get()
+    if prefix:
+        text = "".join(prefix + line for line in text.splitlines(keepends=True))
+    _output(text, flush=flush)
+
+
 writeln = partial(write, end="\n")
 
 info: Callable[[str, str], str] = lambda text, prefix: writeln(indent(text, prefix))
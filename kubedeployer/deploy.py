@@ -4,49 +4,107 @@ import os
 import random
 import string
 import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Type, List
+from typing import Any, Callable, Dict, Type, List, Iterable, Iterator, Tuple, Optional
 
-from hvac.exceptions import InvalidPath as VaultInvalidPath
+import yaml
 from dotenv import load_dotenv
+from hvac.exceptions import InvalidPath as VaultInvalidPath
 
 from kubedeployer import console, kubectl
+from kubedeployer.clusters import Cluster, ClusterError, ClusterSkipped, RolloutPolicy, \
+    create_clusters, format_statuses
 from kubedeployer.deployer.abstract_deployer import AbstractDeployer
 from kubedeployer.docker import is_docker_login
 from kubedeployer.gitlab_ci.environment_variables import settings
+from kubedeployer.k8s.apply import ServerSideApplier, ApplyError
+from kubedeployer.k8s.client import create_api_client
+from kubedeployer.k8s.diff import ServerSideDiffer
+from kubedeployer.k8s.fingerprint import fingerprint_manifests, select_changed
+from kubedeployer.k8s.rollout import RolloutTracker, RolloutError
 from kubedeployer.kubectl import KubectlError
-from kubedeployer.manifests import get_manifests, ROLLOUT_RESOURCES, get_images
+from kubedeployer.manifests import ROLLOUT_RESOURCES, Manifest, ManifestSet
+from kubedeployer.pipeline import Pipeline, Stage, StageResults
+from kubedeployer.profiling import profiler
 from kubedeployer.security.kubesec import create_kube_security_report
 from kubedeployer.security.trivy import create_trivy_report
 from kubedeployer.types import PathLike
-from kubedeployer.vault.factory import VaultServiceFactory
+from kubedeployer.utils.convert import duration_to_seconds
+from kubedeployer.vault.factory import VaultServiceFactory, VaultPathIndexFactory
+from kubedeployer.vault.index import VaultPathIndex
+from kubedeployer.vault.service import VaultService, order_by_similarity
 
 
-def read_kube_token(kube_url):
-    vault_service = VaultServiceFactory.create_vault_service()
+def find_kube_secret(vault_service: VaultService, kube_url: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Returns path and data of the Vault secret of the cluster
 
+    Secrets matching VAULT_SECRETS_PREFIX are read concurrently, starting
+    from paths that are similar to the cluster URL, until the secret with
+    the cluster URL is found.
+    """
     path, secret = settings.vault_secret_prefix.value.rsplit("/", maxsplit=1)
-    paths = list(vault_service.get_paths(path))
-    secrets = list(str(Path(p) / secret) for p in paths)
+    secrets = [str(Path(p) / secret) for p in vault_service.get_paths(path)]
 
-    kube_tokens = {}
-    for s in secrets:
+    found = vault_service.find_secret(
+        order_by_similarity(secrets, kube_url),
+        predicate=lambda data: data.get("url") == kube_url,
+        max_workers=settings.vault_workers.value,
+    )
+    if found is None:
+        raise KeyError(f"Secret for {kube_url} not found")
+    return found
+
+
+def read_kube_token(kube_url: str, vault_service: Optional[VaultService] = None,
+                    index: Optional[VaultPathIndex] = None) -> str:
+    """
+    Returns token of the cluster from Vault, service and index of Vault
+    paths are created if they are not given
+    """
+    vault_service = vault_service or VaultServiceFactory.create_vault_service()
+    index = index or VaultPathIndexFactory.create_vault_path_index()
+
+    path = index and index.get(kube_url)
+    if path:
         try:
-            data = vault_service.read_secret(s)
+            data = vault_service.read_secret(path)
         except VaultInvalidPath:
-            pass
-        else:
-            kube_tokens[data["url"]] = data["token"]
-    return kube_tokens[kube_url]
+            data = None
+        if data and data.get("url") == kube_url:
+            return data["token"]
+
+    path, data = find_kube_secret(vault_service, kube_url)
+    if index:
+        try:
+            index.set(kube_url, path)
+        except OSError as e:
+            console.warning(f"Vault path of {kube_url} is not cached: {e}")
+    return data["token"]
+
+
+def connect_vault() -> Tuple[Optional[VaultService], Optional[VaultPathIndex]]:
+    """Returns Vault service and index of paths shared by clusters"""
+    try:
+        vault_service = VaultServiceFactory.create_vault_service()
+    except Exception as e:
+        console.warning(f"Problem with connecting to vault. Detail:{str(e)}")
+        vault_service = None
+    return vault_service, VaultPathIndexFactory.create_vault_path_index()
 
 
-def config_kubectl():
+def config_kubectl(vault_service: Optional[VaultService] = None,
+                   index: Optional[VaultPathIndex] = None):
     kube_url = settings.kube_url.value
     kube_namespace = settings.kube_namespace.value
 
     kube_token = settings.kube_token.value
     try:
-        kube_token = read_kube_token(kube_url)
+        kube_token = read_kube_token(kube_url, vault_service, index)
     except Exception as e:
         console.warning(
             f"Problem with reading kube_token from vault. "
@@ -71,10 +129,10 @@ def load_environment_variables(env_files: List[str] | None = None):
         load_dotenv(dotenv_path=file, override=True)
 
 
-def print_kubesec_report(filename: PathLike):
+def print_kubesec_report(manifests: ManifestSet):
     try:
         report = create_kube_security_report()
-        data = report.build(filename)
+        data = report.build_manifests(manifests)
         console.info(data, console.TAB)
     except Exception as e:
         console.error(str(e))
@@ -86,82 +144,393 @@ def get_trivy_image_pattern() -> str:
            or r".+"
 
 
-def print_trivy_report(*images: str):
+def login_to_registry() -> bool:
     username = os.getenv("CI_REGISTRY_USER")
     password = os.getenv("CI_REGISTRY_PASSWORD")
     server = os.getenv("CI_REGISTRY")
     if not is_docker_login(server, username, password):
         console.error(f"Docker cannot login to {server or 'registry'}")
-        return
+        return False
+    return True
+
 
+def print_trivy_report(*images: str):
     try:
-        report = create_trivy_report()
-        subprocess_timeout = int(os.getenv("SUBPROCESS_TIMEOUT", "1"))
-        for i in images:
-            data = report.build(i, subprocess_timeout)
-            console.info(data, console.TAB)
+        # version of Trivy is read within the same time budget as scans
+        timeout = settings.trivy_timeout.value
+        deadline = time.monotonic() + timeout
+        report = create_trivy_report(timeout=timeout)
+        results = report.build_concurrently(
+            images,
+            max_workers=settings.trivy_workers.value,
+            timeout=max(deadline - time.monotonic(), 0),
+        )
+        for result in results:
+            if result.error:
+                console.error(f"Scan image: {result.image}\n{str(result.error)}")
+            else:
+                console.info(result.report, console.TAB)
     except Exception as e:
         console.error(str(e))
 
 
-def print_diff_manifests(manifests_dir: PathLike):
-    try:
-        diffed_manifests = kubectl.diff_manifests(manifests_dir)
-        console.info(diffed_manifests, console.TAB)
-    except KubectlError as e:
-        console.error(str(e))
+def create_server_side_applier() -> ServerSideApplier:
+    return ServerSideApplier(
+        api_client=create_api_client(),
+        default_namespace=settings.kube_namespace.value or kubectl.DEFAULT_NAMESPACE,
+    )
 
 
-def run(
-        deployer: Type[AbstractDeployer],
-        dry_run: bool = False,
-        env_files: List[str] | None = None
-):
-    try:
-        console.stage("Let's deploy it!")
+def print_diff_manifests(manifests_filename: PathLike, manifests: Optional[ManifestSet] = None):
+    if settings.kube_backend.value != "api":
+        try:
+            diffed_manifests = kubectl.diff_manifests(manifests_filename)
+            console.info(diffed_manifests, console.TAB)
+        except KubectlError as e:
+            console.error(str(e))
+        return
 
-        os.environ['DEPLOY'] = ''.join(random.sample(
-            string.digits + string.ascii_letters, 32))
-        load_environment_variables(env_files)
+    if manifests is None:
+        manifests = ManifestSet.parse(Path(manifests_filename).read_text(encoding="utf-8"))
+    differ = ServerSideDiffer(
+        applier=create_server_side_applier(),
+        max_workers=settings.kube_diff_workers.value,
+    )
+    diffs = differ.diff(manifests)
+    for diff in diffs:
+        if diff.error:
+            console.error(diff.summary())
+        else:
+            console.info(diff.summary(), console.TAB)
+    for diff in diffs:
+        if diff.text:
+            console.info(diff.text, console.TAB)
+
+
+def apply_manifests(manifests: ManifestSet, manifests_filename: PathLike,
+                    changed_filename: Optional[PathLike] = None):
+    objects = list(manifests)
+    applier = None
+    if settings.kube_skip_unchanged.value:
+        applier = create_server_side_applier()
+        objects, unchanged = select_changed(objects, applier)
+        for obj in unchanged:
+            console.info(f"{obj['kind'].lower()}/{obj['metadata']['name']} unchanged", console.TAB)
+        if not objects:
+            return
+        manifests_filename = Path(changed_filename or Path(manifests_filename).with_name("changed-manifests.yaml"))
+        manifests_filename.write_text(yaml.safe_dump_all(objects), encoding="utf-8")
 
-        tmp_path = Path(tempfile.mkdtemp())
-        need_show_manifests = settings.show_manifests.value
+    if settings.kube_backend.value != "api":
+        applied_manifests = kubectl.apply_manifests(manifests_filename)
+        console.info(applied_manifests, console.TAB)
+        return
 
-        project_path = Path(settings.ci_project_dir.value)
-        manifests_path = project_path / settings.manifest_folder.value
+    applier = applier or create_server_side_applier()
+    failed = []
+    for result in applier.apply(objects):
+        if result.succeeded:
+            console.info(str(result), console.TAB)
+        else:
+            console.error(f"{result}: {result.message}")
+            failed.append(f"{result.kind.lower()}/{result.name}")
 
-        manifests_content, manifests_filename = deployer.deploy(tmp_path, manifests_path)
+    if failed:
+        raise ApplyError(f"Apply failed for {', '.join(failed)}")
 
-        console.stage("Manifest files ready")
-        if need_show_manifests or dry_run:
-            console.info(manifests_content, console.TAB)
 
-        if dry_run:
-            return
+def wait_for_rollouts(manifests: Iterable[Manifest]):
+    tracker = RolloutTracker(
+        api_client=create_api_client(),
+        timeout=duration_to_seconds(settings.deploy_wait_timeout.value),
+    )
+    statuses = tracker.track(
+        manifests,
+        default_namespace=settings.kube_namespace.value or kubectl.DEFAULT_NAMESPACE,
+    )
+
+    failed = []
+    for status in statuses:
+        if status.succeeded:
+            console.info(status.message, console.TAB)
+        else:
+            console.error(status.message)
+            failed.append(f"{status.kind.lower()}/{status.name}")
+
+    if failed:
+        raise RolloutError(f"Rollout failed for {', '.join(failed)}")
 
-        console.stage("Scanning images..")
-        image_pattern = get_trivy_image_pattern()
-        images = set(get_images(manifests_content, pattern=image_pattern))
-        print_trivy_report(*images)
 
-        console.stage("Scanning manifests..")
-        print_kubesec_report(manifests_filename)
+def print_profile_report():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
 
-        config_kubectl()
+    console.stage("Time and memory usage of stages")
+    console.info(profiler.format(), console.TAB)
 
+    report_filename = settings.profile_report_file.value
+    if report_filename:
+        try:
+            profiler.dump(report_filename)
+        except OSError as e:
+            console.error(str(e))
+
+
+@dataclass
+class DeployOptions:
+    """
+    Options of deploy stages
+
+    `logged_in` are results of login stages done before (ex.: once for
+    all applications of the plan), `clusters` are deployed at the same
+    time instead of the cluster of KUBE_URL.
+    """
+
+    dry_run: bool = False
+    logged_in: Optional[StageResults] = None
+    clusters: Optional[List[Cluster]] = None
+
+
+def create_login_stages(with_kubectl: bool = True) -> List[Stage]:
+    """
+    Returns stages of login to docker registry and cluster, kubectl is
+    not configured if clusters are configured by their own stages
+    """
+    stages = [Stage("docker_login", lambda _: login_to_registry())]
+    if with_kubectl:
+        stages.append(Stage("kubectl", lambda _: config_kubectl()))
+    return stages
+
+
+def create_cluster_stages(
+        cluster: Cluster,
+        policy: RolloutPolicy,
+        security_scans: Tuple[str, ...] = (),
+) -> List[Stage]:
+    """
+    Returns stages of configuring, diffing, applying and rolling out
+    manifests on the cluster
+
+    Stages run in the context of the cluster, apply and rollout wait for
+    a slot of the rollout policy. Failure of the cluster is kept by the
+    cluster, it is raised only if the policy is fail fast.
+    """
+
+    def in_cluster(action: Callable[[StageResults], Any]) -> Callable[[StageResults], Any]:
+        def run_action(results: StageResults) -> Any:
+            if cluster.error:
+                return None
+            with cluster.context():
+                try:
+                    return action(results)
+                except ClusterSkipped as e:
+                    # Skipped clusters are not errors of the pipeline, so
+                    # the error of the failed cluster is the one raised
+                    cluster.status = "skipped"
+                    cluster.error = str(e)
+                    console.warning(cluster.error)
+                except Exception as e:
+                    cluster.status = "failed"
+                    cluster.error = str(e)
+                    console.error(cluster.error)
+                    policy.mark_failed()
+                    if policy.fail_fast:
+                        raise
+            return None
+        return run_action
+
+    def diff(results: StageResults):
+        config_kubectl(*results["vault"])
         console.stage("Diff manifests..")
-        print_diff_manifests(tmp_path)
+        _, manifests_filename = results["render"]
+        print_diff_manifests(manifests_filename, results["parse"])
+
+    def rollout(results: StageResults):
+        _, manifests_filename = results["render"]
+        with policy.slot():
+            console.stage("Apply manifests..")
+            apply_manifests(
+                results["parse"],
+                manifests_filename,
+                changed_filename=cluster.kubeconfig.with_name("changed-manifests.yaml"),
+            )
+            console.stage("Waiting for applying changes..")
+            wait_for_rollouts(results["parse"].by_kind(*ROLLOUT_RESOURCES))
+        cluster.status = "succeeded"
+
+    return [
+        Stage(f"diff@{cluster.name}", in_cluster(diff),
+              requires=("parse", "vault")),
+        Stage(f"rollout@{cluster.name}", in_cluster(rollout),
+              requires=(f"diff@{cluster.name}", *security_scans)),
+    ]
+
+
+def create_stages(
+        deployer: Type[AbstractDeployer],
+        tmp_path: Path,
+        manifests_path: Path,
+        options: Optional[DeployOptions] = None,
+) -> List[Stage]:
+    """
+    Returns stages of deploy with their dependencies
+
+    Security scans are required for applying manifests, unless
+    SECURITY_SCANS_NON_BLOCKING is set. Results of login stages done
+    before (`logged_in` of options) are reused instead of login again.
+    Manifests rendered and scanned once are deployed to every cluster of
+    `clusters` of options at the same time, limited by
+    KUBE_ROLLOUT_PARALLELISM.
+    """
+    options = options or DeployOptions()
+
+    def render(_: StageResults) -> Tuple[str, Path]:
+        manifests_content, manifests_filename = deployer.deploy(tmp_path, manifests_path)
 
-        console.stage("Apply manifests..")
-        applied_manifests = kubectl.apply_manifests(manifests_filename)
-        console.info(applied_manifests, console.TAB)
+        console.stage("Manifest files ready")
+        if settings.show_manifests.value or options.dry_run:
+            console.info(manifests_content, console.TAB)
+        return manifests_content, manifests_filename
+
+    if options.dry_run:
+        return [Stage("render", render)]
+
+    def parse(results: StageResults) -> ManifestSet:
+        manifests_content, manifests_filename = results["render"]
+        manifests = ManifestSet.parse(manifests_content)
+        if settings.kube_skip_unchanged.value:
+            # Diff and apply must see the same objects, fingerprint is
+            # added before the diff
+            manifests = fingerprint_manifests(manifests)
+            Path(manifests_filename).write_text(manifests.content, encoding="utf-8")
+        return manifests
+
+    def scan_images(results: StageResults):
+        if not results["docker_login"]:
+            return
+        image_pattern = get_trivy_image_pattern()
+        images = set(results["parse"].get_images(pattern=image_pattern))
+        print_trivy_report(*images)
+
+    def scan_manifests(results: StageResults):
+        print_kubesec_report(results["parse"])
+
+    def diff(results: StageResults):
+        _, manifests_filename = results["render"]
+        print_diff_manifests(manifests_filename, results["parse"])
+
+    def apply(results: StageResults):
+        _, manifests_filename = results["render"]
+        apply_manifests(results["parse"], manifests_filename)
+
+    def rollout(results: StageResults):
+        wait_for_rollouts(results["parse"].by_kind(*ROLLOUT_RESOURCES))
+
+    security_scans = ("scan_images", "scan_manifests")
+    if settings.security_scans_non_blocking.value:
+        security_scans = ()
+
+    login_stages = create_login_stages(with_kubectl=not options.clusters)
+    if options.logged_in is not None:
+        login_stages = [
+            Stage(s.name, lambda _, result=options.logged_in[s.name]: result)
+            for s in login_stages
+        ]
+
+    stages = [
+        Stage("render", render),
+        Stage("parse", parse, requires=("render",)),
+        *login_stages,
+        Stage("scan_images", scan_images,
+              requires=("parse", "docker_login"),
+              title="Scanning images.."),
+        Stage("scan_manifests", scan_manifests,
+              requires=("parse",),
+              title="Scanning manifests.."),
+    ]
+
+    if options.clusters:
+        policy = RolloutPolicy(
+            parallelism=settings.kube_rollout_parallelism.value,
+            fail_fast=settings.kube_rollout_fail_fast.value,
+        )
+        return [
+            *stages,
+            Stage("vault", lambda _: connect_vault()),
+            *(
+                stage
+                for cluster in options.clusters
+                for stage in create_cluster_stages(cluster, policy, security_scans)
+            ),
+        ]
+
+    return [
+        *stages,
+        Stage("diff", diff,
+              requires=("parse", "kubectl"),
+              title="Diff manifests.."),
+        Stage("apply", apply,
+              requires=("diff", *security_scans),
+              title="Apply manifests.."),
+        Stage("rollout", rollout,
+              requires=("apply",),
+              title="Waiting for applying changes.."),
+    ]
+
+
+def generate_deploy_id() -> str:
+    return ''.join(random.sample(string.digits + string.ascii_letters, 32))
+
+
+@contextmanager
+def profiled_run() -> Iterator[None]:
+    """Profile stages of the run, error of the run is shown and raised"""
+    profiler.reset()
+    if settings.profile_memory.value:
+        tracemalloc.start()
 
-        console.stage("Waiting for applying changes..")
-        resources = "|".join(ROLLOUT_RESOURCES)
-        for manifest in get_manifests(manifests_content, kind=resources):
-            status = kubectl.check_rollout_status(manifest)
-            console.info(status, console.TAB)
+    try:
+        yield
     except Exception as e:
         console.error(str(e))
         console.writeln()
         raise
+    finally:
+        print_profile_report()
+
+
+def run(
+        deployer: Type[AbstractDeployer],
+        dry_run: bool = False,
+        env_files: List[str] | None = None,
+        kube_urls: List[str] | None = None,
+):
+    with profiled_run():
+        console.stage("Let's deploy it!")
+
+        os.environ['DEPLOY'] = generate_deploy_id()
+        load_environment_variables(env_files)
+
+        tmp_path = Path(tempfile.mkdtemp())
+
+        project_path = Path(settings.ci_project_dir.value)
+        manifests_path = project_path / settings.manifest_folder.value
+
+        clusters = None
+        if kube_urls and not dry_run:
+            clusters = create_clusters(kube_urls, tmp_path)
+
+        stages = create_stages(
+            deployer, tmp_path, manifests_path,
+            DeployOptions(dry_run=dry_run, clusters=clusters),
+        )
+        try:
+            Pipeline(stages).run()
+        finally:
+            if clusters:
+                console.stage("Results of clusters")
+                console.info(format_statuses(clusters), console.TAB)
+
+        failed = [c.name for c in clusters or () if c.status != "succeeded"]
+        if failed:
+            raise ClusterError(f"Deploy failed for {', '.join(failed)}")
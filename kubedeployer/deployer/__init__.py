@@ -0,0 +1,12 @@
+from typing import Dict, Type
+
+from kubedeployer.deployer.abstract_deployer import AbstractDeployer
+from kubedeployer.deployer.kustomize_deployer import KustomizeDeployer
+from kubedeployer.deployer.orthodox_deployer import OrthodoxDeployer
+from kubedeployer.deployer.smart_deployer import SmartDeployer
+
+DEPLOYERS: Dict[str, Type[AbstractDeployer]] = {
+    'orthodox': OrthodoxDeployer,
+    'kustomize': KustomizeDeployer,
+    'smart': SmartDeployer,
+}
@@ -2,11 +2,12 @@ from pathlib import Path
 from typing import List, Tuple
 
 from kubedeployer import console, k8s
-from kubedeployer import kustomize
+from kubedeployer import kustomize, staging
 from kubedeployer.deployer.abstract_deployer import AbstractDeployer
-from kubedeployer.files import YAML_EXTENSIONS, get_files
+from kubedeployer.files import YAML_EXTENSIONS, create_directory_index, get_files
 from kubedeployer.gitlab_ci.environment_variables import settings
-from kubedeployer.text import envsubst
+from kubedeployer.profiling import measured
+from kubedeployer.text import Envsubst
 from kubedeployer.types import PathLike
 
 
@@ -23,11 +24,17 @@ def get_manifests_paths(manifests_path: Path) -> List[PathLike]:
     return paths
 
 
-def get_manifest_files_by_paths(manifests_paths: List[PathLike]) -> List[PathLike]:
-    manifests_files = list(
-        get_files(*manifests_paths, extensions=YAML_EXTENSIONS)
-    )
+def find_manifest_files(manifests_paths: List[PathLike]) -> List[Path]:
+    """Returns yaml files of paths including kustomization, paths are scanned once"""
+    index = create_directory_index()
+    manifests_files = list(get_files(*manifests_paths, extensions=YAML_EXTENSIONS, index=index))
+    if index:
+        index.save()
+    return manifests_files
 
+
+def get_manifest_files_by_paths(manifests_paths: List[PathLike],
+                                manifests_files: List[Path]) -> List[Path]:
     if not manifests_files:
         raise FileExistsError(
             f"Manifests files not found in "
@@ -35,10 +42,6 @@ def get_manifest_files_by_paths(manifests_paths: List[PathLike]) -> List[PathLik
         )
 
     console.info("Kustomization not found, creating..", console.TAB)
-
-    for file in manifests_files:
-        content = envsubst(file.read_text())
-        file.write_text(content)
     return manifests_files
 
 
@@ -51,36 +54,50 @@ def build_manifests_content(kustomization: Path, is_generated: bool, manifests_f
     console.info("\n".join(f"{k}: {v or ''}" for k, v in annotations.items()), console.TAB * 2)
 
     console.stage("Building manifests..")
-    kustomize.build_manifests(kustomization.parent, manifests_filename)
+    kustomize.build_manifests(
+        kustomization.parent, manifests_filename, cache=kustomize.create_build_cache()
+    )
 
     if is_generated:
         manifests_content = manifests_filename.read_text()
     else:
-        manifests_content = envsubst(manifests_filename.read_text())
-        manifests_filename.write_text(manifests_content)
+        Envsubst().file(manifests_filename)
+        manifests_content = manifests_filename.read_text()
     return manifests_content
 
 
 class SmartDeployer(AbstractDeployer):
 
     @staticmethod
+    @measured("SmartDeployer.deploy")
     def deploy(tmp_path: Path, manifests_path: Path) -> Tuple[str, Path]:
         manifests_paths = get_manifests_paths(manifests_path)
 
         console.stage("Searching kustomization..")
         is_generated = False
-        kustomization = kustomize.get_kustomization(*manifests_paths)
-        if not kustomization:
-            manifests_files = get_manifest_files_by_paths(manifests_paths)
-            kustomization = kustomize.create_kustomization(manifests_path, *manifests_files)
-            is_generated = True
-            console.info("Append next resources into kustomization:", console.TAB)
-            console.info("\n".join(f"-{str(f)}" for f in manifests_files), console.TAB * 2)
-        console.info(f"Kustomization location {str(kustomization)}", console.TAB)
-        manifests_filename = tmp_path / "manifests.yaml"
-        content = build_manifests_content(
-            kustomization=kustomization,
-            is_generated=is_generated,
-            manifests_filename=manifests_filename
-        )
+        found_files = find_manifest_files(manifests_paths)
+        kustomization = kustomize.select_kustomization(found_files)
+        # Manifests are rendered in a staging tree, the checkout is never changed
+        with staging.staging_area() as staging_path:
+            if not kustomization:
+                manifests_files = get_manifest_files_by_paths(manifests_paths, found_files)
+                staged_files = staging.stage_files(
+                    manifests_path, staging_path, manifests_files, Envsubst()
+                )
+                kustomization = kustomize.create_kustomization(
+                    staging_path, *(f.relative_to(staging_path) for f in staged_files)
+                )
+                is_generated = True
+                console.info("Append next resources into kustomization:", console.TAB)
+                console.info("\n".join(f"-{str(f)}" for f in manifests_files), console.TAB * 2)
+            else:
+                console.info(f"Kustomization location {str(kustomization)}", console.TAB)
+                # annotations are set by the wrapping kustomization
+                kustomization = kustomize.create_kustomization(staging_path, kustomization.parent)
+            manifests_filename = tmp_path / "manifests.yaml"
+            content = build_manifests_content(
+                kustomization=kustomization,
+                is_generated=is_generated,
+                manifests_filename=manifests_filename
+            )
         return content, manifests_filename
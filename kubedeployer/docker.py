@@ -1,4 +1,8 @@
+import hashlib
+import json
 import subprocess
+from json import JSONDecodeError
+from typing import Optional
 
 
 class DockerError(Exception):
@@ -18,3 +22,33 @@ def is_docker_login(server: str, username: str, password: str) -> bool:
         return True
     except DockerError:
         return False
+
+
+def get_image_digest(image: str, timeout: Optional[float] = None) -> str:
+    """
+    Returns digest of the image from registry
+
+    For multi-platform images digest is calculated by digests of all
+    platform manifests.
+
+    Example:
+
+        >>> get_image_digest("nginx:1.15")
+        sha256:9ad0746d8f2ea6df3a17ba89eca40b48c47066dfab55a75e08e2b70fc80d929e
+    """
+    cmd = f"docker manifest inspect --verbose {image}"
+    try:
+        result = subprocess.run(cmd, capture_output=True, shell=True, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        raise DockerError(f"Inspecting manifest of {image} exceeded {e.timeout:.0f}s timeout") from e
+    if result.returncode != 0:
+        raise DockerError(result.stderr.decode("utf-8"))
+
+    try:
+        data = json.loads(result.stdout)
+        if isinstance(data, dict):
+            return data["Descriptor"]["digest"]
+        digests = sorted(m["Descriptor"]["digest"] for m in data)
+    except (TypeError, KeyError, JSONDecodeError) as e:
+        raise DockerError(f"Invalid manifest of {image}: {str(e)}") from e
+    return f"sha256:{hashlib.sha256(' '.join(digests).encode()).hexdigest()}"
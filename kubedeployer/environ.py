@@ -0,0 +1,42 @@
+import os
+from collections import ChainMap
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Iterator, Mapping
+
+# Variables overriding process environment in the current context, so
+# applications deployed at the same time see their own variables
+_overrides: ContextVar[Mapping[str, str]] = ContextVar(
+    "environ_overrides", default=MappingProxyType({})
+)
+
+
+def get_environ() -> Mapping[str, str]:
+    """Returns process environment with overrides of the current context"""
+    overrides = _overrides.get()
+    if not overrides:
+        return os.environ
+    return ChainMap(overrides, os.environ)
+
+
+@contextmanager
+def override_environ(variables: Mapping[str, str]) -> Iterator[None]:
+    """
+    Override environment variables in the current context
+
+    Process environment is not changed, overrides are seen by settings
+    and substitution of variables of this context only (and threads
+    started with copy of the context).
+
+    Example:
+
+        >>> with override_environ({"MANIFEST_FOLDER": "apps/api"}):
+        ...     settings.manifest_folder.value
+        'apps/api'
+    """
+    token = _overrides.set(MappingProxyType({**_overrides.get(), **variables}))
+    try:
+        yield
+    finally:
+        _overrides.reset(token)
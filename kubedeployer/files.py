@@ -1,8 +1,15 @@
+import fnmatch
 import glob
-from itertools import product
+import json
+import os
+import re
+import time
+import uuid
+from json import JSONDecodeError
 from pathlib import Path
-from typing import Iterator
+from typing import Dict, Iterator, List, Optional, Pattern, Set, Tuple
 
+from kubedeployer.gitlab_ci.environment_variables import settings
 from kubedeployer.types import PathLike
 
 
@@ -11,20 +18,153 @@ EXTENSION_DELIMITER = "|"
 YAML_EXTENSIONS = "*.yml|*.yaml"
 YAML_DEFAULT_EXTENSION = "*.yaml"
 
+# Hidden directories (ex.: .git) are skipped as glob does, these as well
+IGNORED_DIRECTORIES = frozenset({"node_modules", "__pycache__"})
 
-def get_files(*paths: PathLike, extensions: str = "*") -> Iterator[Path]:
+# Listings of directories changed recently are not kept in index, changes
+# made in the same tick of modification time could be missed otherwise
+INDEX_MTIME_MARGIN = 2.0
+
+# Name of entry and whether it is a directory or a file
+Entry = Tuple[str, bool, bool]
+
+
+class DirectoryIndex:
+    """
+    Listings of directories kept between runs
+
+    A listing is reused while modification time of the directory is not
+    changed, so directories are not scanned again.
+
+    Example:
+
+        >>> index = DirectoryIndex("/cache/files/index.json")
+        >>> files = list(get_files("/proj/manifests/**", extensions=YAML_EXTENSIONS, index=index))
+        >>> index.save()
+    """
+
+    def __init__(self, filename: PathLike):
+        self._filename = Path(filename)
+        self._listings: Optional[Dict[str, Tuple[int, List[Entry]]]] = None
+        self._changed = False
+
+    def _load(self) -> Dict[str, Tuple[int, List[Entry]]]:
+        if self._listings is None:
+            try:
+                self._listings = {
+                    directory: (mtime, [tuple(e) for e in entries])
+                    for directory, (mtime, entries) in json.loads(self._filename.read_text(encoding="utf-8")).items()
+                }
+            except (OSError, JSONDecodeError, TypeError, ValueError):
+                self._listings = {}
+        return self._listings
+
+    def list(self, directory: str) -> List[Entry]:
+        """Returns entries of the directory from index or by scanning it"""
+        mtime = os.stat(directory).st_mtime_ns
+        listings = self._load()
+        cached = listings.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        entries = scan_directory(directory)
+        if time.time() - mtime / 1e9 > INDEX_MTIME_MARGIN:
+            listings[directory] = (mtime, entries)
+            self._changed = True
+        return entries
+
+    def save(self):
+        if not self._changed:
+            return
+        self._filename.parent.mkdir(parents=True, exist_ok=True)
+        tmp_filename = self._filename.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_filename.write_text(json.dumps(self._load()), encoding="utf-8")
+        tmp_filename.replace(self._filename)
+        self._changed = False
+
+
+def create_directory_index() -> Optional[DirectoryIndex]:
+    if not settings.cache_dir.value:
+        return None
+    return DirectoryIndex(Path(settings.cache_dir.value) / "files" / "index.json")
+
+
+def scan_directory(directory: str) -> List[Entry]:
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                entries.append((entry.name, entry.is_dir(), entry.is_file()))
+            except OSError:
+                continue
+    return entries
+
+
+def compile_extensions(extensions: str) -> List[Pattern]:
+    return [re.compile(fnmatch.translate(ext)) for ext in extensions.split(EXTENSION_DELIMITER)]
+
+
+def walk_files(directory: str, recursive: bool,
+               index: Optional[DirectoryIndex] = None) -> Iterator[str]:
+    """
+    Returns files of the directory in the order of glob: files of the
+    directory, then files of every subdirectory
+    """
+    try:
+        entries = index.list(directory) if index else scan_directory(directory)
+    except OSError:
+        return
+    subdirectories = []
+    for name, is_dir, is_file in entries:
+        if name.startswith("."):
+            continue
+        if is_file:
+            yield os.path.join(directory, name)
+        elif is_dir and recursive and name not in IGNORED_DIRECTORIES:
+            subdirectories.append(os.path.join(directory, name))
+    for subdirectory in subdirectories:
+        yield from walk_files(subdirectory, recursive, index)
+
+
+def get_files(*paths: PathLike, extensions: str = "*",
+              index: Optional[DirectoryIndex] = None) -> Iterator[Path]:
     """
     Returns files from paths matching extensions
 
+    Every path is scanned once for all extensions, `**` at the end of
+    the path scans subdirectories as well. Files are returned in the same
+    order as by glob of every path and extension.
+
     Example:
 
         >>> get_files("/dir", "/dir/sub/dir/**", extensions="*.yaml|*.json")
         /dir/example.yaml
         /dir/sub/dir/location/example.json
     """
+    patterns = compile_extensions(extensions)
+    found: Set[str] = set()
+    for path in paths:
+        directory, recursive = str(path), False
+        if Path(directory).name == "**":
+            directory, recursive = str(Path(directory).parent), True
+
+        if glob.has_magic(directory):
+            # paths with other templates are searched by glob
+            filenames = (
+                f
+                for ext in extensions.split(EXTENSION_DELIMITER)
+                for f in glob.iglob(str(Path(path) / ext), recursive=recursive)
+            )
+        else:
+            walked = list(walk_files(directory, recursive, index))
+            filenames = (
+                f
+                for pattern in patterns
+                for f in walked
+                if pattern.match(os.path.basename(f))
+            )
 
-    for path, ext in product(paths, extensions.split(EXTENSION_DELIMITER)):
-        pathname = str(Path(path) / ext)
-        recursive = "**" in pathname
-        for f in glob.iglob(pathname, recursive=recursive):
-            yield Path(f)
+        for filename in filenames:
+            if filename not in found:
+                found.add(filename)
+                yield Path(filename)
@@ -137,6 +137,53 @@ class Settings:
         """
         return self._variable_reader.read_str(specification.DEPLOY_WAIT_TIMEOUT_ENV_VAR, default_value='10m')
 
+    @property
+    def kube_backend(self) -> StrVariable:
+        """
+        Backend used for applying manifests: kubectl (client-side apply by
+        kubectl) or api (server-side apply through Kubernetes API).
+        """
+        return self._variable_reader.read_str(specification.KUBE_BACKEND_ENV_VAR, default_value='kubectl')
+
+    @property
+    def kube_diff_workers(self) -> IntVariable:
+        """
+        Number of objects diffed against the cluster at the same time
+        when KUBE_BACKEND is api.
+        """
+        return self._variable_reader.read_int(specification.KUBE_DIFF_WORKERS_ENV_VAR, default_value=8)
+
+    @property
+    def kube_skip_unchanged(self) -> BoolVariable:
+        """
+        Apply only objects whose fingerprint differs from fingerprint
+        annotation of live objects.
+        """
+        return self._variable_reader.read_bool(specification.KUBE_SKIP_UNCHANGED_ENV_VAR, default_value=False)
+
+    @property
+    def kube_rollout_parallelism(self) -> IntVariable:
+        """
+        Number of clusters applying and rolling out manifests at the same
+        time when several clusters are deployed, 0 means all clusters.
+        """
+        return self._variable_reader.read_int(specification.KUBE_ROLLOUT_PARALLELISM_ENV_VAR, default_value=0)
+
+    @property
+    def kube_rollout_fail_fast(self) -> BoolVariable:
+        """
+        Skip clusters not rolled out yet after failure on other cluster.
+        """
+        return self._variable_reader.read_bool(specification.KUBE_ROLLOUT_FAIL_FAST_ENV_VAR, default_value=True)
+
+    @property
+    def cache_dir(self) -> StrVariable:
+        """
+        Directory where results of scanners and builders are cached between
+        runs (ex.: directory cached by CI). Caching is disabled if not set.
+        """
+        return self._variable_reader.read_str(specification.CACHE_DIR_ENV_VAR)
+
     @property
     def ci_runner_tags(self) -> StrVariable:
         """
@@ -209,6 +256,22 @@ class Settings:
         """
         return self._variable_reader.read_str(specification.VAULT_SECRETS_PREFIX_ENV_VAR)
 
+    @property
+    def vault_workers(self) -> IntVariable:
+        """
+        Number of concurrent requests to Vault while listing and
+        searching secrets of the cluster.
+        """
+        return self._variable_reader.read_int(specification.VAULT_WORKERS_ENV_VAR, default_value=8)
+
+    @property
+    def vault_token_cache_file(self) -> StrVariable:
+        """
+        File where Vault token is kept between runs, the token is
+        requested on every run if not set.
+        """
+        return self._variable_reader.read_str(specification.VAULT_TOKEN_CACHE_FILE_ENV_VAR)
+
     @property
     def trivy_image_template(self) -> StrVariable:
         """
@@ -216,5 +279,73 @@ class Settings:
         """
         return self._variable_reader.read_str(specification.TRIVY_IMAGE_TEMPLATE_ENV_VAR)
 
+    @property
+    def trivy_workers(self) -> IntVariable:
+        """
+        Number of docker images scanned by Trivy at the same time.
+        """
+        return self._variable_reader.read_int(specification.TRIVY_WORKERS_ENV_VAR, default_value=4)
+
+    @property
+    def trivy_timeout(self) -> IntVariable:
+        """
+        Time budget (in seconds) for scanning all docker images by Trivy.
+        """
+        return self._variable_reader.read_int(specification.TRIVY_TIMEOUT_ENV_VAR, default_value=600)
+
+    @property
+    def trivy_cache_ttl(self) -> IntVariable:
+        """
+        Time (in seconds) while results of Trivy are kept in cache.
+        """
+        return self._variable_reader.read_int(specification.TRIVY_CACHE_TTL_ENV_VAR, default_value=21600)
+
+    @property
+    def kubesec_engine(self) -> StrVariable:
+        """
+        Engine used for scanning manifests: kubesec (external kubesec
+        binary) or native (rules are evaluated in-process).
+        """
+        return self._variable_reader.read_str(specification.KUBESEC_ENGINE_ENV_VAR, default_value='kubesec')
+
+    @property
+    def kustomize_engine(self) -> StrVariable:
+        """
+        Engine used for building kustomizations: kustomize (external
+        kustomize binary only) or native (common features are rendered
+        in-process, others by kustomize).
+        """
+        return self._variable_reader.read_str(specification.KUSTOMIZE_ENGINE_ENV_VAR, default_value='kustomize')
+
+    @property
+    def security_scans_non_blocking(self) -> BoolVariable:
+        """
+        Apply manifests without waiting for security scans, scans are
+        finished in parallel with applying.
+        """
+        return self._variable_reader.read_bool(specification.SECURITY_SCANS_NON_BLOCKING_ENV_VAR, default_value=False)
+
+    @property
+    def plan_workers(self) -> IntVariable:
+        """
+        Number of applications of the plan deployed at the same time.
+        """
+        return self._variable_reader.read_int(specification.PLAN_WORKERS_ENV_VAR, default_value=4)
+
+    @property
+    def profile_memory(self) -> BoolVariable:
+        """
+        Measure peak of memory allocated on every stage of deploy, memory
+        tracing slows down the deploy, so it is disabled by default.
+        """
+        return self._variable_reader.read_bool(specification.PROFILE_MEMORY_ENV_VAR, default_value=False)
+
+    @property
+    def profile_report_file(self) -> StrVariable:
+        """
+        Path to JSON file where time and memory usage of stages is saved.
+        """
+        return self._variable_reader.read_str(specification.PROFILE_REPORT_FILE_ENV_VAR)
+
 
 settings = Settings()
@@ -13,6 +13,8 @@ VAULT_URL_ENV_VAR = 'VAULT_URL'
 VAULT_APPROLE_ID_ENV_VAR = 'VAULT_APPROLE_ID'
 VAULT_APPROLE_SECRET_ENV_VAR = 'VAULT_APPROLE_SECRET'
 VAULT_SECRETS_PREFIX_ENV_VAR = 'VAULT_SECRETS_PREFIX'
+VAULT_WORKERS_ENV_VAR = 'VAULT_WORKERS'
+VAULT_TOKEN_CACHE_FILE_ENV_VAR = 'VAULT_TOKEN_CACHE_FILE'
 
 # gitlab-ci specific variables
 GITLAB_USER_ID_ENV_VAR = 'GITLAB_USER_ID'
@@ -31,5 +33,26 @@ CI_PIPELINE_ID_ENV_VAR = 'CI_PIPELINE_ID'
 CI_REGISTRY_ENV_VAR = 'CI_REGISTRY'
 
 TRIVY_IMAGE_TEMPLATE_ENV_VAR = 'TRIVY_IMAGE_TEMPLATE'
+TRIVY_WORKERS_ENV_VAR = 'TRIVY_WORKERS'
+TRIVY_TIMEOUT_ENV_VAR = 'TRIVY_TIMEOUT'
+TRIVY_CACHE_TTL_ENV_VAR = 'TRIVY_CACHE_TTL'
+
+KUBESEC_ENGINE_ENV_VAR = 'KUBESEC_ENGINE'
+
+KUSTOMIZE_ENGINE_ENV_VAR = 'KUSTOMIZE_ENGINE'
+
+SECURITY_SCANS_NON_BLOCKING_ENV_VAR = 'SECURITY_SCANS_NON_BLOCKING'
+
+PLAN_WORKERS_ENV_VAR = 'PLAN_WORKERS'
+
+PROFILE_MEMORY_ENV_VAR = 'PROFILE_MEMORY'
+PROFILE_REPORT_FILE_ENV_VAR = 'PROFILE_REPORT_FILE'
 
 DEPLOY_WAIT_TIMEOUT_ENV_VAR = 'DEPLOY_WAIT_TIMEOUT'
+KUBE_BACKEND_ENV_VAR = 'KUBE_BACKEND'
+KUBE_DIFF_WORKERS_ENV_VAR = 'KUBE_DIFF_WORKERS'
+KUBE_SKIP_UNCHANGED_ENV_VAR = 'KUBE_SKIP_UNCHANGED'
+KUBE_ROLLOUT_PARALLELISM_ENV_VAR = 'KUBE_ROLLOUT_PARALLELISM'
+KUBE_ROLLOUT_FAIL_FAST_ENV_VAR = 'KUBE_ROLLOUT_FAIL_FAST'
+
+CACHE_DIR_ENV_VAR = 'KUBEDEPLOYER_CACHE_DIR'
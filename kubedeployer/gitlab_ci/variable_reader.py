@@ -1,7 +1,7 @@
-import os
 from abc import ABCMeta, abstractmethod
 from typing import Optional
 
+from kubedeployer.environ import get_environ
 from kubedeployer.gitlab_ci.exceptions import GitlabCiBaseException
 from kubedeployer.gitlab_ci.variable_types import BaseVariable, BoolVariable, IntVariable, StrVariable
 
@@ -25,8 +25,9 @@ class AbstractVariableReader:
 class EnvironmentVariableReader(AbstractVariableReader):
     @staticmethod
     def _read_env(env_name: str, is_required: bool = False, default_value: object = None) -> BaseVariable:
-        if env_name in os.environ and os.environ[env_name] != '':
-            value = os.getenv(env_name, default_value)
+        environ = get_environ()
+        if env_name in environ and environ[env_name] != '':
+            value = environ[env_name]
         elif not is_required:
             value = default_value
         else:
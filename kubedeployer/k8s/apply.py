@@ -0,0 +1,216 @@
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+FIELD_MANAGER = "kubedeployer"
+
+APPLY_CONTENT_TYPE = "application/apply-patch+yaml"
+METADATA_LIST_ACCEPT = "application/json;as=PartialObjectMetadataList;v=v1;g=meta.k8s.io"
+
+
+class ApplyError(Exception):
+    pass
+
+
+@dataclass
+class ApiResource:
+    name: str
+    namespaced: bool
+
+
+@dataclass
+class ApiRequest:
+    method: str
+    path: str
+    query_params: List[Tuple[str, str]] = field(default_factory=list)
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: Optional[dict] = None
+
+
+@dataclass
+class ApplyResult:
+    kind: str
+    name: str
+    namespace: Optional[str]
+    group: str
+    action: str
+    message: str = ""
+
+    @property
+    def succeeded(self) -> bool:
+        return self.action != "failed"
+
+    def __str__(self) -> str:
+        resource = f"{self.kind.lower()}.{self.group}" if self.group else self.kind.lower()
+        return f"{resource}/{self.name} {self.action}"
+
+
+def get_api_path(api_version: str) -> str:
+    if "/" in api_version:
+        return f"/apis/{api_version}"
+    return f"/api/{api_version}"
+
+
+def get_error_message(e: ApiException) -> str:
+    try:
+        return json.loads(e.body)["message"]
+    except (TypeError, ValueError, KeyError):
+        return e.reason or str(e)
+
+
+class ServerSideApplier:
+    """
+    Apply objects using server-side apply of Kubernetes API
+
+    All requests are sent through one client, so a pooled connection is
+    reused. Objects are applied in the given order and sent as JSON.
+    Resources are discovered once per API version. Whether an object was
+    created, configured or left unchanged is found from the response status
+    and from resource versions. These are listed once per kind and
+    namespace before applying.
+
+    Example:
+
+        >>> applier = ServerSideApplier(api_client, default_namespace="default")
+        >>> for result in applier.apply(manifests):
+        ...     print(result)
+        deployment.apps/application configured
+    """
+
+    def __init__(self,
+                 api_client: client.ApiClient,
+                 default_namespace: str,
+                 field_manager: str = FIELD_MANAGER):
+        self._api_client = api_client
+        self._default_namespace = default_namespace
+        self._field_manager = field_manager
+        self._resources: Dict[str, Dict[str, ApiResource]] = {}
+        self._metadata: Dict[Tuple[str, str, Optional[str]], Dict[str, dict]] = {}
+
+    @property
+    def default_namespace(self) -> str:
+        return self._default_namespace
+
+    def _request(self, request: ApiRequest) -> Tuple[int, dict]:
+        response, status, _ = self._api_client.call_api(
+            request.path, request.method,
+            query_params=request.query_params,
+            header_params={"Accept": "application/json", **request.headers},
+            body=request.body,
+            auth_settings=["BearerToken"],
+            _preload_content=False,
+            _return_http_data_only=False,
+        )
+        return status, json.loads(response.data)
+
+    def _get_resource(self, api_version: str, kind: str) -> ApiResource:
+        if api_version not in self._resources:
+            _, data = self._request(ApiRequest("GET", get_api_path(api_version)))
+            self._resources[api_version] = {
+                r["kind"]: ApiResource(r["name"], r["namespaced"])
+                for r in data.get("resources") or []
+                if "/" not in r["name"]
+            }
+        try:
+            return self._resources[api_version][kind]
+        except KeyError:
+            raise ApplyError(f'no matches for kind "{kind}" in version "{api_version}"')
+
+    def _get_collection_path(self, api_version: str, resource: ApiResource,
+                             namespace: Optional[str]) -> str:
+        path = get_api_path(api_version)
+        if namespace:
+            path = f"{path}/namespaces/{namespace}"
+        return f"{path}/{resource.name}"
+
+    def _list_metadata(self, api_version: str, kind: str,
+                       namespace: Optional[str]) -> Dict[str, dict]:
+        key = (api_version, kind, namespace)
+        if key not in self._metadata:
+            resource = self._get_resource(api_version, kind)
+            path = self._get_collection_path(api_version, resource, namespace)
+            try:
+                _, data = self._request(ApiRequest("GET", path, headers={"Accept": METADATA_LIST_ACCEPT}))
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+                data = {}
+            self._metadata[key] = {
+                i["metadata"]["name"]: i["metadata"]
+                for i in data.get("items") or []
+            }
+        return self._metadata[key]
+
+    def get_live_metadata(self, obj: dict) -> Optional[dict]:
+        """
+        Returns metadata of the object on the cluster or None if it does not
+        exist, objects are listed once per kind and namespace
+        """
+        _, namespace = self.get_object_path(obj)
+        live = self._list_metadata(obj["apiVersion"], obj["kind"], namespace)
+        return live.get(obj["metadata"]["name"])
+
+    def get_object_path(self, obj: dict) -> Tuple[str, Optional[str]]:
+        """Returns API path and namespace of the object"""
+        api_version, kind = obj.get("apiVersion", ""), obj.get("kind", "")
+        resource = self._get_resource(api_version, kind)
+        namespace = None
+        if resource.namespaced:
+            namespace = (obj.get("metadata") or {}).get("namespace") or self._default_namespace
+        path = self._get_collection_path(api_version, resource, namespace)
+        return f"{path}/{obj['metadata']['name']}", namespace
+
+    def get_object(self, obj: dict) -> Optional[dict]:
+        """Returns live state of the object or None if it does not exist"""
+        path, _ = self.get_object_path(obj)
+        try:
+            _, data = self._request(ApiRequest("GET", path))
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        return data
+
+    def patch_object(self, obj: dict, dry_run: bool = False) -> Tuple[int, dict]:
+        path, _ = self.get_object_path(obj)
+        query_params = [("fieldManager", self._field_manager), ("force", "true")]
+        if dry_run:
+            query_params.append(("dryRun", "All"))
+        return self._request(ApiRequest(
+            "PATCH", path,
+            query_params=query_params,
+            headers={"Content-Type": APPLY_CONTENT_TYPE},
+            body=obj,
+        ))
+
+    def apply_object(self, obj: dict, dry_run: bool = False) -> ApplyResult:
+        api_version, kind = obj.get("apiVersion", ""), obj.get("kind", "")
+        name = (obj.get("metadata") or {}).get("name", "")
+        group = api_version.rpartition("/")[0]
+        namespace = None
+        try:
+            _, namespace = self.get_object_path(obj)
+            live = self.get_live_metadata(obj)
+            status, data = self.patch_object(obj, dry_run=dry_run)
+        except ApiException as e:
+            return ApplyResult(kind, name, namespace, group, "failed", get_error_message(e))
+        except ApplyError as e:
+            return ApplyResult(kind, name, namespace, group, "failed", str(e))
+
+        if status == 201 or live is None:
+            action = "created"
+        elif data["metadata"].get("resourceVersion") != live.get("resourceVersion"):
+            action = "configured"
+        else:
+            action = "unchanged"
+        if dry_run:
+            action = f"{action} (server dry run)"
+        return ApplyResult(kind, name, namespace, group, action)
+
+    def apply(self, objects: Iterable[dict], dry_run: bool = False) -> Iterator[ApplyResult]:
+        """Apply objects one by one and return result of every object"""
+        for obj in objects:
+            yield self.apply_object(obj, dry_run=dry_run)
@@ -0,0 +1,21 @@
+from typing import Optional
+
+from kubernetes import client, config
+
+from kubedeployer.environ import get_environ
+from kubedeployer.kubectl import DEFAULT_CONTEXT
+
+
+def create_api_client(context: Optional[str] = DEFAULT_CONTEXT) -> client.ApiClient:
+    """
+    Create client of Kubernetes API using kubeconfig prepared by
+    `kubectl.configure`, KUBECONFIG of the context is used
+
+    Example:
+
+        >>> api_client = create_api_client()
+    """
+    return config.new_client_from_config(
+        config_file=get_environ().get("KUBECONFIG"),
+        context=context,
+    )
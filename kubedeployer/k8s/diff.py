@@ -0,0 +1,253 @@
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import yaml
+from kubernetes.client.rest import ApiException
+
+from kubedeployer.k8s.apply import ServerSideApplier, ApplyError, get_error_message
+
+IGNORED_FIELDS = (
+    ("metadata", "creationTimestamp"),
+    ("metadata", "generation"),
+    ("metadata", "managedFields"),
+    ("metadata", "resourceVersion"),
+    ("metadata", "uid"),
+    ("status",),
+)
+
+MISSING = object()
+
+# Values of secrets are never shown, as `kubectl diff` does
+SECRET_FIELDS = ("data", "stringData")
+SECRET_MASK = "***"
+
+
+@dataclass
+class FieldChange:
+    path: str
+    action: str
+    old: Any = None
+    new: Any = None
+
+
+@dataclass
+class ObjectDiff:
+    resource: str
+    name: str
+    namespace: Optional[str]
+    created: bool = False
+    changes: List[FieldChange] = field(default_factory=list)
+    text: str = ""
+    error: Optional[str] = None
+
+    @property
+    def changed(self) -> bool:
+        return self.created or bool(self.changes)
+
+    def summary(self) -> str:
+        """
+        Returns compact description of the diff
+
+        Example:
+
+            >>> diff.summary()
+            'deployment.apps/app: 1 changed, 1 added (spec.replicas, metadata.labels.tier)'
+        """
+        name = f"{self.resource}/{self.name}"
+        if self.error:
+            return f"{name}: failed, {self.error}"
+        if self.created:
+            return f"{name}: created"
+        if not self.changes:
+            return f"{name}: unchanged"
+
+        counts = {}
+        for change in self.changes:
+            counts[change.action] = counts.get(change.action, 0) + 1
+        stats = ", ".join(f"{count} {action}" for action, count in counts.items())
+        paths = ", ".join(c.path for c in self.changes)
+        return f"{name}: {stats} ({paths})"
+
+
+def strip_object(obj: Optional[dict]) -> Optional[dict]:
+    """Returns copy of the object without fields managed by the server"""
+    if obj is None:
+        return None
+    obj = {**obj, "metadata": dict(obj.get("metadata") or {})}
+    for path in IGNORED_FIELDS:
+        parent = obj
+        for key in path[:-1]:
+            parent = parent.get(key) or {}
+        parent.pop(path[-1], None)
+    return obj
+
+
+def mask_secrets(live: Optional[dict], merged: dict) -> Tuple[Optional[dict], dict]:
+    """
+    Returns copies of states of the secret with masked values
+
+    Values changed by the apply are masked differently, so the change is
+    still found, but the value is not shown.
+
+    Example:
+
+        >>> mask_secrets({"kind": "Secret", "data": {"a": "MQ=="}}, {"kind": "Secret", "data": {"a": "Mg=="}})
+        ({'kind': 'Secret', 'data': {'a': '*** (before)'}}, {'kind': 'Secret', 'data': {'a': '*** (after)'}})
+    """
+    if merged.get("kind") != "Secret":
+        return live, merged
+    live = dict(live) if live is not None else None
+    merged = dict(merged)
+    for name in SECRET_FIELDS:
+        old = (live or {}).get(name) or {}
+        new = merged.get(name) or {}
+        if live is not None and name in live:
+            live[name] = {
+                k: SECRET_MASK if k in new and new[k] == v else f"{SECRET_MASK} (before)"
+                for k, v in old.items()
+            }
+        if name in merged:
+            merged[name] = {
+                k: SECRET_MASK if k in old and old[k] == v else f"{SECRET_MASK} (after)"
+                for k, v in new.items()
+            }
+    return live, merged
+
+
+def mask_secret_path(path: str) -> str:
+    """Keys of secrets are masked as well (ex.: data.password -> data.***)"""
+    field_name = path.split(".", maxsplit=1)[0]
+    if field_name in SECRET_FIELDS and field_name != path:
+        return f"{field_name}.{SECRET_MASK}"
+    return path
+
+
+def format_path(path: Tuple[Any, ...]) -> str:
+    res = ""
+    for key in path:
+        res += f"[{key}]" if isinstance(key, int) else f".{key}" if res else str(key)
+    return res
+
+
+def diff_values(old: Any, new: Any, path: Tuple[Any, ...] = ()) -> Iterator[FieldChange]:
+    """
+    Returns structural changes between two values
+
+    Dictionaries are compared by keys and lists by positions, so every
+    change has the path of the field.
+
+    Example:
+
+        >>> list(diff_values({"spec": {"replicas": 1}}, {"spec": {"replicas": 2}}))
+        [FieldChange(path='spec.replicas', action='changed', old=1, new=2)]
+    """
+    if old is MISSING:
+        yield FieldChange(format_path(path), "added", new=new)
+    elif new is MISSING:
+        yield FieldChange(format_path(path), "removed", old=old)
+    elif isinstance(old, dict) and isinstance(new, dict):
+        for key in list(old) + [k for k in new if k not in old]:
+            yield from diff_values(old.get(key, MISSING), new.get(key, MISSING), path + (key,))
+    elif isinstance(old, list) and isinstance(new, list):
+        for i in range(max(len(old), len(new))):
+            yield from diff_values(
+                old[i] if i < len(old) else MISSING,
+                new[i] if i < len(new) else MISSING,
+                path + (i,),
+            )
+    elif old != new:
+        yield FieldChange(format_path(path), "changed", old=old, new=new)
+
+
+def get_object_key(obj: dict,
+                   default_namespace: Optional[str] = None) -> Tuple[str, str, Optional[str], str]:
+    metadata = obj.get("metadata") or {}
+    group = obj.get("apiVersion", "").rpartition("/")[0]
+    namespace = metadata.get("namespace") or default_namespace
+    return group, obj.get("kind", ""), namespace, metadata.get("name", "")
+
+
+def get_resource_name(group: str, kind: str) -> str:
+    return f"{kind.lower()}.{group}" if group else kind.lower()
+
+
+def deduplicate(objects: Iterable[dict], default_namespace: Optional[str] = None) -> List[dict]:
+    """
+    Returns objects without duplicates, the last definition of the object
+    wins, objects without namespace are in `default_namespace`
+    """
+    unique: Dict[Tuple[str, str, Optional[str], str], dict] = {}
+    for obj in objects:
+        unique[get_object_key(obj, default_namespace)] = obj
+    return list(unique.values())
+
+
+class ServerSideDiffer:
+    """
+    Diff objects against the cluster using server-side dry-run apply
+
+    Objects are deduplicated, live and dry-run states of every object are
+    fetched concurrently and compared in-process.
+
+    Example:
+
+        >>> differ = ServerSideDiffer(applier, max_workers=8)
+        >>> for diff in differ.diff(manifests):
+        ...     print(diff.summary())
+        deployment.apps/application: 1 changed (spec.template.spec.containers[0].image)
+    """
+
+    def __init__(self, applier: ServerSideApplier, max_workers: int):
+        self._applier = applier
+        self._max_workers = max(max_workers, 1)
+
+    def diff_object(self, obj: dict) -> ObjectDiff:
+        group, kind, _, name = get_object_key(obj)
+        diff = ObjectDiff(get_resource_name(group, kind), name, None)
+        try:
+            _, diff.namespace = self._applier.get_object_path(obj)
+            live = self._applier.get_object(obj)
+            _, merged = self._applier.patch_object(obj, dry_run=True)
+            live, merged = mask_secrets(strip_object(live), strip_object(merged))
+        except ApiException as e:
+            diff.error = get_error_message(e)
+            return diff
+        except ApplyError as e:
+            diff.error = str(e)
+            return diff
+
+        if live is None:
+            diff.created = True
+            live_text = []
+        else:
+            diff.changes = list(diff_values(live, merged))
+            if kind == "Secret":
+                for change in diff.changes:
+                    change.path = mask_secret_path(change.path)
+            live_text = yaml.safe_dump(live).splitlines(keepends=True)
+
+        if diff.changed:
+            label = f"{kind}.{name}"
+            diff.text = "".join(difflib.unified_diff(
+                live_text,
+                yaml.safe_dump(merged).splitlines(keepends=True),
+                fromfile=f"live/{label}",
+                tofile=f"merged/{label}",
+            ))
+        return diff
+
+    def diff(self, objects: Iterable[dict]) -> List[ObjectDiff]:
+        """Returns diffs of objects in the order of objects"""
+        objects = deduplicate(objects, self._applier.default_namespace)
+        # resources are discovered before starting workers, so every API
+        # version is requested once
+        for obj in objects:
+            try:
+                self._applier.get_object_path(obj)
+            except (ApiException, ApplyError):
+                pass
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            return list(executor.map(self.diff_object, objects))
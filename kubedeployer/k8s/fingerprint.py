@@ -0,0 +1,105 @@
+import hashlib
+import json
+from typing import Any, Iterable, List, Tuple
+
+import yaml
+from kubernetes.client.rest import ApiException
+
+from kubedeployer.k8s import specifications
+from kubedeployer.k8s.apply import ServerSideApplier, ApplyError
+from kubedeployer.manifests import Manifest, ManifestSet
+
+# Annotations that are different on every job, they do not make
+# the object changed
+VOLATILE_ANNOTATIONS = (
+    specifications.ANNOTATION_CI_JOB_REF,
+    specifications.ANNOTATION_CI_JOB_AUTHOR,
+    specifications.ANNOTATION_FINGERPRINT,
+)
+
+
+def strip_volatile_annotations(value: Any) -> Any:
+    """Returns copy of the value without volatile annotations in all metadata"""
+    if isinstance(value, list):
+        return [strip_volatile_annotations(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+
+    res = {k: strip_volatile_annotations(v) for k, v in value.items()}
+    metadata = res.get("metadata")
+    if isinstance(metadata, dict) and isinstance(metadata.get("annotations"), dict):
+        metadata["annotations"] = {
+            k: v for k, v in metadata["annotations"].items()
+            if k not in VOLATILE_ANNOTATIONS
+        }
+    return res
+
+
+def get_fingerprint(obj: dict) -> str:
+    """
+    Returns fingerprint of the rendered object
+
+    Example:
+
+        >>> get_fingerprint({"kind": "ConfigMap", "data": {"a": "1"}})
+        '5e1c..'
+    """
+    canonical = json.dumps(
+        strip_volatile_annotations(obj),
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def add_fingerprint(obj: dict) -> dict:
+    """Returns copy of the object with fingerprint annotation"""
+    metadata = dict(obj.get("metadata") or {})
+    metadata["annotations"] = {
+        **(metadata.get("annotations") or {}),
+        specifications.ANNOTATION_FINGERPRINT: get_fingerprint(obj),
+    }
+    return {**obj, "metadata": metadata}
+
+
+def fingerprint_manifests(manifests: ManifestSet) -> ManifestSet:
+    """
+    Returns manifests with fingerprint annotation, content of the set is
+    the dump of fingerprinted objects
+
+    Example:
+
+        >>> fingerprint_manifests(ManifestSet.parse(content)).content
+        'apiVersion: v1\nkind: ConfigMap\nmetadata:\n  annotations:\n    ci.itlabs.io/fingerprint: 5e1c..'
+    """
+    objects = [add_fingerprint(m) for m in manifests]
+    return ManifestSet((Manifest(o) for o in objects), content=yaml.safe_dump_all(objects))
+
+
+def select_changed(objects: Iterable[dict],
+                   applier: ServerSideApplier) -> Tuple[List[dict], List[dict]]:
+    """
+    Returns changed and unchanged objects, objects are fingerprinted
+    and compared with fingerprint annotation of live objects
+
+    Live objects are listed once per kind and namespace. Objects that
+    could not be checked are considered changed.
+
+    Example:
+
+        >>> changed, unchanged = select_changed(manifests, applier)
+        >>> applier.apply(changed)
+    """
+    changed, unchanged = [], []
+    for obj in objects:
+        obj = add_fingerprint(obj)
+        try:
+            live = applier.get_live_metadata(obj)
+        except (ApiException, ApplyError):
+            live = None
+        annotations = (live or {}).get("annotations") or {}
+        fingerprint = obj["metadata"]["annotations"][specifications.ANNOTATION_FINGERPRINT]
+        if annotations.get(specifications.ANNOTATION_FINGERPRINT) == fingerprint:
+            unchanged.append(obj)
+        else:
+            changed.append(obj)
+    return changed, unchanged
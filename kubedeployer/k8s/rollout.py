@@ -0,0 +1,267 @@
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+from kubedeployer.manifests import Manifest, ROLLOUT_RESOURCES, \
+    InvalidRolloutResource
+
+
+# Resource version of the watch is too old, objects must be listed again
+HTTP_STATUS_GONE = 410
+
+
+class RolloutError(Exception):
+    pass
+
+
+@dataclass
+class RolloutStatus:
+    kind: str
+    name: str
+    namespace: str
+    message: str
+    succeeded: bool = True
+
+
+def get_deployment_status(obj: dict) -> Tuple[bool, str]:
+    name = obj["metadata"]["name"]
+    spec, status = obj.get("spec") or {}, obj.get("status") or {}
+    if obj["metadata"].get("generation", 0) > status.get("observedGeneration", 0):
+        return False, "Waiting for deployment spec update to be observed..."
+
+    for condition in status.get("conditions") or []:
+        if condition.get("type") == "Progressing" \
+                and condition.get("reason") == "ProgressDeadlineExceeded":
+            raise RolloutError(f'deployment "{name}" exceeded its progress deadline')
+
+    replicas = spec.get("replicas", 1)
+    updated = status.get("updatedReplicas", 0)
+    if updated < replicas:
+        return False, (
+            f'Waiting for deployment "{name}" rollout to finish: '
+            f"{updated} out of {replicas} new replicas have been updated..."
+        )
+    if status.get("replicas", 0) > updated:
+        return False, (
+            f'Waiting for deployment "{name}" rollout to finish: '
+            f"{status['replicas'] - updated} old replicas are pending termination..."
+        )
+    if status.get("availableReplicas", 0) < updated:
+        return False, (
+            f'Waiting for deployment "{name}" rollout to finish: '
+            f"{status.get('availableReplicas', 0)} of {updated} updated replicas are available..."
+        )
+    return True, f'deployment "{name}" successfully rolled out'
+
+
+def get_daemon_set_status(obj: dict) -> Tuple[bool, str]:
+    name = obj["metadata"]["name"]
+    spec, status = obj.get("spec") or {}, obj.get("status") or {}
+    if (spec.get("updateStrategy") or {}).get("type", "RollingUpdate") != "RollingUpdate":
+        raise RolloutError("rollout status is only available for RollingUpdate strategy type")
+    if obj["metadata"].get("generation", 0) > status.get("observedGeneration", 0):
+        return False, "Waiting for daemon set spec update to be observed..."
+
+    desired = status.get("desiredNumberScheduled", 0)
+    updated = status.get("updatedNumberScheduled", 0)
+    if updated < desired:
+        return False, (
+            f'Waiting for daemon set "{name}" rollout to finish: '
+            f"{updated} out of {desired} new pods have been updated..."
+        )
+    available = status.get("numberAvailable", 0)
+    if available < desired:
+        return False, (
+            f'Waiting for daemon set "{name}" rollout to finish: '
+            f"{available} of {desired} updated pods are available..."
+        )
+    return True, f'daemon set "{name}" successfully rolled out'
+
+
+def get_stateful_set_status(obj: dict) -> Tuple[bool, str]:
+    spec, status = obj.get("spec") or {}, obj.get("status") or {}
+    strategy = spec.get("updateStrategy") or {}
+    if strategy.get("type", "RollingUpdate") != "RollingUpdate":
+        raise RolloutError("rollout status is only available for RollingUpdate strategy type")
+    observed = status.get("observedGeneration", 0)
+    if not observed or obj["metadata"].get("generation", 0) > observed:
+        return False, "Waiting for statefulset spec update to be observed..."
+
+    replicas = spec.get("replicas", 1)
+    ready = status.get("readyReplicas", 0)
+    if ready < replicas:
+        return False, f"Waiting for {replicas - ready} pods to be ready..."
+
+    partition = (strategy.get("rollingUpdate") or {}).get("partition")
+    updated = status.get("updatedReplicas", 0)
+    if partition is not None:
+        if updated < replicas - partition:
+            return False, (
+                f"Waiting for partitioned roll out to finish: "
+                f"{updated} out of {replicas - partition} new pods have been updated..."
+            )
+        return True, f"partitioned roll out complete: {updated} new pods have been updated..."
+
+    if status.get("updateRevision") != status.get("currentRevision"):
+        return False, (
+            f"waiting for statefulset rolling update to complete "
+            f"{updated} pods at revision {status.get('updateRevision')}..."
+        )
+    return True, (
+        f"statefulset rolling update complete "
+        f"{status.get('currentReplicas', 0)} pods at revision {status.get('currentRevision')}..."
+    )
+
+
+@dataclass
+class RolloutGroup:
+    kind: str
+    namespace: str
+    names: Set[str]
+
+
+STATUS_VIEWERS = {
+    "Deployment": get_deployment_status,
+    "DaemonSet": get_daemon_set_status,
+    "StatefulSet": get_stateful_set_status,
+}
+
+LIST_FUNCTIONS = {
+    "Deployment": "list_namespaced_deployment",
+    "DaemonSet": "list_namespaced_daemon_set",
+    "StatefulSet": "list_namespaced_stateful_set",
+}
+
+
+class RolloutTracker:
+    """
+    Track rollout of DaemonSet, Deployment and StatefulSet objects
+
+    Single watch is opened per namespace and kind, so all objects are
+    followed at once and total waiting time is the time of the slowest
+    rollout.
+
+    Example:
+
+        >>> tracker = RolloutTracker(api_client, timeout=600)
+        >>> for status in tracker.track(manifests, default_namespace="default"):
+        ...     print(status.message)
+    """
+
+    def __init__(self, api_client: client.ApiClient, timeout: float):
+        self._apps_api = client.AppsV1Api(api_client)
+        self._timeout = timeout
+
+    def _list(self, kind: str, namespace: str) -> Tuple[str, List[dict]]:
+        func = getattr(self._apps_api, LIST_FUNCTIONS[kind])
+        response = func(namespace, _preload_content=False)
+        data = json.loads(response.data)
+        return data["metadata"]["resourceVersion"], data.get("items") or []
+
+    def _watch(self, kind: str, namespace: str, resource_version: str,
+               timeout: float) -> Iterator[dict]:
+        func = getattr(self._apps_api, LIST_FUNCTIONS[kind])
+        stream = watch.Watch().stream(
+            func, namespace,
+            resource_version=resource_version,
+            timeout_seconds=max(int(timeout), 1),
+        )
+        for event in stream:
+            yield event
+
+    def _follow(self, group: RolloutGroup, deadline: float, results: queue.Queue):
+        kind, namespace = group.kind, group.namespace
+        pending = set(group.names)
+
+        def report(name: str, message: str, succeeded: bool = True):
+            pending.discard(name)
+            results.put(RolloutStatus(kind, name, namespace, message, succeeded))
+
+        def check(obj: dict):
+            name = obj["metadata"]["name"]
+            try:
+                done, message = STATUS_VIEWERS[kind](obj)
+            except RolloutError as e:
+                report(name, str(e), False)
+                return
+            if done:
+                report(name, message)
+
+        def sync() -> str:
+            resource_version, items = self._list(kind, namespace)
+            for obj in items:
+                if obj["metadata"]["name"] in pending:
+                    check(obj)
+            for name in sorted(pending - {i["metadata"]["name"] for i in items}):
+                report(name, f'{kind.lower()} "{name}" not found', False)
+            return resource_version
+
+        def follow_events(resource_version: str) -> str:
+            events = self._watch(kind, namespace, resource_version, deadline - time.monotonic())
+            for event in events:
+                obj = event["raw_object"]
+                name = obj["metadata"]["name"]
+                resource_version = obj["metadata"].get("resourceVersion", resource_version)
+                if name not in pending:
+                    continue
+                if event["type"] == "DELETED":
+                    report(name, f'{kind.lower()} "{name}" was deleted', False)
+                else:
+                    check(obj)
+                if not pending:
+                    break
+            return resource_version
+
+        try:
+            resource_version = sync()
+            while pending and time.monotonic() < deadline:
+                try:
+                    resource_version = follow_events(resource_version)
+                except ApiException as e:
+                    if e.status != HTTP_STATUS_GONE:
+                        raise
+                    # Watch is not retried by the client when it has timeout,
+                    # so objects are listed again and followed from the new
+                    # resource version (like kubectl rollout status)
+                    resource_version = sync()
+        except Exception as e:
+            for name in sorted(pending):
+                results.put(RolloutStatus(kind, name, namespace, str(e), False))
+            return
+
+        for name in sorted(pending):
+            results.put(RolloutStatus(
+                kind, name, namespace,
+                f'timed out waiting for {kind.lower()} "{name}" rollout', False
+            ))
+
+    def track(self, manifests: Iterable[Manifest],
+              default_namespace: str) -> Iterator[RolloutStatus]:
+        """Returns rollout status of every object as soon as it is known"""
+        groups: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        for manifest in manifests:
+            if manifest.kind not in ROLLOUT_RESOURCES:
+                raise InvalidRolloutResource(
+                    f"{manifest.kind} not in ({', '.join(ROLLOUT_RESOURCES)})"
+                )
+            namespace = manifest.namespace or default_namespace
+            groups[(namespace, manifest.kind)].add(manifest.name)
+
+        deadline = time.monotonic() + self._timeout
+        results = queue.Queue()
+        for (namespace, kind), names in groups.items():
+            threading.Thread(
+                target=self._follow,
+                args=(RolloutGroup(kind, namespace, names), deadline, results),
+                daemon=True,
+            ).start()
+
+        for _ in range(sum(len(names) for names in groups.values())):
+            yield results.get()
@@ -5,3 +5,4 @@ ANNOTATION_CI_REPO_URL = 'ci.itlabs.io/repo-url'
 ANNOTATION_CI_PROJECT_ID = 'ci.itlabs.io/gl-project-id'
 ANNOTATION_CI_COMMIT_BRANCH = 'ci.itlabs.io/commit-branch'
 ANNOTATION_CI_COMMIT_TAG = 'ci.itlabs.io/commit-tag'
+ANNOTATION_FINGERPRINT = 'ci.itlabs.io/fingerprint'
@@ -1,7 +1,6 @@
 import subprocess
 
-from kubedeployer.manifests import Manifest, ROLLOUT_RESOURCES, \
-    InvalidRolloutResource
+from kubedeployer.environ import get_environ
 from kubedeployer.types import PathLike
 from kubedeployer.gitlab_ci.environment_variables import settings
 
@@ -14,6 +13,11 @@ class KubectlError(Exception):
     pass
 
 
+def run(cmd: str) -> subprocess.CompletedProcess:
+    # kubeconfig is taken from variables of the context (ex.: of the cluster)
+    return subprocess.run(cmd, capture_output=True, shell=True, env=get_environ())
+
+
 def configure(
         server: str,
         token: str,
@@ -36,7 +40,7 @@ def configure(
     use_context = f"kubectl config use-context {context}"
 
     cmd = " && ".join([set_cluster, set_credentials, set_context, use_context])
-    result = subprocess.run(cmd, capture_output=True, shell=True)
+    result = run(cmd)
     if result.returncode != 0:
         raise KubectlError(result.stderr.decode("utf-8"))
 
@@ -61,41 +65,7 @@ def apply_manifests(*paths: PathLike, dry_run: bool = False) -> str:
         f" --dry-run={dry_run and 'client' or 'none'}"
         f" {' '.join(f'-f {str(p)}' for p in paths)}"
     )
-    result = subprocess.run(cmd, capture_output=True, shell=True)
-    if result.returncode != 0:
-        raise KubectlError(result.stderr.decode("utf-8"))
-    return result.stdout.decode("utf-8")
-
-
-def check_rollout_status(manifest: Manifest) -> str:
-    """
-    Return rollout status
-
-    Checking status supporting only for types: DaemonSet, Deployment, StatefulSet
-    (https://kubernetes.io/docs/reference/generated/kubectl/kubectl-commands#rollout).
-
-    Example:
-
-        >>> check_rollout_status(manifest)
-    """
-    if manifest.kind not in ROLLOUT_RESOURCES:
-        raise InvalidRolloutResource(
-            f"{manifest.kind} not in ({', '.join(ROLLOUT_RESOURCES)})"
-        )
-
-    manifest_namespace = (
-            manifest.namespace
-            or settings.kube_namespace.value
-            or DEFAULT_NAMESPACE
-    )
-
-    cmd = (
-        f"kubectl rollout"
-        f" --v={settings.kube_verbosity.value}"
-        f" status {manifest.kind.lower()}/{manifest.name}"
-        f" --namespace={manifest_namespace}"
-    )
-    result = subprocess.run(cmd, capture_output=True, shell=True)
+    result = run(cmd)
     if result.returncode != 0:
         raise KubectlError(result.stderr.decode("utf-8"))
     return result.stdout.decode("utf-8")
@@ -117,7 +87,7 @@ def diff_manifests(manifests_dir: PathLike):
         f" --v={settings.kube_verbosity.value}"
         f" -f {manifests_dir}"
     )
-    result = subprocess.run(cmd, capture_output=True, shell=True)
+    result = run(cmd)
     if result.returncode != 1:
         error = (
             f"return code == "
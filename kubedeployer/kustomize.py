@@ -1,19 +1,53 @@
+import hashlib
+import os
+import re
+import shutil
 import subprocess
-from typing import Optional, Dict, Tuple
+import uuid
+from typing import Optional, Dict, Iterable, Iterator, Any, Set
 from pathlib import Path
 
-from kubedeployer.files import get_files, YAML_EXTENSIONS
+import yaml
+
+from kubedeployer.files import get_files, DirectoryIndex, EXTENSION_DELIMITER, YAML_EXTENSIONS, \
+    YAML_DEFAULT_EXTENSION
+from kubedeployer.gitlab_ci.environment_variables import settings
+from kubedeployer.k8s.fingerprint import VOLATILE_ANNOTATIONS
+from kubedeployer.kustomize_renderer import KUSTOMIZATION_FILENAMES, KustomizationDumper, \
+    UnsupportedKustomization, iter_documents, render_kustomization
 from kubedeployer.types import PathLike
 
 
 KUSTOMIZATION_FILENAME = "kustomization"
 
+KUSTOMIZATION_API_VERSION = "kustomize.config.k8s.io/v1beta1"
+KUSTOMIZATION_KIND = "Kustomization"
+
 
 class KustomizationError(Exception):
     pass
 
 
-def get_kustomization(*paths: PathLike) -> Optional[Path]:
+def read_kustomization(filename: Path) -> dict:
+    try:
+        kustomization = yaml.safe_load(filename.read_text(encoding="utf-8")) or {}
+    except yaml.YAMLError as e:
+        raise KustomizationError(f"Invalid kustomization {filename}: {e}")
+    if not isinstance(kustomization, dict):
+        raise KustomizationError(f"Invalid kustomization {filename}")
+    return kustomization
+
+
+def write_kustomization(filename: Path, kustomization: dict):
+    filename.write_text(yaml.dump(
+        kustomization,
+        Dumper=KustomizationDumper,
+        default_flow_style=False,
+        sort_keys=False,
+    ), encoding="utf-8")
+
+
+def get_kustomization(*paths: PathLike, index: Optional[DirectoryIndex] = None) -> Optional[Path]:
     """
     Searching kustomization.yaml by selected paths
 
@@ -28,7 +62,22 @@ def get_kustomization(*paths: PathLike) -> Optional[Path]:
     """
 
     extensions = YAML_EXTENSIONS.replace("*", KUSTOMIZATION_FILENAME)
-    files = set(get_files(*paths, extensions=extensions))
+    return select_kustomization(get_files(*paths, extensions=extensions, index=index))
+
+
+def select_kustomization(files: Iterable[Path]) -> Optional[Path]:
+    """
+    Returns kustomization.yaml from found files, so kustomization and
+    manifests could be found by one search
+
+    Example:
+
+        >>> files = list(get_files("/project", "/project/overlays/**", extensions=YAML_EXTENSIONS))
+        >>> select_kustomization(files)
+        PosixPath('/project/overlays/stage/kustomization.yaml')
+    """
+    names = set(YAML_EXTENSIONS.replace("*", KUSTOMIZATION_FILENAME).split(EXTENSION_DELIMITER))
+    files = {f for f in files if f.name in names}
     if len(files) > 1:
         raise KustomizationError(
             f"There are to many files:"
@@ -45,19 +94,24 @@ def create_kustomization(path: PathLike, *resources: PathLike) -> Path:
 
         >>> create_kustomization("/proj", "/proj/svc.yaml", "/proj/cm.yaml")
     """
-    cmd = (
-        f"(mkdir -p {str(path)}"
-        f" && cd {str(path)}"
-        f" && kustomize create"
-        f" --resources={','.join(str(r) for r in resources)})"
-    )
-    result = subprocess.run(cmd, capture_output=True, shell=True)
-    if result.returncode != 0:
-        raise KustomizationError(result.stderr.decode("utf-8"))
-    return get_kustomization(path)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    if get_kustomization(path):
+        raise KustomizationError(f"kustomization file already exists in {path}")
+
+    kustomization = {
+        "apiVersion": KUSTOMIZATION_API_VERSION,
+        "kind": KUSTOMIZATION_KIND,
+    }
+    if resources:
+        kustomization["resources"] = [str(r) for r in resources]
 
+    filename = path / YAML_DEFAULT_EXTENSION.replace("*", KUSTOMIZATION_FILENAME)
+    write_kustomization(filename, kustomization)
+    return filename
 
-def add_annotations(path: PathLike, annotations: Dict[str, str]):
+
+def add_annotations(path: PathLike, annotations: Dict[str, Optional[str]]):
     """
     Add annotations into kustomization.yaml
 
@@ -65,29 +119,272 @@ def add_annotations(path: PathLike, annotations: Dict[str, str]):
 
         >>> add_annotations("/proj", {"environment": "stage"})
     """
+    if not annotations:
+        raise KustomizationError("must specify annotation")
 
-    def convert(key: str, value: str) -> Tuple[str, str]:
-        return key, value or ""
+    filename = get_kustomization(path)
+    if not filename:
+        raise KustomizationError(f"Missing kustomization file in {path}")
+
+    kustomization = read_kustomization(filename)
+    common_annotations = kustomization.get("commonAnnotations") or {}
+    common_annotations.update({k: v or "" for k, v in annotations.items()})
+    kustomization["commonAnnotations"] = common_annotations
+    write_kustomization(filename, kustomization)
+
+
+# Fields of kustomization with paths of files or other kustomizations
+PATH_FIELDS = (
+    "bases",
+    "components",
+    "configurations",
+    "crds",
+    "generators",
+    "patchesStrategicMerge",
+    "resources",
+    "transformers",
+    "validators",
+)
+# Fields with lists of items having `path`
+ITEM_PATH_FIELDS = ("patches", "patchesJson6902", "replacements")
+GENERATOR_FIELDS = ("configMapGenerator", "secretGenerator")
+# Fields that make the build depend on something outside of files
+REMOTE_FIELDS = ("helmCharts", "helmChartInflationGenerator", "helmGlobals")
 
-    cmd = (
-        f"(cd {str(path)}"
-        f" && kustomize edit set annotation"
-        f" {' '.join(':'.join(convert(*i)) for i in annotations.items())})"
-    )
-    result = subprocess.run(cmd, capture_output=True, shell=True)
-    if result.returncode != 0:
-        raise KustomizationError(result.stderr.decode("utf-8"))
 
+def get_references(kustomization: dict) -> Iterator[str]:
+    """Returns local and remote paths referenced by kustomization"""
+    for field in PATH_FIELDS:
+        for ref in kustomization.get(field) or []:
+            # inline patches are not paths
+            if isinstance(ref, str) and "\n" not in ref:
+                yield ref
+    for field in ITEM_PATH_FIELDS:
+        for item in kustomization.get(field) or []:
+            if isinstance(item, dict) and item.get("path"):
+                yield item["path"]
+    for field in GENERATOR_FIELDS:
+        for generator in kustomization.get(field) or []:
+            for ref in (generator.get("files") or []) + (generator.get("envs") or []):
+                # files could be set as `key=path`
+                yield ref.split("=", maxsplit=1)[-1]
+            if generator.get("env"):
+                yield generator["env"]
+    openapi: Any = kustomization.get("openapi") or {}
+    if isinstance(openapi, dict) and openapi.get("path"):
+        yield openapi["path"]
+
+
+def get_reachable_files(path: PathLike) -> Optional[Set[Path]]:
+    """
+    Returns all files reachable from kustomization of the path: resources,
+    bases, patches, generators, etc. Returns None if the build depends on
+    remote resources or missing files.
+
+    Example:
 
-def build_manifests(path: PathLike, output: PathLike):
+        >>> get_reachable_files("/proj/overlays/stage")
+        {PosixPath('/proj/overlays/stage/kustomization.yaml'), PosixPath('/proj/base/app.yaml'), ...}
+    """
+    files: Set[Path] = set()
+    visited: Set[Path] = set()
+
+    def visit(root: Path) -> bool:
+        if root in visited:
+            return True
+        visited.add(root)
+        kustomization = get_kustomization(root)
+        data = read_kustomization(kustomization) if kustomization else {}
+        if not kustomization or any(data.get(field) for field in REMOTE_FIELDS):
+            return False
+        files.add(kustomization)
+        return all(visit_reference(root, ref) for ref in get_references(data))
+
+    def visit_reference(root: Path, ref: str) -> bool:
+        if "://" in ref or ref.startswith(("github.com/", "git@")):
+            return False
+        target = (root / ref).resolve()
+        if target.is_dir():
+            return visit(target)
+        if target.is_file():
+            files.add(target)
+            return True
+        return False
+
+    return files if visit(Path(path).resolve()) else None
+
+
+def get_binary_stamp() -> str:
+    """Returns location, size and modification time of kustomize binary"""
+    binary = shutil.which("kustomize")
+    if not binary:
+        return ""
+    stat = os.stat(binary)
+    return f"{binary}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def get_stable_content(file: Path) -> bytes:
+    """
+    Returns content of the file for the build key, kustomizations are
+    taken without volatile annotations (ex.: url of CI job), so builds of
+    different jobs have the same key
+    """
+    content = file.read_bytes()
+    if file.name not in KUSTOMIZATION_FILENAMES:
+        return content
+    data = yaml.safe_load(content)
+    annotations = isinstance(data, dict) and data.get("commonAnnotations")
+    if not isinstance(annotations, dict):
+        return content
+    data["commonAnnotations"] = {
+        k: v for k, v in annotations.items() if k not in VOLATILE_ANNOTATIONS
+    }
+    return yaml.safe_dump(data, sort_keys=True).encode()
+
+
+def get_volatile_annotations(path: PathLike) -> Dict[str, str]:
+    kustomization = get_kustomization(path)
+    annotations = read_kustomization(kustomization).get("commonAnnotations") if kustomization else None
+    if not isinstance(annotations, dict):
+        return {}
+    return {k: v for k, v in annotations.items() if k in VOLATILE_ANNOTATIONS}
+
+
+def dump_scalar(value: str) -> str:
+    return yaml.dump(value, Dumper=KustomizationDumper, width=2 ** 31).split("\n", maxsplit=1)[0]
+
+
+def has_annotations(content: str, annotations: Dict[str, str]) -> bool:
+    for obj in iter_documents(content):
+        metadata = obj.get("metadata") if isinstance(obj, dict) else None
+        live = (metadata or {}).get("annotations") or {}
+        if any(live.get(k) != v for k, v in annotations.items()):
+            return False
+    return True
+
+
+def set_volatile_annotations(path: PathLike, output: PathLike) -> bool:
+    """
+    Set volatile annotations of kustomization of the path in the cached
+    output, they are the only difference from the output of the build
+
+    Only values of annotation lines are replaced, so the rest of the
+    output is kept byte for byte. Returns False if annotations could not
+    be set, then the output must be built.
+    """
+    output = Path(output)
+    try:
+        annotations = get_volatile_annotations(path)
+        if not annotations:
+            return True
+        content = output.read_text(encoding="utf-8")
+        for name, value in annotations.items():
+            content = re.sub(
+                rf"^(\s*{re.escape(name)}): .*$",
+                lambda m, v=value: f"{m.group(1)}: {dump_scalar(v)}",
+                content,
+                flags=re.MULTILINE,
+            )
+        if not has_annotations(content, annotations):
+            return False
+        output.write_text(content, encoding="utf-8")
+    except (KustomizationError, OSError, yaml.YAMLError):
+        return False
+    return True
+
+
+def get_build_key(path: PathLike) -> Optional[str]:
+    """
+    Returns hash of all files reachable from kustomization and of kustomize
+    binary, or None if the build could not be cached
+
+    Volatile annotations of kustomizations are not hashed, they are set
+    into the cached output by `set_volatile_annotations`.
+    """
+    files = get_reachable_files(path)
+    if files is None:
+        return None
+    root = Path(path).resolve()
+    digest = hashlib.sha256(get_binary_stamp().encode())
+    for file in sorted(files):
+        # paths are relative, so copies of the same tree have the same key
+        digest.update(os.path.relpath(file, root).encode() + b"\0")
+        digest.update(hashlib.sha256(get_stable_content(file)).digest())
+    return digest.hexdigest()
+
+
+class KustomizeBuildCache:
+    """
+    On-disk cache of `kustomize build` output
+
+    Output is stored by the key from `get_build_key`.
+
+    Example:
+
+        >>> cache = KustomizeBuildCache("/cache/kustomize")
+        >>> key = get_build_key("/proj/overlays/stage")
+        >>> cache.set(key, "/tmp/manifests.yaml")
+        >>> cache.get(key, "/tmp/cached-manifests.yaml")
+        True
+    """
+
+    def __init__(self, directory: PathLike):
+        self._directory = Path(directory)
+
+    def _filename(self, key: str) -> Path:
+        return self._directory / f"{key}.yaml"
+
+    def get(self, key: str, output: PathLike) -> bool:
+        """Copy cached output into `output`, returns False if it is not cached"""
+        try:
+            shutil.copyfile(self._filename(key), output)
+        except OSError:
+            return False
+        return True
+
+    def set(self, key: str, output: PathLike):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        filename = self._filename(key)
+        tmp_filename = filename.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(output, tmp_filename)
+        tmp_filename.replace(filename)
+
+
+def create_build_cache() -> Optional[KustomizeBuildCache]:
+    if not settings.cache_dir.value:
+        return None
+    return KustomizeBuildCache(Path(settings.cache_dir.value) / "kustomize")
+
+
+def build_manifests(path: PathLike, output: PathLike,
+                    cache: Optional[KustomizeBuildCache] = None):
     """
     Collect all manifests into single file using kustomization.yaml
 
+    Kustomizations are rendered in-process if only common features are
+    used (see KUSTOMIZE_ENGINE), otherwise they are built by kustomize.
+    If cache is set, the build is skipped when nothing reachable from
+    kustomization has changed.
+
     Example:
 
         >>> build_manifests("/proj", "/tmp/manifests.yaml")
     """
+    if settings.kustomize_engine.value == "native":
+        try:
+            Path(output).write_text(render_kustomization(path), encoding="utf-8")
+            return
+        except UnsupportedKustomization:
+            pass
+
+    key = get_build_key(path) if cache else None
+    if key and cache.get(key, output) and set_volatile_annotations(path, output):
+        return
+
     cmd = f"(cd {str(path)} && kustomize build . > {str(output)})"
     result = subprocess.run(cmd, capture_output=True, shell=True)
     if result.returncode != 0:
         raise KustomizationError(result.stderr.decode("utf-8"))
+
+    if key:
+        cache.set(key, output)
@@ -0,0 +1,788 @@
+import copy
+import re
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import yaml
+
+from kubedeployer.manifests import compile_selector
+from kubedeployer.types import PathLike
+
+KUSTOMIZATION_FILENAMES = ("kustomization.yaml", "kustomization.yml", "Kustomization")
+
+# Fields of kustomization rendered in-process, others are built by kustomize
+SUPPORTED_FIELDS = frozenset({
+    "apiVersion",
+    "kind",
+    "resources",
+    "bases",
+    "namespace",
+    "commonLabels",
+    "commonAnnotations",
+    "images",
+    "patchesStrategicMerge",
+    "patchesJson6902",
+    "patches",
+})
+
+# Order of transformers in kustomize
+# (api/internal/target/kusttarget_configplugin.go)
+TRANSFORMERS = (
+    "patchesStrategicMerge",
+    "patches",
+    "namespace",
+    "commonLabels",
+    "commonAnnotations",
+    "patchesJson6902",
+    "images",
+)
+
+CLUSTER_SCOPED_KINDS = frozenset({
+    "APIService",
+    "CSIDriver",
+    "CSINode",
+    "CertificateSigningRequest",
+    "ClusterRole",
+    "ClusterRoleBinding",
+    "ComponentStatus",
+    "CustomResourceDefinition",
+    "FlowSchema",
+    "IngressClass",
+    "MutatingWebhookConfiguration",
+    "Namespace",
+    "Node",
+    "PersistentVolume",
+    "PodSecurityPolicy",
+    "PriorityClass",
+    "PriorityLevelConfiguration",
+    "RuntimeClass",
+    "StorageClass",
+    "ValidatingWebhookConfiguration",
+    "VolumeAttachment",
+})
+
+# Kinds referencing namespaces in other fields than metadata
+NAMESPACE_REFERENCE_KINDS = frozenset({
+    "APIService",
+    "ClusterRoleBinding",
+    "CustomResourceDefinition",
+    "MutatingWebhookConfiguration",
+    "RoleBinding",
+    "ValidatingWebhookConfiguration",
+})
+
+BUILTIN_GROUPS = frozenset({
+    "",
+    "admissionregistration.k8s.io",
+    "apiextensions.k8s.io",
+    "apps",
+    "autoscaling",
+    "batch",
+    "certificates.k8s.io",
+    "coordination.k8s.io",
+    "discovery.k8s.io",
+    "events.k8s.io",
+    "extensions",
+    "networking.k8s.io",
+    "node.k8s.io",
+    "policy",
+    "rbac.authorization.k8s.io",
+    "scheduling.k8s.io",
+    "storage.k8s.io",
+})
+
+# Patch merge keys of lists of Kubernetes types
+MERGE_KEYS = {
+    "conditions": "type",
+    "containers": "name",
+    "env": "name",
+    "ephemeralContainers": "name",
+    "hostAliases": "ip",
+    "imagePullSecrets": "name",
+    "initContainers": "name",
+    "ownerReferences": "uid",
+    "readinessGates": "conditionType",
+    "topologySpreadConstraints": "topologyKey",
+    "volumeDevices": "devicePath",
+    "volumeMounts": "mountPath",
+    "volumes": "name",
+}
+# Lists of primitives merged as sets
+MERGED_PRIMITIVE_LISTS = frozenset({"finalizers"})
+# Keys kustomize uses to guess merge keys of unknown lists
+ASSOCIATIVE_KEYS = ("mountPath", "devicePath", "ip", "type", "topologyKey", "name", "containerPort")
+
+# Kind order of `kustomize build --reorder legacy` (api/resid/gvk.go)
+ORDER_FIRST = (
+    "Namespace",
+    "ResourceQuota",
+    "StorageClass",
+    "CustomResourceDefinition",
+    "ServiceAccount",
+    "PodSecurityPolicy",
+    "Role",
+    "ClusterRole",
+    "RoleBinding",
+    "ClusterRoleBinding",
+    "ConfigMap",
+    "Secret",
+    "Endpoints",
+    "Service",
+    "LimitRange",
+    "PriorityClass",
+    "PersistentVolume",
+    "PersistentVolumeClaim",
+    "Deployment",
+    "StatefulSet",
+    "CronJob",
+    "PodDisruptionBudget",
+)
+ORDER_LAST = (
+    "MutatingWebhookConfiguration",
+    "ValidatingWebhookConfiguration",
+)
+TYPE_ORDERS = {
+    **{kind: i - len(ORDER_FIRST) for i, kind in enumerate(ORDER_FIRST)},
+    **{kind: i + 1 for i, kind in enumerate(ORDER_LAST)},
+}
+
+POD_SPEC_PATHS = compile_selector("spec.template.spec|spec.jobTemplate.spec.template.spec")
+
+IMAGE_TAG_PATTERN = r"(:[a-zA-Z0-9_.{}-]*)?(@sha256:[a-zA-Z0-9_.{}-]*)?"
+
+
+class UnsupportedKustomization(Exception):
+    pass
+
+
+class KustomizationDumper(yaml.SafeDumper):
+    """Dumps strings which would be read as other types in double quotes, as kustomize does"""
+
+
+def represent_str(dumper: yaml.SafeDumper, value: str) -> yaml.ScalarNode:
+    tag = dumper.resolve(yaml.ScalarNode, value, (True, False))
+    if not value or tag != "tag:yaml.org,2002:str":
+        return dumper.represent_scalar("tag:yaml.org,2002:str", value, style='"')
+    return dumper.represent_str(value)
+
+
+KustomizationDumper.add_representer(str, represent_str)
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    path: Tuple[str, ...]
+    create: bool = False
+    kind: Optional[str] = None
+    group: Optional[str] = None
+    version: Optional[str] = None
+
+    def matches(self, obj: dict) -> bool:
+        group, version = get_group_version(obj)
+        return (
+            (self.kind is None or self.kind == obj.get("kind"))
+            and (self.group is None or self.group == group)
+            and (self.version is None or self.version == version)
+        )
+
+
+def field_spec(path: str, create: bool = False, kind: Optional[str] = None,
+               group: Optional[str] = None, version: Optional[str] = None) -> FieldSpec:
+    return FieldSpec(tuple(path.split("/")), create, kind, group, version)
+
+
+# api/konfig/builtinpluginconsts/commonannotations.go
+ANNOTATION_FIELD_SPECS = (
+    field_spec("metadata/annotations", create=True),
+    field_spec("spec/template/metadata/annotations", True, "ReplicationController", version="v1"),
+    field_spec("spec/template/metadata/annotations", True, "Deployment"),
+    field_spec("spec/template/metadata/annotations", True, "ReplicaSet"),
+    field_spec("spec/template/metadata/annotations", True, "DaemonSet"),
+    field_spec("spec/template/metadata/annotations", True, "StatefulSet", group="apps"),
+    field_spec("spec/template/metadata/annotations", True, "Job", group="batch"),
+    field_spec("spec/jobTemplate/metadata/annotations", True, "CronJob", group="batch"),
+    field_spec("spec/jobTemplate/spec/template/metadata/annotations", True, "CronJob", group="batch"),
+)
+
+# api/konfig/builtinpluginconsts/commonlabels.go without label selectors of
+# affinities, manifests with affinities are built by kustomize
+LABEL_FIELD_SPECS = (
+    field_spec("metadata/labels", create=True),
+    field_spec("spec/selector", True, "Service", version="v1"),
+    field_spec("spec/selector", True, "ReplicationController", version="v1"),
+    field_spec("spec/template/metadata/labels", True, "ReplicationController", version="v1"),
+    field_spec("spec/selector/matchLabels", True, "Deployment"),
+    field_spec("spec/template/metadata/labels", True, "Deployment"),
+    field_spec("spec/selector/matchLabels", True, "ReplicaSet"),
+    field_spec("spec/template/metadata/labels", True, "ReplicaSet"),
+    field_spec("spec/selector/matchLabels", True, "DaemonSet"),
+    field_spec("spec/template/metadata/labels", True, "DaemonSet"),
+    field_spec("spec/selector/matchLabels", True, "StatefulSet", group="apps"),
+    field_spec("spec/template/metadata/labels", True, "StatefulSet", group="apps"),
+    field_spec("spec/volumeClaimTemplates/metadata/labels", True, "StatefulSet", group="apps"),
+    field_spec("spec/selector/matchLabels", False, "Job", group="batch"),
+    field_spec("spec/template/metadata/labels", True, "Job", group="batch"),
+    field_spec("spec/jobTemplate/spec/selector/matchLabels", False, "CronJob", group="batch"),
+    field_spec("spec/jobTemplate/metadata/labels", True, "CronJob", group="batch"),
+    field_spec("spec/jobTemplate/spec/template/metadata/labels", True, "CronJob", group="batch"),
+    field_spec("spec/selector/matchLabels", False, "PodDisruptionBudget", group="policy"),
+    field_spec("spec/podSelector/matchLabels", False, "NetworkPolicy", group="networking.k8s.io"),
+    field_spec("spec/ingress/from/podSelector/matchLabels", False, "NetworkPolicy",
+               group="networking.k8s.io"),
+    field_spec("spec/egress/to/podSelector/matchLabels", False, "NetworkPolicy",
+               group="networking.k8s.io"),
+)
+
+ResourceId = Tuple[str, str, Optional[str], str]
+
+
+def get_group_version(obj: dict) -> Tuple[str, str]:
+    group, _, version = str(obj.get("apiVersion") or "").rpartition("/")
+    return group, version
+
+
+def get_resource_id(obj: dict) -> ResourceId:
+    metadata = obj.get("metadata") or {}
+    group, _ = get_group_version(obj)
+    return group, obj.get("kind", ""), metadata.get("namespace") or None, metadata.get("name", "")
+
+
+def find_kustomization(root: Path) -> Optional[Path]:
+    for filename in KUSTOMIZATION_FILENAMES:
+        if (root / filename).is_file():
+            return root / filename
+    return None
+
+
+def load_yaml_documents(content: str, source: Any) -> List[Any]:
+    try:
+        return [d for d in yaml.safe_load_all(content) if d is not None]
+    except yaml.YAMLError as e:
+        raise UnsupportedKustomization(f"Invalid yaml in {source}: {e}")
+
+
+def merge_values(node: Any, path: Tuple[str, ...], values: Dict[str, str], create: bool):
+    """Merge values into the map by path, lists on the path are merged item by item"""
+    if isinstance(node, list):
+        for item in node:
+            merge_values(item, path, values, create)
+        return
+    if not isinstance(node, dict):
+        return
+    key, rest = path[0], path[1:]
+    child = node.get(key)
+    if child is None:
+        if not create:
+            return
+        child = node[key] = {}
+    if rest:
+        merge_values(child, rest, values, create)
+    elif isinstance(child, dict):
+        child.update(values)
+    else:
+        raise UnsupportedKustomization(f"Field {'/'.join(path)} is not a map")
+
+
+def match_image(name: str, image: str) -> bool:
+    return re.fullmatch(re.escape(name) + IMAGE_TAG_PATTERN, image) is not None
+
+
+def split_image(image: str) -> Tuple[str, str]:
+    """Returns name and tag (with `:` or `@`) of the image"""
+    end = len(image)
+    digest = image.find("@")
+    if digest != -1:
+        end = digest
+    tag = image.rfind(":", 0, end)
+    if tag != -1 and "/" not in image[tag:end]:
+        end = tag
+    return image[:end], image[end:]
+
+
+def set_image(image: str, update: dict) -> str:
+    name, tag = split_image(image)
+    if update.get("newName"):
+        name = update["newName"]
+    if update.get("newTag"):
+        tag = f":{update['newTag']}"
+    if update.get("digest"):
+        tag = f"@{update['digest']}"
+    return name + tag
+
+
+def update_images(node: Any, images: List[dict]):
+    """Update images of all containers and init containers of the object"""
+    if isinstance(node, list):
+        for item in node:
+            update_images(item, images)
+        return
+    if not isinstance(node, dict):
+        return
+    for key, value in node.items():
+        if key in ("containers", "initContainers") and isinstance(value, list):
+            for container in value:
+                image = container.get("image") if isinstance(container, dict) else None
+                if not isinstance(image, str):
+                    continue
+                for update in images:
+                    if match_image(update["name"], image):
+                        container["image"] = set_image(image, update)
+                        break
+        else:
+            update_images(value, images)
+
+
+def get_merge_key(key: str, path: Tuple[str, ...], kind: str,
+                  target: List[Any], patch: List[Any]) -> Optional[str]:
+    if key == "ports":
+        return "port" if kind == "Service" and path == ("spec",) else "containerPort"
+    if key in MERGE_KEYS:
+        return MERGE_KEYS[key]
+    items = [i for i in target + patch if isinstance(i, dict)]
+    if items and any(k in i for i in items for k in ASSOCIATIVE_KEYS):
+        # kustomize guesses merge keys of such lists
+        raise UnsupportedKustomization(f"Unknown merge key of {key}")
+    return None
+
+
+def get_patch_directive(patch: dict) -> Optional[str]:
+    directive = patch.get("$patch")
+    if directive not in (None, "merge", "replace", "delete"):
+        raise UnsupportedKustomization(f"Unsupported patch directive {directive}")
+    if any(isinstance(k, str) and k.startswith("$") and k != "$patch" for k in patch):
+        raise UnsupportedKustomization("Unsupported patch directive")
+    return directive
+
+
+def without_directive(patch: dict) -> dict:
+    return {k: v for k, v in patch.items() if k != "$patch"}
+
+
+def merge_list(target: List[Any], patch: List[Any], key: str,
+               path: Tuple[str, ...], kind: str) -> List[Any]:
+    if key in MERGED_PRIMITIVE_LISTS and not any(isinstance(i, dict) for i in target + patch):
+        return target + [i for i in patch if i not in target]
+
+    merge_key = get_merge_key(key, path, kind, target, patch)
+    if merge_key is None:
+        return [strip_directives(i) for i in patch]
+
+    result = list(target)
+    for item in patch:
+        if not isinstance(item, dict) or merge_key not in item:
+            raise UnsupportedKustomization(f"Missing merge key {merge_key} in {key}")
+        directive = get_patch_directive(item)
+        index = next(
+            (i for i, t in enumerate(result)
+             if isinstance(t, dict) and t.get(merge_key) == item[merge_key]),
+            None,
+        )
+        if directive == "delete":
+            if index is not None:
+                del result[index]
+        elif index is None:
+            result.append(strip_directives(without_directive(item)))
+        elif directive == "replace":
+            result[index] = strip_directives(without_directive(item))
+        else:
+            result[index] = merge_patch(result[index], item, path + (key,), kind)
+    return result
+
+
+def strip_directives(value: Any) -> Any:
+    if isinstance(value, dict):
+        get_patch_directive(value)
+        return {k: strip_directives(v) for k, v in value.items() if k != "$patch"}
+    if isinstance(value, list):
+        return [strip_directives(v) for v in value]
+    return value
+
+
+def merge_patch(target: Any, patch: Any, path: Tuple[str, ...], kind: str) -> Any:
+    """Strategic merge patch of Kubernetes types"""
+    if not isinstance(patch, dict) or not isinstance(target, dict):
+        return strip_directives(patch)
+    directive = get_patch_directive(patch)
+    if directive == "replace":
+        return strip_directives(without_directive(patch))
+
+    result = dict(target)
+    for key, value in patch.items():
+        if key == "$patch":
+            continue
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict) and value.get("$patch") == "delete":
+            get_patch_directive(value)
+            result.pop(key, None)
+        elif isinstance(value, dict):
+            current = result.get(key)
+            result[key] = merge_patch(
+                current if isinstance(current, dict) else {}, value, path + (key,), kind
+            )
+        elif isinstance(value, list):
+            current = result.get(key)
+            result[key] = merge_list(
+                current if isinstance(current, list) else [], value, key, path, kind
+            )
+        else:
+            result[key] = strip_directives(value)
+    return result
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise UnsupportedKustomization(f"Invalid JSON pointer {pointer}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in pointer[1:].split("/")]
+
+
+def resolve_pointer(obj: Any, parts: List[str]) -> Any:
+    for part in parts:
+        if isinstance(obj, dict) and part in obj:
+            obj = obj[part]
+        elif isinstance(obj, list) and part.isdigit() and int(part) < len(obj):
+            obj = obj[int(part)]
+        else:
+            raise UnsupportedKustomization(f"Missing path /{'/'.join(parts)}")
+    return obj
+
+
+def add_value(obj: Any, parts: List[str], value: Any):
+    parent = resolve_pointer(obj, parts[:-1])
+    key = parts[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list) and key == "-":
+        parent.append(value)
+    elif isinstance(parent, list) and key.isdigit() and int(key) <= len(parent):
+        parent.insert(int(key), value)
+    else:
+        raise UnsupportedKustomization(f"Invalid path /{'/'.join(parts)}")
+
+
+def remove_value(obj: Any, parts: List[str]) -> Any:
+    parent = resolve_pointer(obj, parts[:-1])
+    key = parts[-1]
+    resolve_pointer(parent, [key])
+    return parent.pop(int(key) if isinstance(parent, list) else key)
+
+
+def apply_json_patch(obj: dict, operations: List[Any]) -> dict:
+    """JSON patch (RFC 6902) of the object"""
+    obj = copy.deepcopy(obj)
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise UnsupportedKustomization("Invalid JSON patch operation")
+        op, parts = operation.get("op"), parse_pointer(operation.get("path", ""))
+        if not parts:
+            raise UnsupportedKustomization("JSON patch of the whole object")
+        if op == "add":
+            add_value(obj, parts, copy.deepcopy(operation.get("value")))
+        elif op == "remove":
+            remove_value(obj, parts)
+        elif op == "replace":
+            remove_value(obj, parts)
+            add_value(obj, parts, copy.deepcopy(operation.get("value")))
+        elif op == "move":
+            value = remove_value(obj, parse_pointer(operation.get("from", "")))
+            add_value(obj, parts, value)
+        elif op == "copy":
+            value = resolve_pointer(obj, parse_pointer(operation.get("from", "")))
+            add_value(obj, parts, copy.deepcopy(value))
+        elif op == "test":
+            if resolve_pointer(obj, parts) != operation.get("value"):
+                raise UnsupportedKustomization(f"Failed test of {operation['path']}")
+        else:
+            raise UnsupportedKustomization(f"Unsupported JSON patch operation {op}")
+    return obj
+
+
+def get_legacy_order(obj: dict) -> Tuple[int, str, str, str]:
+    group, version = get_group_version(obj)
+    kind = obj.get("kind") or ""
+    gvk = "_".join((group or "~G", version or "~V", kind or "~K"))
+    metadata = obj.get("metadata") or {}
+    if kind in CLUSTER_SCOPED_KINDS:
+        namespace = "_non_namespaceable_"
+    else:
+        namespace = metadata.get("namespace") or "default"
+    return TYPE_ORDERS.get(kind, 0), gvk, namespace, metadata.get("name") or ""
+
+
+class KustomizationRenderer:
+    """
+    In-process renderer of kustomizations
+
+    Only resources, bases, namespace, commonLabels, commonAnnotations,
+    images and patches are rendered, UnsupportedKustomization is raised
+    for other features and for anything kustomize would reject, so the
+    kustomization could be built by kustomize.
+
+    Example:
+
+        >>> KustomizationRenderer().render("/proj/overlays/stage")
+        'apiVersion: v1\\nkind: Service\\n...'
+    """
+
+    def __init__(self):
+        self._stack: Set[Path] = set()
+
+    def load_file(self, root: Path, ref: str) -> Tuple[Path, str]:
+        filename = (root / ref).resolve()
+        # kustomize loads files only from the kustomization root
+        if root not in filename.parents:
+            raise UnsupportedKustomization(f"{ref} is not in or below {root}")
+        try:
+            return filename, filename.read_text(encoding="utf-8")
+        except OSError as e:
+            raise UnsupportedKustomization(f"Could not read {filename}: {e}")
+
+    def load_patches(self, root: Path, ref: str) -> List[Any]:
+        if "\n" in ref:
+            return load_yaml_documents(ref, "inline patch")
+        filename, content = self.load_file(root, ref)
+        return load_yaml_documents(content, filename)
+
+    def load_resources(self, root: Path, refs: List[Any]) -> List[dict]:
+        objects = []
+        for ref in refs:
+            if not isinstance(ref, str) or "://" in ref or ref.startswith(("github.com/", "git@")):
+                raise UnsupportedKustomization(f"Unsupported resource {ref}")
+            target = (root / ref).resolve()
+            if target.is_dir():
+                objects.extend(self.render_objects(target))
+                continue
+            filename, content = self.load_file(root, ref)
+            for obj in load_yaml_documents(content, filename):
+                if not isinstance(obj, dict) or not obj.get("kind"):
+                    raise UnsupportedKustomization(f"Invalid resource in {filename}")
+                if obj["kind"].endswith("List") and "items" in obj:
+                    raise UnsupportedKustomization(f"Lists are not supported: {filename}")
+                objects.append(obj)
+
+        ids = [get_resource_id(o) for o in objects]
+        if len(set(ids)) != len(ids):
+            raise UnsupportedKustomization(f"Resources with the same id in {root}")
+        return objects
+
+    def select(self, objects: List[dict], target: Any) -> List[int]:
+        if not isinstance(target, dict):
+            raise UnsupportedKustomization(f"Invalid patch target {target}")
+        if set(target) - {"group", "version", "kind", "name", "namespace"}:
+            raise UnsupportedKustomization(f"Unsupported patch target {target}")
+        selected = []
+        for i, obj in enumerate(objects):
+            group, version = get_group_version(obj)
+            fields = {
+                "group": group,
+                "version": version,
+                "kind": obj.get("kind") or "",
+                "name": (obj.get("metadata") or {}).get("name") or "",
+                "namespace": (obj.get("metadata") or {}).get("namespace") or "",
+            }
+            if all(re.fullmatch(str(target[k]), v) for k, v in fields.items() if target.get(k)):
+                selected.append(i)
+        return selected
+
+    def find_patched(self, objects: List[dict], patch: dict) -> int:
+        group, kind, namespace, name = get_resource_id(patch)
+        matches = [
+            i for i, obj in enumerate(objects)
+            if get_resource_id(obj)[:2] == (group, kind)
+            and get_resource_id(obj)[3] == name
+            and (namespace is None or get_resource_id(obj)[2] == namespace)
+        ]
+        if len(matches) != 1:
+            raise UnsupportedKustomization(f"No unique target of patch {kind}/{name}")
+        return matches[0]
+
+    def merge_patch(self, objects: List[dict], index: int, patch: dict) -> Optional[dict]:
+        obj = objects[index]
+        group, _ = get_group_version(obj)
+        if group not in BUILTIN_GROUPS:
+            raise UnsupportedKustomization(f"Strategic merge patch of {obj.get('kind')}")
+        if patch.get("$patch") == "delete":
+            return None
+        patch = {k: v for k, v in patch.items() if k not in ("apiVersion", "kind")}
+        # the patch is found by name and namespace, they are never changed
+        patch["metadata"] = {
+            k: v for k, v in (patch.get("metadata") or {}).items()
+            if k not in ("name", "namespace")
+        }
+        return merge_patch(obj, patch, (), obj.get("kind") or "")
+
+    def apply_strategic_merge_patches(self, objects: List[dict], patches: List[Any],
+                                      target: Any = None) -> List[dict]:
+        for patch in patches:
+            if not isinstance(patch, dict):
+                raise UnsupportedKustomization("Invalid strategic merge patch")
+            indexes = [self.find_patched(objects, patch)] if target is None \
+                else self.select(objects, target)
+            patched = {i: self.merge_patch(objects, i, patch) for i in indexes}
+            objects = [
+                patched[i] if i in patched else obj
+                for i, obj in enumerate(objects)
+                if not (i in patched and patched[i] is None)
+            ]
+        return objects
+
+    def apply_patches(self, root: Path, field: str, objects: List[dict],
+                      patches: Any) -> List[dict]:
+        if not isinstance(patches, list):
+            raise UnsupportedKustomization(f"Invalid {field}")
+        for patch in patches:
+            if field == "patchesStrategicMerge":
+                if not isinstance(patch, str):
+                    raise UnsupportedKustomization("Invalid strategic merge patch")
+                objects = self.apply_strategic_merge_patches(objects, self.load_patches(root, patch))
+                continue
+
+            if not isinstance(patch, dict) or set(patch) - {"path", "patch", "target"}:
+                raise UnsupportedKustomization(f"Unsupported patch {patch}")
+            if patch.get("path"):
+                documents = self.load_patches(root, patch["path"])
+            else:
+                documents = load_yaml_documents(patch.get("patch") or "", "inline patch")
+            target = patch.get("target")
+
+            if field == "patchesJson6902" or (len(documents) == 1 and isinstance(documents[0], list)):
+                if len(documents) != 1 or not isinstance(documents[0], list) or target is None:
+                    raise UnsupportedKustomization(f"Invalid JSON patch {patch}")
+                for i in self.select(objects, target):
+                    objects[i] = apply_json_patch(objects[i], documents[0])
+            else:
+                objects = self.apply_strategic_merge_patches(objects, documents, target)
+        return objects
+
+    def set_namespace(self, objects: List[dict], namespace: Any) -> List[dict]:
+        namespace = str(namespace)
+        for obj in objects:
+            kind = obj.get("kind")
+            if kind in NAMESPACE_REFERENCE_KINDS:
+                raise UnsupportedKustomization(f"Namespace of {kind}")
+            if kind not in CLUSTER_SCOPED_KINDS:
+                obj.setdefault("metadata", {})
+                if obj["metadata"] is None:
+                    obj["metadata"] = {}
+                obj["metadata"]["namespace"] = namespace
+        return objects
+
+    def set_fields(self, objects: List[dict], specs: Tuple[FieldSpec, ...],
+                   values: Any) -> List[dict]:
+        if not isinstance(values, dict) or not all(
+                isinstance(k, str) and isinstance(v, str) for k, v in values.items()):
+            raise UnsupportedKustomization("Labels and annotations must be strings")
+        for obj in objects:
+            for spec in specs:
+                if spec.matches(obj):
+                    merge_values(obj, spec.path, values, spec.create)
+        return objects
+
+    def set_labels(self, objects: List[dict], labels: Any) -> List[dict]:
+        for obj in objects:
+            for pod_spec in POD_SPEC_PATHS.select(obj):
+                if isinstance(pod_spec, dict) and (
+                        pod_spec.get("affinity") or pod_spec.get("topologySpreadConstraints")):
+                    raise UnsupportedKustomization("Labels of objects with affinity")
+        return self.set_fields(objects, LABEL_FIELD_SPECS, labels)
+
+    def set_annotations(self, objects: List[dict], annotations: Any) -> List[dict]:
+        return self.set_fields(objects, ANNOTATION_FIELD_SPECS, annotations)
+
+    def set_images(self, objects: List[dict], images: Any) -> List[dict]:
+        # numbers are not supported, as yaml does not keep their form
+        if not isinstance(images, list) or not all(
+                isinstance(i, dict) and isinstance(i.get("name"), str)
+                and not set(i) - {"name", "newName", "newTag", "digest"}
+                and all(isinstance(v, str) for v in i.values())
+                for i in images):
+            raise UnsupportedKustomization(f"Unsupported images {images}")
+        for obj in objects:
+            update_images(obj, images)
+        return objects
+
+    def render_objects(self, path: PathLike) -> List[dict]:
+        """Returns objects of the kustomization in the order of resources"""
+        root = Path(path).resolve()
+        filename = find_kustomization(root)
+        if filename is None:
+            raise UnsupportedKustomization(f"Missing kustomization in {root}")
+        if root in self._stack:
+            raise UnsupportedKustomization(f"Cycle of kustomizations in {root}")
+        documents = load_yaml_documents(filename.read_text(encoding="utf-8"), filename) or [{}]
+        kustomization = documents[0]
+        if len(documents) != 1 or not isinstance(kustomization, dict):
+            raise UnsupportedKustomization(f"Invalid kustomization {filename}")
+        unsupported = set(kustomization) - SUPPORTED_FIELDS
+        if unsupported:
+            raise UnsupportedKustomization(f"Unsupported fields: {', '.join(sorted(unsupported))}")
+        if kustomization.get("kind", "Kustomization") != "Kustomization":
+            raise UnsupportedKustomization(f"Unsupported kind {kustomization['kind']}")
+
+        self._stack.add(root)
+        try:
+            objects = self.load_resources(
+                root, (kustomization.get("resources") or []) + (kustomization.get("bases") or [])
+            )
+        finally:
+            self._stack.discard(root)
+
+        transformers: Dict[str, Callable[[List[dict], Any], List[dict]]] = {
+            "patchesStrategicMerge": partial(self.apply_patches, root, "patchesStrategicMerge"),
+            "patches": partial(self.apply_patches, root, "patches"),
+            "patchesJson6902": partial(self.apply_patches, root, "patchesJson6902"),
+            "namespace": self.set_namespace,
+            "commonLabels": self.set_labels,
+            "commonAnnotations": self.set_annotations,
+            "images": self.set_images,
+        }
+        for transformer in TRANSFORMERS:
+            value = kustomization.get(transformer)
+            if value:
+                objects = transformers[transformer](objects, value)
+        return objects
+
+    def render(self, path: PathLike) -> str:
+        """Returns manifests of the kustomization as `kustomize build` does"""
+        objects = sorted(self.render_objects(path), key=get_legacy_order)
+        return dump_manifests(objects)
+
+
+def dump_manifests(objects: List[dict]) -> str:
+    return yaml.dump_all(
+        objects,
+        Dumper=KustomizationDumper,
+        default_flow_style=False,
+        sort_keys=True,
+        width=2 ** 31,
+    )
+
+
+def iter_documents(content: str) -> Iterator[dict]:
+    for obj in yaml.safe_load_all(content):
+        if obj is not None:
+            yield obj
+
+
+def normalize_manifests(content: str) -> str:
+    """
+    Returns manifests in canonical form: sorted keys, same quotes and
+    document separators, so output of kustomize could be compared
+    """
+    return dump_manifests(list(iter_documents(content)))
+
+
+def render_kustomization(path: PathLike) -> str:
+    """
+    Render kustomization in-process
+
+    Example:
+
+        >>> render_kustomization("/proj/overlays/stage")
+        'apiVersion: v1\\nkind: ConfigMap\\n...'
+    """
+    return KustomizationRenderer().render(path)
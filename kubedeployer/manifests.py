@@ -1,5 +1,7 @@
+import functools
 import re
-from typing import Iterable, Tuple, Optional, Any
+from collections import defaultdict
+from typing import Iterable, Iterator, Tuple, Optional, Any, Dict, List, Union
 
 import yaml
 
@@ -29,32 +31,271 @@ class InvalidRolloutResource(ManifestError):
     pass
 
 
+class InvalidSelector(ManifestError):
+    pass
+
+
+WILDCARD = "*"
+
+SELECTOR_PATTERN = re.compile(
+    r"(?:[^.\[\]|]+|\[(?:\*|-?\d+)\])(?:\.[^.\[\]|]+|\[(?:\*|-?\d+)\])*"
+)
+STEP_PATTERN = re.compile(r"([^.\[\]|]+)|\[(\*|-?\d+)\]")
+
+Step = Union[str, int]
+
+
+def select_path(obj: Any, steps: Tuple[Step, ...]) -> List[Any]:
+    values = [obj]
+    for step in steps:
+        selected = []
+        for value in values:
+            if step is WILDCARD:
+                if isinstance(value, list):
+                    selected.extend(value)
+            elif isinstance(step, int):
+                if isinstance(value, list) and -len(value) <= step < len(value):
+                    selected.append(value[step])
+            elif isinstance(value, dict):
+                item = value.get(step)
+                if item is not None:
+                    selected.append(item)
+        values = selected
+        if not values:
+            break
+    return [v for v in values if v is not None]
+
+
+def get_path(obj: Any, steps: Tuple[Step, ...]) -> Optional[Any]:
+    for step in steps:
+        if isinstance(step, int):
+            if not isinstance(obj, list) or not -len(obj) <= step < len(obj):
+                return None
+            obj = obj[step]
+        elif isinstance(obj, dict):
+            obj = obj.get(step)
+        else:
+            return None
+    return obj
+
+
+class Selector:
+    """
+    Compiled selector of object fields
+
+    Path is a dotted path with list indexes (`[0]`) and wildcards (`[*]`),
+    alternatives are separated by `|`. Selectors with wildcards return
+    lists of all found values, other selectors return the first found
+    value or None.
+
+    Example:
+
+        >>> selector = compile_selector("spec.template.spec.containers[*].image")
+        >>> selector(deployment)
+        ['registry.local/application:latest', 'nginx:1.15']
+        >>> compile_selector("spec.replicas")(deployment)
+        2
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.alternatives: Tuple[Tuple[Step, ...], ...] = tuple(
+            parse_path(p) for p in path.split("|")
+        )
+        self.many = any(WILDCARD in steps for steps in self.alternatives)
+
+    def __repr__(self) -> str:
+        return f"Selector({self.path!r})"
+
+    def __call__(self, obj: Any) -> Union[Optional[Any], List[Any]]:
+        if self.many:
+            return self.select(obj)
+        return self.first(obj)
+
+    def select(self, obj: Any) -> List[Any]:
+        """Returns all found values of all alternatives"""
+        if len(self.alternatives) == 1:
+            return select_path(obj, self.alternatives[0])
+        values = []
+        for steps in self.alternatives:
+            values.extend(select_path(obj, steps))
+        return values
+
+    def first(self, obj: Any) -> Optional[Any]:
+        """Returns the first found value or None"""
+        for steps in self.alternatives:
+            if WILDCARD in steps:
+                values = select_path(obj, steps)
+                value = values[0] if values else None
+            else:
+                value = get_path(obj, steps)
+            if value is not None:
+                return value
+        return None
+
+
+def parse_path(path: str) -> Tuple[Step, ...]:
+    path = path.strip()
+    if not SELECTOR_PATTERN.fullmatch(path):
+        raise InvalidSelector(f"Invalid selector: {path!r}")
+    steps = []
+    for key, index in STEP_PATTERN.findall(path):
+        if key:
+            steps.append(key)
+        elif index == WILDCARD:
+            steps.append(WILDCARD)
+        else:
+            steps.append(int(index))
+    return tuple(steps)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_selector(path: str) -> Selector:
+    """Returns compiled selector, selectors are compiled once per path"""
+    return Selector(path)
+
+
+KIND = compile_selector("kind")
+NAME = compile_selector("metadata.name")
+NAMESPACE = compile_selector("metadata.namespace")
+
+# Init containers go first, CronJob keeps pod template in the job template
+IMAGES = compile_selector("|".join(
+    f"{template}.spec.{containers}[*].image"
+    for template in ("spec.template", "spec.jobTemplate.spec.template")
+    for containers in ("initContainers", "containers")
+))
+
+
 class Manifest(dict):
 
     @property
     def kind(self) -> str:
-        return self.get_item("kind")
+        return KIND.first(self)
 
     @property
     def name(self) -> str:
-        return self.get_item("metadata.name")
+        return NAME.first(self)
 
     @property
     def namespace(self) -> Optional[str]:
-        return self.get_item("metadata.namespace")
+        return NAMESPACE.first(self) or None
 
     def get_item(self, path: str) -> Optional[Any]:
+        return compile_selector(path).first(self) or None
+
+
+# LibYAML loader is much faster on big bundles, if it is available
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-        def get(obj: dict, location: str) -> Optional[Any]:
-            if obj and "." in location:
-                item, loc = location.split(".", maxsplit=1)
-                return get(obj.get(item), loc)
-            return obj and obj.get(location) or None
 
-        return get(self, path)
+class ManifestSet:
+    """
+    Kubernetes objects of the rendered bundle parsed once
+
+    Objects are kept in the order of the bundle and indexed by kind,
+    namespace and name.
+
+    Example:
 
+        >>> manifests = ManifestSet.parse(content)
+        >>> manifests.by_kind("Deployment", "StatefulSet")
+        [{'apiVersion': 'apps/v1', 'kind': 'Deployment', ...}]
+        >>> manifests.get("Service", "application")
+        {'apiVersion': 'v1', 'kind': 'Service', ...}
+        >>> list(manifests.get_images(r".*:latest", unique=True))
+        ['registry.local/application:latest']
+    """
 
-def get_manifests(content: str, kind=r".+") -> Iterable[Manifest]:
+    def __init__(self, manifests: Iterable[Manifest], content: str = ""):
+        self.content = content
+        self._manifests: List[Manifest] = list(manifests)
+        self._by_kind: Dict[str, List[Manifest]] = defaultdict(list)
+        self._by_namespace: Dict[Optional[str], List[Manifest]] = defaultdict(list)
+        self._by_name: Dict[Tuple[str, Optional[str], str], Manifest] = {}
+        for manifest, kind, name, namespace in zip(
+                self._manifests, *self.columns(KIND, NAME, NAMESPACE)):
+            namespace = namespace or None
+            self._by_kind[kind].append(manifest)
+            self._by_namespace[namespace].append(manifest)
+            self._by_name[(kind, namespace, name)] = manifest
+
+    @classmethod
+    def parse(cls, content: str) -> "ManifestSet":
+        """Returns all Kubernetes objects of yaml content"""
+        return cls(
+            (
+                Manifest(obj)
+                for obj in yaml.load_all(content, Loader=Loader)
+                if isinstance(obj, dict) and obj.get("apiVersion") and obj.get("kind")
+            ),
+            content=content,
+        )
+
+    def __iter__(self) -> Iterator[Manifest]:
+        return iter(self._manifests)
+
+    def __len__(self) -> int:
+        return len(self._manifests)
+
+    def by_kind(self, *kinds: str) -> List[Manifest]:
+        if len(kinds) == 1:
+            return list(self._by_kind.get(kinds[0], []))
+        return [m for m, kind in zip(self._manifests, *self.columns(KIND)) if kind in kinds]
+
+    def columns(self, *selectors: Union[str, Selector],
+                kinds: Iterable[str] = ()) -> List[List[Any]]:
+        """
+        Returns values of selectors for every manifest in one pass, a list
+        of values per selector
+
+        Example:
+
+            >>> kinds, names, images = manifests.columns(
+            ...     "kind", "metadata.name", "spec.template.spec.containers[*].image",
+            ... )
+            >>> list(zip(kinds, names, images))
+            [('Deployment', 'application', ['registry.local/application:latest']), ...]
+        """
+        compiled = [s if isinstance(s, Selector) else compile_selector(s) for s in selectors]
+        manifests = self.by_kind(*kinds) if kinds else self._manifests
+        columns = [[] for _ in compiled]
+        for manifest in manifests:
+            for column, selector in zip(columns, compiled):
+                column.append(selector(manifest))
+        return columns
+
+    def by_namespace(self, namespace: Optional[str]) -> List[Manifest]:
+        return list(self._by_namespace.get(namespace, []))
+
+    def get(self, kind: str, name: str, namespace: Optional[str] = None) -> Optional[Manifest]:
+        return self._by_name.get((kind, namespace, name))
+
+    def get_manifests(self, kind=r".+") -> Iterator[Manifest]:
+        """Returns manifests with spec which kind matches by template"""
+        for manifest in self._manifests:
+            if manifest.get("spec") and re.match(kind, manifest.kind):
+                yield manifest
+
+    def get_images(self, pattern: str = r".+", unique: bool = False) -> Iterator[str]:
+        """Returns docker image names, see `get_images`"""
+        unique_images = set()
+        matcher = re.compile(pattern)
+
+        for images in self.columns(IMAGES, kinds=WORKLOAD_RESOURCES)[0]:
+            for image in images:
+                if matcher.match(image) and image not in unique_images:
+                    unique and unique_images.add(image)
+                    yield image
+
+
+def to_manifest_set(content: Union[str, ManifestSet]) -> ManifestSet:
+    if isinstance(content, ManifestSet):
+        return content
+    return ManifestSet.parse(content)
+
+
+def get_manifests(content: Union[str, ManifestSet], kind=r".+") -> Iterable[Manifest]:
     """
     Returns manifests from yaml file
 
@@ -68,21 +309,23 @@ def get_manifests(content: str, kind=r".+") -> Iterable[Manifest]:
         # Returns only manifests with kind `Deployment` or 'Service`
         >>> manifests = list(get_manifests(content, kind="Deployment|Service"))
     """
+    return to_manifest_set(content).get_manifests(kind)
+
+
+def get_objects(content: Union[str, ManifestSet]) -> Iterable[Manifest]:
+    """
+    Returns all Kubernetes objects from yaml file, including objects
+    without spec (ex.: ConfigMap, Secret)
 
-    def validate(obj: dict) -> bool:
-        return obj \
-               and obj.get("apiVersion") \
-               and obj.get("kind") \
-               and obj.get("spec")
+    Example:
 
-    for manifest in yaml.safe_load_all(content):
-        if not (validate(manifest) and re.match(kind, manifest.get("kind"))):
-            continue
-        yield Manifest(manifest)
+        >>> objects = list(get_objects(content))
+    """
+    return iter(to_manifest_set(content))
 
 
-def get_images(content: str, pattern: str = r".+", unique: bool = False) -> \
-        Iterable[str]:
+def get_images(content: Union[str, ManifestSet], pattern: str = r".+",
+               unique: bool = False) -> Iterable[str]:
     """
     Returns docker image names from yaml file
 
@@ -97,28 +340,4 @@ def get_images(content: str, pattern: str = r".+", unique: bool = False) -> \
         # Returns only images that match by template
         >>> get_images(content, r".*:latest")
     """
-
-    def get_containers_path(kind: str) -> str:
-        if kind == "CronJob":
-            return "spec.jobTemplate.spec.template.spec"
-        return "spec.template.spec"
-
-    def get_containers(obj: Manifest, path: str) -> Iterable[Tuple[str, str]]:
-        containers = obj.get_item(path) or []
-        for container in containers:
-            yield container["name"], container["image"]
-
-    unique_images = set()
-
-    for manifest in get_manifests(content, kind="|".join(WORKLOAD_RESOURCES)):
-        path = get_containers_path(manifest.kind)
-
-        for _, image in get_containers(manifest, f"{path}.initContainers"):
-            if re.match(pattern, image) and image not in unique_images:
-                unique and unique_images.add(image)
-                yield image
-
-        for _, image in get_containers(manifest, f"{path}.containers"):
-            if re.match(pattern, image) and image not in unique_images:
-                unique and unique_images.add(image)
-                yield image
+    return to_manifest_set(content).get_images(pattern, unique)
@@ -0,0 +1,117 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from kubedeployer import console
+from kubedeployer.profiling import profiler
+
+StageResults = Dict[str, Any]
+
+
+class PipelineError(Exception):
+    pass
+
+
+@dataclass
+class Stage:
+    name: str
+    action: Callable[[StageResults], Any]
+    requires: Tuple[str, ...] = ()
+    title: Optional[str] = None
+
+
+class Pipeline:
+    """
+    Run stages as a dependency graph
+
+    Stage is started as soon as all stages it requires are finished, so
+    independent stages are running at the same time. Console output of
+    the stage is written under its title when the stage is finished.
+    Action of the stage receives results of finished stages by their
+    names. After the first failure no new stages are started, running
+    ones are waited for and the error is raised.
+
+    Example:
+
+        >>> pipeline = Pipeline([
+        ...     Stage("render", lambda r: "content"),
+        ...     Stage("login", lambda r: True),
+        ...     Stage("scan", lambda r: r["render"], requires=("render", "login")),
+        ... ])
+        >>> pipeline.run()
+        {'render': 'content', 'login': True, 'scan': 'content'}
+    """
+
+    def __init__(self, stages: Iterable[Stage]):
+        self._stages = {s.name: s for s in stages}
+        self._validate()
+
+    def _validate(self):
+        for stage in self._stages.values():
+            unknown = set(stage.requires) - set(self._stages)
+            if unknown:
+                raise PipelineError(
+                    f"Stage {stage.name} requires unknown stages: "
+                    f"{', '.join(sorted(unknown))}"
+                )
+
+        visited, path = set(), []
+
+        def visit(name: str):
+            if name in path:
+                cycle = path[path.index(name):] + [name]
+                raise PipelineError(f"Stages have cycle: {' -> '.join(cycle)}")
+            if name in visited:
+                return
+            path.append(name)
+            for required in self._stages[name].requires:
+                visit(required)
+            path.pop()
+            visited.add(name)
+
+        for name in self._stages:
+            visit(name)
+
+    def _run_stage(self, stage: Stage, results: StageResults) -> Any:
+        # output of the stage is written with its title when the stage is
+        # finished, otherwise it is mixed with output of concurrent stages
+        with console.buffered(), profiler.measure(stage.name):
+            if stage.title:
+                console.stage(stage.title)
+            return stage.action(results)
+
+    def run(self) -> StageResults:
+        results: StageResults = {}
+        pending = dict(self._stages)
+        running: Dict[Future, str] = {}
+        error: Optional[Exception] = None
+
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as executor:
+            while pending or running:
+                if error is None:
+                    ready = [
+                        s for s in pending.values()
+                        if all(r in results for r in s.requires)
+                    ]
+                    for stage in ready:
+                        del pending[stage.name]
+                        # stages see variables and console prefix of the caller
+                        context = contextvars.copy_context()
+                        future = executor.submit(context.run, self._run_stage, stage, dict(results))
+                        running[future] = stage.name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        error = error or e
+
+        if error is not None:
+            raise error
+        return results
@@ -0,0 +1,190 @@
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Literal, Optional
+
+import yaml
+from dotenv import dotenv_values
+from prettytable import PrettyTable, PLAIN_COLUMNS
+from pydantic import ValidationError, validator
+
+from kubedeployer import console
+from kubedeployer.deploy import DeployOptions, create_login_stages, create_stages, \
+    generate_deploy_id, load_environment_variables, profiled_run
+from kubedeployer.deployer import DEPLOYERS
+from kubedeployer.environ import override_environ
+from kubedeployer.gitlab_ci import specification
+from kubedeployer.gitlab_ci.environment_variables import settings
+from kubedeployer.pipeline import Pipeline, StageResults
+from kubedeployer.profiling import profiler
+from kubedeployer.types import BaseModel, PathLike
+
+
+class PlanError(Exception):
+    pass
+
+
+class Application(BaseModel):
+    manifest_folder: str
+    name: Optional[str] = None
+    deployer: Literal["orthodox", "kustomize", "smart"] = "smart"
+    environment: Optional[str] = None
+    env_files: List[str] = []
+    variables: Dict[str, str] = {}
+
+    @property
+    def title(self) -> str:
+        return self.name or self.manifest_folder
+
+    def get_variables(self) -> Dict[str, str]:
+        """
+        Returns environment variables of the application
+
+        Variables of env files are overridden by `variables`, manifest
+        folder and environment of the application are set last.
+        """
+        variables = {}
+        for file in self.env_files:
+            variables.update({k: v for k, v in dotenv_values(file).items() if v is not None})
+        variables.update(self.variables)
+        variables[specification.MANIFEST_FOLDER_ENV_VAR] = self.manifest_folder
+        if self.environment:
+            variables[specification.ENVIRONMENT_ENV_VAR] = self.environment
+        return variables
+
+
+class Plan(BaseModel):
+    """
+    Applications deployed by one run
+
+    Example of plan file:
+
+        workers: 4
+        applications:
+          - manifest_folder: apps/api
+            environment: production
+            variables:
+              KUBE_NAMESPACE: api
+          - name: worker
+            manifest_folder: apps/worker
+            deployer: kustomize
+            env_files: [apps/worker/.env]
+    """
+
+    applications: List[Application]
+    workers: Optional[int] = None
+
+    @validator("applications")
+    @classmethod
+    def names_are_unique(cls, applications: List[Application]) -> List[Application]:
+        titles = [a.title for a in applications]
+        duplicates = sorted({t for t in titles if titles.count(t) > 1})
+        if duplicates:
+            raise ValueError(f"application names are not unique: {', '.join(duplicates)}")
+        return applications
+
+    @classmethod
+    def load(cls, filename: PathLike) -> "Plan":
+        try:
+            return cls.parse_obj(yaml.safe_load(Path(filename).read_text(encoding="utf-8")))
+        except (OSError, yaml.YAMLError, ValidationError) as e:
+            raise PlanError(f"Invalid plan {filename}: {e}") from e
+
+    @classmethod
+    def from_folders(cls, manifest_folders: List[str], deployer: str = "smart") -> "Plan":
+        return cls(applications=[
+            Application(manifest_folder=folder, deployer=deployer)
+            for folder in manifest_folders
+        ])
+
+
+@dataclass
+class ApplicationResult:
+    name: str
+    succeeded: bool
+    duration: float
+    error: Optional[str] = None
+
+
+def deploy_application(application: Application, dry_run: bool = False,
+                       logged_in: Optional[StageResults] = None) -> ApplicationResult:
+    """
+    Deploy the application with its own variables, output and profile
+
+    Errors are not raised, they are returned by the result.
+    """
+    start = time.perf_counter()
+    with console.prefixed(f"[{application.title}] "), profiler.scope(application.title):
+        try:
+            variables = {**application.get_variables(), "DEPLOY": generate_deploy_id()}
+            with override_environ(variables):
+                manifests_path = Path(settings.ci_project_dir.value) / settings.manifest_folder.value
+                stages = create_stages(
+                    DEPLOYERS[application.deployer],
+                    Path(tempfile.mkdtemp()),
+                    manifests_path,
+                    DeployOptions(dry_run=dry_run, logged_in=logged_in),
+                )
+                Pipeline(stages).run()
+        except Exception as e:
+            console.error(str(e))
+            return ApplicationResult(application.title, False, time.perf_counter() - start, str(e))
+    return ApplicationResult(application.title, True, time.perf_counter() - start)
+
+
+def deploy_applications(applications: List[Application], dry_run: bool = False,
+                        logged_in: Optional[StageResults] = None,
+                        max_workers: int = 1) -> List[ApplicationResult]:
+    """Returns results of applications deployed by pool of workers in order of applications"""
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        futures = [
+            executor.submit(copy_context().run, deploy_application, a, dry_run, logged_in)
+            for a in applications
+        ]
+        return [f.result() for f in futures]
+
+
+def format_results(results: List[ApplicationResult]) -> str:
+    table = PrettyTable(field_names=["Application", "Status", "Duration", "Error"])
+    table.set_style(PLAIN_COLUMNS)
+    table.align["Application"] = "l"
+    table.align["Error"] = "l"
+    for r in results:
+        table.add_row([
+            r.name,
+            "succeeded" if r.succeeded else "failed",
+            f"{r.duration:.2f}s",
+            (r.error or "").strip().split("\n", maxsplit=1)[0],
+        ])
+    return table.get_string()
+
+
+def run(plan: Plan, dry_run: bool = False, env_files: List[str] | None = None):
+    """
+    Deploy applications of the plan
+
+    Login to docker registry and cluster is done once for all
+    applications, then applications are rendered, scanned, applied and
+    waited for at the same time by PLAN_WORKERS workers.
+    """
+    with profiled_run():
+        console.stage(f"Let's deploy {len(plan.applications)} applications!")
+        load_environment_variables(env_files)
+
+        logged_in = None if dry_run else Pipeline(create_login_stages()).run()
+        results = deploy_applications(
+            plan.applications,
+            dry_run=dry_run,
+            logged_in=logged_in,
+            max_workers=plan.workers or settings.plan_workers.value,
+        )
+
+        console.stage("Results of applications")
+        console.info(format_results(results), console.TAB)
+
+        failed = [r.name for r in results if not r.succeeded]
+        if failed:
+            raise PlanError(f"Deploy failed for {', '.join(failed)}")
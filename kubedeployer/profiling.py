@@ -0,0 +1,139 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Callable, Iterator, List
+
+from prettytable import PrettyTable, PLAIN_COLUMNS
+
+from kubedeployer.types import PathLike
+
+
+# Scope of measurements of the current context (ex.: name of the application)
+_scope: ContextVar[str] = ContextVar("profiler_scope", default="")
+
+
+@dataclass
+class Measurement:
+    name: str
+    wall_time: float
+    cpu_time: float
+    subprocess_time: float
+    memory_peak: int
+
+
+def _subprocess_time() -> float:
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class Profiler:
+    """
+    Collect time and memory usage of deploy stages
+
+    Measured values:
+        - wall_time: elapsed time of the stage;
+        - cpu_time: CPU time of the thread running the stage;
+        - subprocess_time: CPU time of finished child processes;
+        - memory_peak: peak of memory allocated by Python (in bytes),
+          measured only if tracemalloc is tracing.
+
+    Subprocess time and memory peak are counted for the whole process,
+    so they are shared by stages running at the same time.
+
+    Example:
+
+        >>> with profiler.measure("render"):
+        ...     render()
+        >>> print(profiler.format())
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._measurements: List[Measurement] = []
+
+    @property
+    def measurements(self) -> List[Measurement]:
+        return list(self._measurements)
+
+    def reset(self):
+        with self._lock:
+            self._measurements = []
+
+    @contextmanager
+    def scope(self, name: str) -> Iterator[None]:
+        """Measurements of the context are named `<scope>/<name>`"""
+        token = _scope.set(name)
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        scope = _scope.get()
+        if scope:
+            name = f"{scope}/{name}"
+        tracing = tracemalloc.is_tracing()
+        with self._lock:
+            if tracing and not self._active:
+                tracemalloc.reset_peak()
+            self._active += 1
+        memory_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        subprocess_start = _subprocess_time()
+        try:
+            yield
+        finally:
+            memory_peak = tracemalloc.get_traced_memory()[1] if tracing else 0
+            measurement = Measurement(
+                name=name,
+                wall_time=time.perf_counter() - wall_start,
+                cpu_time=time.thread_time() - cpu_start,
+                subprocess_time=_subprocess_time() - subprocess_start,
+                memory_peak=max(memory_peak - memory_start, 0),
+            )
+            with self._lock:
+                self._active -= 1
+                self._measurements.append(measurement)
+
+    def format(self) -> str:
+        table = PrettyTable(field_names=["Stage", "Wall", "CPU", "Subprocess", "Memory peak"])
+        table.set_style(PLAIN_COLUMNS)
+        table.align["Stage"] = "l"
+        for m in self._measurements:
+            table.add_row([
+                m.name,
+                f"{m.wall_time:.2f}s",
+                f"{m.cpu_time:.2f}s",
+                f"{m.subprocess_time:.2f}s",
+                f"{m.memory_peak / 2 ** 20:.1f} MiB",
+            ])
+        return table.get_string()
+
+    def dump(self, filename: PathLike):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump([asdict(m) for m in self._measurements], f, indent=2)
+
+
+profiler = Profiler()
+
+
+def measured(name: str) -> Callable:
+    """Decorator measuring every call of the function by profiler"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiler.measure(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -1,10 +1,36 @@
+from pathlib import Path
+from typing import Optional
+
+from kubedeployer.gitlab_ci.environment_variables import settings
+from kubedeployer.security.kubesec.cache import KubeSecurityCache
+from kubedeployer.security.kubesec.errors import KubeSecurityError
 from kubedeployer.security.kubesec.formatters import KubeSecurityConsoleStringFormatter
 from kubedeployer.security.kubesec.report import KubeSecurityReport
+from kubedeployer.security.kubesec.rules import KubeSecurityRuleEngine
 from kubedeployer.security.kubesec.scanner import KubeSecurityScanner
 
 
+def create_kube_security_cache() -> Optional[KubeSecurityCache]:
+    if not settings.cache_dir.value:
+        return None
+    try:
+        version = KubeSecurityScanner.get_version()
+    except KubeSecurityError:
+        return None
+    return KubeSecurityCache(
+        directory=Path(settings.cache_dir.value) / "kubesec",
+        version=version,
+    )
+
+
+def create_kube_security_scanner() -> KubeSecurityScanner:
+    if settings.kubesec_engine.value == "kubesec":
+        return KubeSecurityScanner(cache=create_kube_security_cache())
+    return KubeSecurityRuleEngine()
+
+
 def create_kube_security_report() -> KubeSecurityReport:
     return KubeSecurityReport(
-        scanner=KubeSecurityScanner(),
+        scanner=create_kube_security_scanner(),
         formatter=KubeSecurityConsoleStringFormatter()
     )
@@ -0,0 +1,56 @@
+import hashlib
+import json
+import uuid
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Optional
+
+from pydantic import ValidationError
+
+from kubedeployer.security.kubesec.data import KubeObject
+from kubedeployer.types import PathLike
+
+
+def get_object_hash(obj: dict) -> str:
+    """
+    Returns hash of the object in canonical form, so objects that differ
+    only in formatting or order of keys have the same hash
+    """
+    canonical = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class KubeSecurityCache:
+    """
+    On-disk cache of kubesec results for separate Kubernetes objects
+
+    Results are stored by hash of the object and version of kubesec.
+
+    Example:
+
+        >>> cache = KubeSecurityCache("/cache/kubesec", version="v2.11.5")
+        >>> cache.set(obj, kube_object)
+        >>> cache.get(obj)
+    """
+
+    def __init__(self, directory: PathLike, version: str):
+        self._directory = Path(directory)
+        self._version = version
+
+    def _filename(self, obj: dict) -> Path:
+        key = hashlib.sha256(f"{self._version}:{get_object_hash(obj)}".encode()).hexdigest()
+        return self._directory / f"{key}.json"
+
+    def get(self, obj: dict) -> Optional[KubeObject]:
+        try:
+            data = json.loads(self._filename(obj).read_text(encoding="utf-8"))
+            return KubeObject.parse_obj(data)
+        except (OSError, TypeError, JSONDecodeError, ValidationError):
+            return None
+
+    def set(self, obj: dict, kube_object: KubeObject):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        filename = self._filename(obj)
+        tmp_filename = filename.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_filename.write_text(kube_object.json(), encoding="utf-8")
+        tmp_filename.replace(filename)
@@ -1,3 +1,5 @@
+from typing import Iterable
+
 from kubedeployer.types import PathLike
 from kubedeployer.security.kubesec.formatters import KubeSecurityFormatter
 from kubedeployer.security.kubesec.scanner import KubeSecurityScanner
@@ -14,3 +16,7 @@ class KubeSecurityReport:
     def build(self, filename: PathLike):
         content = self._scanner.scan(filename)
         return self._formatter.format(content)
+
+    def build_manifests(self, objects: Iterable[dict]):
+        content = self._scanner.scan_manifests(objects)
+        return self._formatter.format(content)
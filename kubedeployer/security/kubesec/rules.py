@@ -0,0 +1,376 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+from kubedeployer.types import PathLike
+from kubedeployer.security.kubesec.data import KubeSecurityContent, KubeObject, ScoringRecord
+from kubedeployer.security.kubesec.errors import KubeSecurityContentError
+from kubedeployer.security.kubesec.scanner import KubeSecurityScanner
+
+RULES_VERSION = "v2"
+
+SUPPORTED_KINDS = (
+    "CronJob",
+    "DaemonSet",
+    "Deployment",
+    "Job",
+    "Pod",
+    "ReplicaSet",
+    "ReplicationController",
+    "StatefulSet",
+)
+
+
+@dataclass(frozen=True)
+class PodTemplate:
+    obj: dict
+    metadata: dict
+    spec: dict
+
+    @property
+    def containers(self) -> List[dict]:
+        return [
+            c or {}
+            for key in ("initContainers", "containers", "ephemeralContainers")
+            for c in self.spec.get(key) or []
+        ]
+
+    @property
+    def annotations(self) -> Dict[str, str]:
+        return {
+            **((self.obj.get("metadata") or {}).get("annotations") or {}),
+            **(self.metadata.get("annotations") or {}),
+        }
+
+    def security_context(self, container: dict) -> dict:
+        """
+        Returns security context of the container, fields that are not set
+        for the container are inherited from the pod
+        """
+        return {
+            **(self.spec.get("securityContext") or {}),
+            **(container.get("securityContext") or {}),
+        }
+
+
+def get_pod_template(obj: dict) -> PodTemplate:
+    spec = obj.get("spec") or {}
+    if obj.get("kind") == "Pod":
+        return PodTemplate(obj, obj.get("metadata") or {}, spec)
+    if obj.get("kind") == "CronJob":
+        spec = (spec.get("jobTemplate") or {}).get("spec") or {}
+    template = spec.get("template") or {}
+    return PodTemplate(obj, template.get("metadata") or {}, template.get("spec") or {})
+
+
+def any_container(predicate: Callable[[PodTemplate, dict], bool]) -> Callable[[PodTemplate], bool]:
+    return lambda pod: any(predicate(pod, c) for c in pod.containers)
+
+
+def security_context_is(field: str, value) -> Callable[[PodTemplate], bool]:
+    return any_container(lambda pod, c: pod.security_context(c).get(field) is value)
+
+
+def security_context_above(field: str, value: int) -> Callable[[PodTemplate], bool]:
+    def predicate(pod: PodTemplate, container: dict) -> bool:
+        field_value = pod.security_context(container).get(field)
+        return isinstance(field_value, int) and field_value > value
+    return any_container(predicate)
+
+
+def capabilities(container: dict, field: str) -> List[str]:
+    security_context = container.get("securityContext") or {}
+    return (security_context.get("capabilities") or {}).get(field) or []
+
+
+def resources(section: str, resource: str) -> Callable[[PodTemplate], bool]:
+    return any_container(
+        lambda _, c: bool(((c.get("resources") or {}).get(section) or {}).get(resource))
+    )
+
+
+def has_annotation(prefix: str) -> Callable[[PodTemplate], bool]:
+    return lambda pod: any(k.startswith(prefix) for k in pod.annotations)
+
+
+def has_seccomp_profile(pod: PodTemplate) -> bool:
+    if has_annotation("seccomp.security.alpha.kubernetes.io/")(pod) \
+            or has_annotation("container.seccomp.security.alpha.kubernetes.io/")(pod):
+        return True
+    return any(pod.security_context(c).get("seccompProfile") for c in pod.containers)
+
+
+def volume_claims(obj: dict) -> List[dict]:
+    return [
+        (claim or {}).get("spec") or {}
+        for claim in (obj.get("spec") or {}).get("volumeClaimTemplates") or []
+    ]
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    selector: str
+    reason: str
+    points: int
+    predicate: Callable[[PodTemplate], bool]
+    kinds: Optional[Tuple[str, ...]] = None
+
+    def supports(self, kind: str) -> bool:
+        return self.kinds is None or kind in self.kinds
+
+    def to_record(self) -> ScoringRecord:
+        return ScoringRecord(id=self.id, selector=self.selector, reason=self.reason)
+
+
+RULES = (
+    Rule(
+        id="AllowPrivilegeEscalation",
+        selector="containers[] .securityContext .allowPrivilegeEscalation == true",
+        reason="Ensure a non-root process can not gain more privileges",
+        points=-7,
+        predicate=security_context_is("allowPrivilegeEscalation", True),
+    ),
+    Rule(
+        id="CapSysAdmin",
+        selector="containers[] .securityContext .capabilities .add == SYS_ADMIN",
+        reason="CAP_SYS_ADMIN is the most privileged capability and should always be avoided",
+        points=-30,
+        predicate=any_container(lambda _, c: "SYS_ADMIN" in capabilities(c, "add")),
+    ),
+    Rule(
+        id="DockerSock",
+        selector="spec.volumes[] .hostPath .path == /var/run/docker.sock",
+        reason="Mounting the docker.socket leaks information about other containers "
+               "and can allow container breakout",
+        points=-9,
+        predicate=lambda pod: any(
+            ((v or {}).get("hostPath") or {}).get("path") == "/var/run/docker.sock"
+            for v in pod.spec.get("volumes") or []
+        ),
+    ),
+    Rule(
+        id="HostIPC",
+        selector=".spec .hostIPC == true",
+        reason="Sharing the host's IPC namespace allows container processes "
+               "to communicate with processes on the host",
+        points=-9,
+        predicate=lambda pod: pod.spec.get("hostIPC") is True,
+    ),
+    Rule(
+        id="HostNetwork",
+        selector=".spec .hostNetwork == true",
+        reason="Sharing the host's network namespace permits processes in the pod "
+               "to communicate with processes bound to the host's loopback adapter",
+        points=-9,
+        predicate=lambda pod: pod.spec.get("hostNetwork") is True,
+    ),
+    Rule(
+        id="HostPID",
+        selector=".spec .hostPID == true",
+        reason="Sharing the host's PID namespace allows visibility of processes "
+               "on the host, potentially leaking information such as environment "
+               "variables and configuration",
+        points=-9,
+        predicate=lambda pod: pod.spec.get("hostPID") is True,
+    ),
+    Rule(
+        id="Privileged",
+        selector="containers[] .securityContext .privileged == true",
+        reason="Privileged containers can allow almost completely unrestricted host access",
+        points=-30,
+        predicate=security_context_is("privileged", True),
+    ),
+    Rule(
+        id="ApparmorAny",
+        selector='.metadata .annotations ."container.apparmor.security.beta.kubernetes.io/nginx"',
+        reason="Well defined AppArmor policies may provide greater protection from "
+               "unknown threats. WARNING: NOT PRODUCTION READY",
+        points=3,
+        predicate=has_annotation("container.apparmor.security.beta.kubernetes.io/"),
+    ),
+    Rule(
+        id="ServiceAccountName",
+        selector=".spec .serviceAccountName",
+        reason="Service accounts restrict Kubernetes API access and should be "
+               "configured with least privilege",
+        points=3,
+        predicate=lambda pod: bool(pod.spec.get("serviceAccountName")),
+    ),
+    Rule(
+        id="AutomountServiceAccountToken",
+        selector=".spec .automountServiceAccountToken == false",
+        reason="Disabling the automounting of Service Account Token reduces "
+               "the attack surface of the API server",
+        points=1,
+        predicate=lambda pod: pod.spec.get("automountServiceAccountToken") is False,
+    ),
+    Rule(
+        id="CapDropAll",
+        selector='containers[] .securityContext .capabilities .drop | index("ALL")',
+        reason="Drop all capabilities and add only those required to reduce syscall attack surface",
+        points=1,
+        predicate=any_container(lambda _, c: "ALL" in capabilities(c, "drop")),
+    ),
+    Rule(
+        id="CapDropAny",
+        selector="containers[] .securityContext .capabilities .drop",
+        reason="Reducing kernel capabilities available to a container limits its attack surface",
+        points=1,
+        predicate=any_container(lambda _, c: bool(capabilities(c, "drop"))),
+    ),
+    Rule(
+        id="LimitsCPU",
+        selector="containers[] .resources .limits .cpu",
+        reason="Enforcing CPU limits prevents DOS via resource exhaustion",
+        points=1,
+        predicate=resources("limits", "cpu"),
+    ),
+    Rule(
+        id="LimitsMemory",
+        selector="containers[] .resources .limits .memory",
+        reason="Enforcing memory limits prevents DOS via resource exhaustion",
+        points=1,
+        predicate=resources("limits", "memory"),
+    ),
+    Rule(
+        id="ReadOnlyRootFilesystem",
+        selector="containers[] .securityContext .readOnlyRootFilesystem == true",
+        reason="An immutable root filesystem can prevent malicious binaries being "
+               "added to PATH and increase attack cost",
+        points=1,
+        predicate=security_context_is("readOnlyRootFilesystem", True),
+    ),
+    Rule(
+        id="RequestsCPU",
+        selector="containers[] .resources .requests .cpu",
+        reason="Enforcing CPU requests aids a fair balancing of resources across the cluster",
+        points=1,
+        predicate=resources("requests", "cpu"),
+    ),
+    Rule(
+        id="RequestsMemory",
+        selector="containers[] .resources .requests .memory",
+        reason="Enforcing memory requests aids a fair balancing of resources across the cluster",
+        points=1,
+        predicate=resources("requests", "memory"),
+    ),
+    Rule(
+        id="RunAsGroup",
+        selector="containers[] .securityContext .runAsGroup -gt 10000",
+        reason="Run as a high-UID group to avoid conflicts with the host's groups",
+        points=1,
+        predicate=security_context_above("runAsGroup", 10000),
+    ),
+    Rule(
+        id="RunAsNonRoot",
+        selector="containers[] .securityContext .runAsNonRoot == true",
+        reason="Force the running image to run as a non-root user to ensure least privilege",
+        points=1,
+        predicate=security_context_is("runAsNonRoot", True),
+    ),
+    Rule(
+        id="RunAsUser",
+        selector="containers[] .securityContext .runAsUser -gt 10000",
+        reason="Run as a high-UID user to avoid conflicts with the host's user table",
+        points=1,
+        predicate=security_context_above("runAsUser", 10000),
+    ),
+    Rule(
+        id="SeccompAny",
+        selector='.metadata .annotations ."container.seccomp.security.alpha.kubernetes.io/pod"',
+        reason="Seccomp profiles set minimum privilege and secure against unknown threats",
+        points=1,
+        predicate=has_seccomp_profile,
+    ),
+    Rule(
+        id="VolumeClaimAccessModeReadWriteOnce",
+        selector='.spec .volumeClaimTemplates[] .spec .accessModes | index("ReadWriteOnce")',
+        reason="",
+        points=1,
+        predicate=lambda pod: any(
+            "ReadWriteOnce" in (c.get("accessModes") or []) for c in volume_claims(pod.obj)
+        ),
+        kinds=("StatefulSet",),
+    ),
+    Rule(
+        id="VolumeClaimRequestsStorage",
+        selector=".spec .volumeClaimTemplates[] .spec .resources .requests .storage",
+        reason="",
+        points=1,
+        predicate=lambda pod: any(
+            ((c.get("resources") or {}).get("requests") or {}).get("storage")
+            for c in volume_claims(pod.obj)
+        ),
+        kinds=("StatefulSet",),
+    ),
+)
+
+
+def get_object_name(obj: dict) -> str:
+    metadata = obj.get("metadata") or {}
+    namespace = metadata.get("namespace") or "default"
+    return f"{obj.get('kind')}/{metadata.get('name')}.{namespace}"
+
+
+class KubeSecurityRuleEngine(KubeSecurityScanner):
+    """
+    In-process scanner compatible with kubesec
+
+    Evaluates the kubesec rule set against parsed objects, so no external
+    binary and no temporary files are used. Matched rules with negative
+    points are reported as critical, matched rules with positive points
+    as passed, the rest of positive rules as advise. Objects of kinds
+    unsupported by kubesec get empty scoring.
+
+    Example:
+
+        >>> engine = KubeSecurityRuleEngine()
+        >>> engine.scan_objects(list(get_manifests(content)))
+        [KubeObject(object='Deployment/application.default', scoring={...})]
+    """
+
+    def __init__(self, rules: Iterable[Rule] = RULES):
+        super().__init__()
+        self._rules = tuple(rules)
+
+    @staticmethod
+    def get_version() -> str:
+        return f"native/{RULES_VERSION}"
+
+    def score(self, obj: dict) -> KubeObject:
+        kind = obj.get("kind")
+        scoring: Dict[str, List[ScoringRecord]] = {}
+        if kind in SUPPORTED_KINDS:
+            pod = get_pod_template(obj)
+            critical, passed, advise = [], [], []
+            for rule in self._rules:
+                if not rule.supports(kind):
+                    continue
+                if rule.predicate(pod):
+                    (critical if rule.points < 0 else passed).append(rule)
+                elif rule.points > 0:
+                    advise.append(rule)
+            advise.sort(key=lambda r: -r.points)
+            for level, rules in (("critical", critical), ("passed", passed), ("advise", advise)):
+                if rules:
+                    scoring[level] = [r.to_record() for r in rules]
+        return KubeObject(object=get_object_name(obj), scoring=scoring)
+
+    def scan_objects(self, objects: List[dict]) -> List[KubeObject]:
+        return [self.score(o) for o in objects]
+
+    def scan_bundle(self, objects: List[dict]) -> KubeSecurityContent:
+        return KubeSecurityContent.parse_obj(self.scan_objects(objects))
+
+    def scan(self, filename: PathLike) -> KubeSecurityContent:
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                objects = [o for o in yaml.safe_load_all(f) if o]
+        except yaml.YAMLError as e:
+            raise KubeSecurityContentError(e)
+
+        if not all(isinstance(o, dict) and o.get("kind") for o in objects):
+            raise KubeSecurityContentError(f"{filename} contains not Kubernetes objects")
+        return KubeSecurityContent.parse_obj(self.scan_objects(objects))
@@ -1,16 +1,25 @@
 import json
 import subprocess
+import tempfile
 from json import JSONDecodeError
+from pathlib import Path
+from typing import Iterable, List, Optional
 
+import yaml
 from pydantic import ValidationError
 
+from kubedeployer import console
 from kubedeployer.types import PathLike
-from kubedeployer.security.kubesec.data import KubeSecurityContent
+from kubedeployer.security.kubesec.cache import KubeSecurityCache
+from kubedeployer.security.kubesec.data import KubeSecurityContent, KubeObject
 from kubedeployer.security.kubesec.errors import KubeSecurityError, KubeSecurityContentError
 
 
 class KubeSecurityScanner:
 
+    def __init__(self, cache: Optional[KubeSecurityCache] = None):
+        self._cache = cache
+
     @staticmethod
     def __scan(filename: PathLike) -> str:
         cmd = f"kubesec scan --format json --exit-code 0 {str(filename)}"
@@ -29,6 +38,75 @@ class KubeSecurityScanner:
         except Exception as e:
             raise KubeSecurityError(e)
 
+    @staticmethod
+    def get_version() -> str:
+        """
+        Returns version of kubesec
+        """
+        result = subprocess.run("kubesec version", capture_output=True, shell=True)
+        if result.returncode != 0:
+            raise KubeSecurityError(result.stderr.decode("utf-8"))
+        return result.stdout.decode("utf-8").strip()
+
+    def scan_bundle(self, objects: List[dict]) -> KubeSecurityContent:
+        """Scan Kubernetes objects as one bundle, as kubesec reads it"""
+        with tempfile.TemporaryDirectory() as directory:
+            filename = Path(directory) / "manifests.yaml"
+            filename.write_text(yaml.safe_dump_all([dict(o) for o in objects]), encoding="utf-8")
+            return self.__format(self.__scan(filename))
+
+    def scan_objects(self, objects: List[dict]) -> List[KubeObject]:
+        """
+        Scan Kubernetes objects, result of every object has the same
+        position as the object
+        """
+        if not objects:
+            return []
+
+        content = self.scan_bundle(objects)
+        if len(content) != len(objects):
+            raise KubeSecurityContentError(
+                f"kubesec returned {len(content)} results for {len(objects)} objects"
+            )
+        return list(content)
+
+    def _scan_cached(self, objects: List[dict]) -> KubeSecurityContent:
+        results = [self._cache.get(o) for o in objects]
+        missed = [o for o, r in zip(objects, results) if r is None]
+        scanned = iter(self.scan_objects(missed))
+        for i, (obj, result) in enumerate(zip(objects, results)):
+            if result is None:
+                results[i] = next(scanned)
+                # results are kept even if they could not be cached
+                try:
+                    self._cache.set(obj, results[i])
+                except OSError as e:
+                    console.warning(f"Result of scanning {results[i].object} is not cached: {str(e)}")
+        return KubeSecurityContent.parse_obj(results)
+
+    def scan_manifests(self, objects: Iterable[dict]) -> KubeSecurityContent:
+        """
+        Scan parsed Kubernetes objects, results of previous scans are
+        taken from cache when it is set
+
+        Objects are scanned as one bundle without cache if results could
+        not be matched with objects (ex.: kubesec skipped some of them).
+        """
+        objects = list(objects)
+        if self._cache:
+            try:
+                return self._scan_cached(objects)
+            except KubeSecurityContentError:
+                pass
+        return self.scan_bundle(objects)
+
     def scan(self, filename: PathLike) -> KubeSecurityContent:
+        if self._cache:
+            try:
+                with open(filename, "r", encoding="utf-8") as f:
+                    objects = [o for o in yaml.safe_load_all(f) if o]
+                return self.scan_manifests(objects)
+            except yaml.YAMLError:
+                pass
         content = self.__scan(filename)
         return self.__format(content)
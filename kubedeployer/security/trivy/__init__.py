@@ -1,10 +1,35 @@
+from pathlib import Path
+from typing import Optional
+
+from kubedeployer.docker import get_image_digest
+from kubedeployer.gitlab_ci.environment_variables import settings
+from kubedeployer.security.trivy.cache import TrivyCache
+from kubedeployer.security.trivy.errors import TrivyError
 from kubedeployer.security.trivy.formatters import TrivyConsoleStringFormatter
 from kubedeployer.security.trivy.report import TrivyReport
 from kubedeployer.security.trivy.scanner import TrivyScanner
 
 
-def create_trivy_report() -> TrivyReport:
+def create_trivy_cache(scanner: TrivyScanner,
+                       timeout: Optional[float] = None) -> Optional[TrivyCache]:
+    if not settings.cache_dir.value:
+        return None
+    try:
+        version = scanner.get_version(timeout)
+    except TrivyError:
+        return None
+    return TrivyCache(
+        directory=Path(settings.cache_dir.value) / "trivy",
+        ttl=settings.trivy_cache_ttl.value,
+        version=version,
+    )
+
+
+def create_trivy_report(timeout: Optional[float] = None) -> TrivyReport:
+    scanner = TrivyScanner()
     return TrivyReport(
-        scanner=TrivyScanner(),
+        scanner=scanner,
         formatter=TrivyConsoleStringFormatter(),
+        cache=create_trivy_cache(scanner, timeout),
+        digest_resolver=get_image_digest,
     )
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import time
+import uuid
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Optional
+
+from pydantic import ValidationError
+
+from kubedeployer.security.trivy.data import TrivyContent
+from kubedeployer.types import PathLike
+
+
+class TrivyCache:
+    """
+    On-disk cache of Trivy results
+
+    Results are stored by digest of the image and version of the
+    vulnerability database, so rebuilt images or updated database are
+    scanned again. Results older than `ttl` seconds are ignored.
+
+    Example:
+
+        >>> cache = TrivyCache("/cache/trivy", ttl=3600, version="0.30.4/2022-08-01")
+        >>> cache.set("sha256:9ad0..", content)
+        >>> cache.get("sha256:9ad0..")
+    """
+
+    def __init__(self, directory: PathLike, ttl: int, version: str):
+        self._directory = Path(directory)
+        self._ttl = ttl
+        self._version = version
+
+    def _filename(self, digest: str) -> Path:
+        key = hashlib.sha256(f"{self._version}:{digest}".encode()).hexdigest()
+        return self._directory / f"{key}.json"
+
+    def get(self, digest: str) -> Optional[TrivyContent]:
+        filename = self._filename(digest)
+        try:
+            data = json.loads(filename.read_text(encoding="utf-8"))
+            if time.time() - data["created"] > self._ttl:
+                return None
+            return TrivyContent(**data["content"])
+        except (OSError, TypeError, KeyError, JSONDecodeError, ValidationError):
+            return None
+
+    def set(self, digest: str, content: TrivyContent):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        filename = self._filename(digest)
+        data = {"created": time.time(), "content": content.dict(by_alias=True)}
+        tmp_filename = filename.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_filename.write_text(json.dumps(data), encoding="utf-8")
+        tmp_filename.replace(filename)
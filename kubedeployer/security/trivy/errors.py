@@ -4,3 +4,7 @@ class TrivyError(Exception):
 
 class TrivyContentError(TrivyError):
     pass
+
+
+class TrivyTimeoutError(TrivyError):
+    pass
@@ -1,13 +1,123 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, \
+    TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from kubedeployer import console
+from kubedeployer.security.trivy.cache import TrivyCache
+from kubedeployer.security.trivy.errors import TrivyTimeoutError
 from kubedeployer.security.trivy.formatters import TrivyFormatter
 from kubedeployer.security.trivy.scanner import TrivyScanner
 
 
+@dataclass
+class TrivyReportResult:
+    image: str
+    report: Optional[str] = None
+    error: Optional[Exception] = None
+
+
 class TrivyReport:
 
-    def __init__(self, scanner: TrivyScanner, formatter: TrivyFormatter):
+    def __init__(self,
+                 scanner: TrivyScanner,
+                 formatter: TrivyFormatter,
+                 cache: Optional[TrivyCache] = None,
+                 digest_resolver: Optional[Callable[[str, Optional[float]], str]] = None):
         self._scanner = scanner
         self._formatter = formatter
+        self._cache = cache
+        self._digest_resolver = digest_resolver
 
-    def build(self, image: str, subprocess_timeout: int = 0):
+    def build(self, image: str, subprocess_timeout: float = 0):
         content = self._scanner.scan(image, subprocess_timeout)
         return self._formatter.format(image, content)
+
+    def _resolve_digest(self, image: str, timeout: float) -> Optional[str]:
+        try:
+            return self._digest_resolver(image, timeout)
+        except Exception:
+            return None
+
+    def _group_by_digest(self, images: List[str],
+                         executor: ThreadPoolExecutor,
+                         timeout: float) -> List[Tuple[Optional[str], List[str]]]:
+        if not self._digest_resolver:
+            return [(None, [i]) for i in images]
+
+        futures = {executor.submit(self._resolve_digest, i, timeout): i for i in images}
+        wait(futures, timeout=timeout)
+
+        groups: Dict[str, Tuple[Optional[str], List[str]]] = {}
+        for future, image in futures.items():
+            digest = future.result() if future.done() else None
+            groups.setdefault(digest or image, (digest, []))[1].append(image)
+        return list(groups.values())
+
+    def _build_group(self, digest: Optional[str], images: List[str],
+                     subprocess_timeout: float) -> str:
+        content = self._cache.get(digest) if self._cache and digest else None
+        if content is None:
+            content = self._scanner.scan(images[0], subprocess_timeout)
+            if self._cache and digest:
+                # result of the scan is kept even if it could not be cached
+                try:
+                    self._cache.set(digest, content)
+                except OSError as e:
+                    console.warning(f"Result of scanning {images[0]} is not cached: {str(e)}")
+        return self._formatter.format(", ".join(images), content)
+
+    def build_concurrently(
+            self,
+            images: Iterable[str],
+            max_workers: int,
+            timeout: float,
+    ) -> Iterator[TrivyReportResult]:
+        """
+        Build reports for images using pool of workers
+
+        Images with the same digest are scanned once, results of previous
+        runs are taken from cache when it is set. Results are returned as
+        soon as scanning of the image is finished. All scans share single
+        time budget `timeout` (in seconds), images that could not be scanned
+        in time are returned with TrivyTimeoutError. Failure of one image
+        does not affect others.
+
+        Example:
+
+            >>> for r in report.build_concurrently(images, 4, timeout=600):
+            ...     print(r.error or r.report)
+        """
+        deadline = time.monotonic() + timeout
+
+        def remaining() -> float:
+            return max(deadline - time.monotonic(), 0)
+
+        def build(digest: Optional[str], group: List[str]) -> str:
+            if not remaining():
+                raise TrivyTimeoutError(f"Scanning {group[0]} was not started in time")
+            return self._build_group(digest, group, remaining())
+
+        executor = ThreadPoolExecutor(max_workers=max(max_workers, 1))
+        futures = {}
+        try:
+            groups = self._group_by_digest(list(images), executor, remaining())
+            futures = {executor.submit(build, d, g): ", ".join(g) for d, g in groups}
+            for future in as_completed(futures, timeout=remaining()):
+                image = futures.pop(future)
+                try:
+                    yield TrivyReportResult(image=image, report=future.result())
+                except Exception as e:
+                    yield TrivyReportResult(image=image, error=e)
+        except FuturesTimeoutError:
+            for future, image in futures.items():
+                future.cancel()
+                yield TrivyReportResult(
+                    image=image,
+                    error=TrivyTimeoutError(
+                        f"Scanning {image} exceeded {timeout}s time budget"
+                    ),
+                )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
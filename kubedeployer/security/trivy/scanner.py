@@ -1,11 +1,13 @@
 import json
 import subprocess
 from json import JSONDecodeError
+from typing import Optional
 
 from pydantic import ValidationError
 
 from kubedeployer.security.trivy.data import TrivyContent
-from kubedeployer.security.trivy.errors import TrivyError, TrivyContentError
+from kubedeployer.security.trivy.errors import TrivyError, TrivyContentError, \
+    TrivyTimeoutError
 
 
 class TrivyScanner:
@@ -19,8 +21,13 @@ class TrivyScanner:
             f"--timeout 10m0s "
             f"{image}"
         )
-        result = subprocess.run(cmd, capture_output=True, shell=True,
-                                timeout=subprocess_timeout)
+        try:
+            result = subprocess.run(cmd, capture_output=True, shell=True,
+                                    timeout=subprocess_timeout)
+        except subprocess.TimeoutExpired as e:
+            raise TrivyTimeoutError(
+                f"Scanning {image} exceeded {e.timeout:.0f}s timeout"
+            ) from e
         if result.returncode != 0:
             raise TrivyError(result.stderr.decode("utf-8"))
         return result.stdout.decode("utf-8")
@@ -35,6 +42,25 @@ class TrivyScanner:
         except Exception as e:
             raise TrivyError(e)
 
+    @staticmethod
+    def get_version(timeout: Optional[float] = None) -> str:
+        """
+        Returns version of Trivy and its vulnerability database
+        """
+        cmd = "trivy --quiet version --format json"
+        try:
+            result = subprocess.run(cmd, capture_output=True, shell=True, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            raise TrivyTimeoutError(f"Getting version of Trivy exceeded {e.timeout:.0f}s timeout") from e
+        if result.returncode != 0:
+            raise TrivyError(result.stderr.decode("utf-8"))
+        try:
+            data = json.loads(result.stdout)
+        except JSONDecodeError as e:
+            raise TrivyContentError(e)
+        database = data.get("VulnerabilityDB") or {}
+        return f"{data.get('Version')}/{database.get('UpdatedAt')}"
+
     def scan(self, image: str, subprocess_timeout) -> TrivyContent:
         content = self.__scan(image, subprocess_timeout)
         return self.__format(content)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from kubedeployer.text import Envsubst
+from kubedeployer.types import PathLike
+
+# Staging trees are kept in memory when shared memory is available
+SHARED_MEMORY = Path("/dev/shm")
+
+
+def get_staging_root() -> Optional[str]:
+    if SHARED_MEMORY.is_dir() and os.access(SHARED_MEMORY, os.W_OK | os.X_OK):
+        return str(SHARED_MEMORY)
+    return None
+
+
+@contextmanager
+def staging_area(root: Optional[PathLike] = None) -> Iterator[Path]:
+    """
+    Temporary directory for rendering, removed on exit
+
+    Example:
+
+        >>> with staging_area() as path:
+        ...     stage_files("/project/manifests", path, files, Envsubst())
+    """
+    path = Path(tempfile.mkdtemp(prefix="kubedeployer-", dir=root or get_staging_root()))
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def link_or_write(src: Path, dst: Path, content: str):
+    """Hard link the file, content read before is written if it can't be linked"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        dst.write_text(content, encoding="utf-8")
+
+
+def stage_files(source: PathLike, staging: PathLike, files: Iterable[PathLike],
+                substitute: Envsubst) -> List[Path]:
+    """
+    Place files of `source` into the same locations of `staging`
+
+    Only files changed by substitution are written, other files are linked,
+    so files of `source` are never changed. Files are never linked across
+    file systems (ex.: checkout and /dev/shm), content read for
+    substitution is written instead.
+
+    Example:
+
+        >>> stage_files("/project/manifests", "/dev/shm/kubedeployer-1", files, Envsubst())
+        [PosixPath('/dev/shm/kubedeployer-1/deployment.yaml'), ...]
+    """
+    source, staging = Path(source), Path(staging)
+    same_device = source.stat().st_dev == staging.stat().st_dev
+    staged = []
+    for file in files:
+        file = Path(file)
+        target = staging / file.relative_to(source)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        content = file.read_text(encoding="utf-8")
+        substituted = substitute(content)
+        if substituted == content and same_device:
+            link_or_write(file, target, content)
+        else:
+            target.write_text(substituted, encoding="utf-8")
+        staged.append(target)
+    return staged
@@ -1,5 +1,72 @@
-import os
 import re
+import uuid
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from kubedeployer.environ import get_environ
+from kubedeployer.types import PathLike
+
+# Expression (?<!\$) allow to exclude next variant:
+#   $$VARIABLE
+VARIABLE_PATTERN = re.compile(r"(?<!\$)\${?(?P<variable>([a-zA-Z_]\w*))}?")
+
+# Files are substituted by chunks of whole lines, variables never span lines
+CHUNK_SIZE = 1024 * 1024
+
+
+class Envsubst:
+    """
+    Substitution of environment variables by the frozen map of variables
+
+    Variables are taken once, when the object is created, so files of
+    one deploy are substituted by the same values. Variable names are must
+    match the format:
+        - $VARIABLE;
+        - ${VARIABLE}.
+
+    Example:
+
+        >>> substitute = Envsubst({"VARIABLE": "test"})
+        >>> substitute("Example of replacing: $VARIABLE, $$VARIABLE")
+        Example of replacing: test, $$VARIABLE
+        >>> substitute.file("deployment.yaml", "/tmp/deployment.yaml")
+    """
+
+    def __init__(self, variables: Optional[Mapping[str, str]] = None):
+        self.variables = MappingProxyType(dict(get_environ() if variables is None else variables))
+
+    def _replace(self, match: re.Match) -> str:
+        value = self.variables.get(match.group("variable"))
+        return match.group() if value is None else value
+
+    def __call__(self, text: str) -> str:
+        if "$" not in text:
+            return text
+        return VARIABLE_PATTERN.sub(self._replace, text)
+
+    def file(self, src: PathLike, dst: Optional[PathLike] = None,
+             chunk_size: int = CHUNK_SIZE):
+        """
+        Substitute variables of the file by chunks, the file is replaced
+        if `dst` is not set
+        """
+        src = Path(src)
+        dst = Path(dst) if dst else src
+        tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.tmp")
+        with open(src, "r", encoding="utf-8") as infile, \
+                open(tmp, "w", encoding="utf-8") as outfile:
+            rest = ""
+            while True:
+                chunk = infile.read(chunk_size)
+                if not chunk:
+                    break
+                chunk = rest + chunk
+                end = chunk.rfind("\n") + 1
+                outfile.write(self(chunk[:end]))
+                rest = chunk[end:]
+            outfile.write(self(rest))
+        tmp.replace(dst)
 
 
 def envsubst(text: str) -> str:
@@ -17,12 +84,4 @@ def envsubst(text: str) -> str:
         >>> envsubst("Example of replacing: $VARIABLE")
         Example of replacing: test
     """
-
-    def replace(match: re.Match):
-        variable = match.group("variable")
-        return os.getenv(variable) if variable in os.environ else match.group()
-
-    # Expression (?<!\$) allow to exclude next variant:
-    #   $$VARIABLE
-    regexp = r"(?<!\$)\${?(?P<variable>([a-zA-Z_]\w*))}?"
-    return re.sub(regexp, replace, text)
+    return Envsubst()(text)
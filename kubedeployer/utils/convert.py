@@ -1,3 +1,4 @@
+import re
 from typing import Union
 
 
@@ -15,3 +16,17 @@ def str_to_bool(value: Union[str, int]) -> bool:
         return False
 
     raise ValueError(f"Invalid truth value {value}")
+
+
+def duration_to_seconds(value: str) -> float:
+    """
+    Convert duration in kubectl format (ex.: 1h, 10m, 1m30s) or plain
+    number of seconds (ex.: 600) into seconds
+    """
+    if re.fullmatch(r"\d+(?:\.\d+)?", value.strip()):
+        return float(value)
+    units = {"h": 3600, "m": 60, "s": 1}
+    parts = re.findall(r"(\d+(?:\.\d+)?)([hms])", value)
+    if not parts or "".join(n + u for n, u in parts) != value.strip():
+        raise ValueError(f"Invalid duration {value}")
+    return sum(float(n) * units[u] for n, u in parts)
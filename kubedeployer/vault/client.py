@@ -1,7 +1,9 @@
 import abc
-from typing import Any, Dict
+import threading
+from typing import Any, Callable, Dict, Optional
 
 import hvac
+from hvac.exceptions import Forbidden
 
 
 class VaultClient(abc.ABC):
@@ -14,17 +16,39 @@ class VaultClient(abc.ABC):
 
 
 class HvacClient(VaultClient):
-    """implementation of VaultClient which work via hvac"""
-    def __init__(self, hvac_client: hvac.Client, mount_point: str):
+    """
+    implementation of VaultClient which work via hvac
+
+    If `login` is set, it is called to get a new token when Vault
+    responds with 403, and the request is retried once.
+    """
+    def __init__(self, hvac_client: hvac.Client, mount_point: str,
+                 login: Optional[Callable[[], str]] = None):
         self._client = hvac_client
         self._mount_point = mount_point
+        self._login = login
+        self._lock = threading.Lock()
+
+    def __call(self, func: Callable[..., Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        token = self._client.token
+        try:
+            return func(**kwargs)
+        except Forbidden:
+            if not self._login:
+                raise
+        with self._lock:
+            if self._client.token == token:
+                self._client.token = self._login()
+        return func(**kwargs)
 
     def read_secret(self, path: str) -> Dict[str, Any]:
-        return self._client.secrets.kv.v2.read_secret_version(
-            path=path, mount_point=self._mount_point
+        return self.__call(
+            self._client.secrets.kv.v2.read_secret_version,
+            path=path, mount_point=self._mount_point,
         )
 
     def list_secrets(self, path: str) -> Dict[str, Any]:
-        return self._client.secrets.kv.v2.list_secrets(
-            path=path, mount_point=self._mount_point
+        return self.__call(
+            self._client.secrets.kv.v2.list_secrets,
+            path=path, mount_point=self._mount_point,
         )
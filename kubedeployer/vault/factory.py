@@ -1,24 +1,99 @@
+from pathlib import Path
+from typing import Optional
+
 import hvac
+import requests
+from hvac.exceptions import Forbidden, InvalidRequest
+from requests.adapters import HTTPAdapter
 
+from kubedeployer import console
 from kubedeployer.gitlab_ci.environment_variables import settings
 from kubedeployer.vault.client import HvacClient
+from kubedeployer.vault.index import VaultPathIndex
 from kubedeployer.vault.service import VaultService
+from kubedeployer.vault.token import VaultToken, VaultTokenCache
 
 
 class HvacClientFactory:
     @classmethod
-    def create_hvac_client(cls) -> HvacClient:
-        hvac_client = hvac.Client(url=settings.vault_url.value)
+    def create_token_cache(cls) -> Optional[VaultTokenCache]:
+        filename = settings.vault_token_cache_file.value
+        secret_id = settings.vault_approle_secret_id.value
+        if not filename or not secret_id:
+            return None
+        return VaultTokenCache(filename, secret=f"{secret_id}:{settings.vault_url.value}")
+
+    @classmethod
+    def login(cls, hvac_client: hvac.Client,
+              token_cache: Optional[VaultTokenCache]) -> str:
         role_id = settings.vault_approle_id.value
         secret_id = settings.vault_approle_secret_id.value
         response = hvac_client.auth_approle(role_id, secret_id)
-        token = response["auth"]["client_token"]
-        hvac_client.token = token
-        return HvacClient(hvac_client=hvac_client, mount_point="secret")
+        token = VaultToken.from_auth(response["auth"])
+        if token_cache:
+            cls.cache_token(token_cache, token)
+        return token.token
+
+    @classmethod
+    def cache_token(cls, token_cache: VaultTokenCache, token: VaultToken):
+        """Saves the token to cache, failure of cache doesn't fail the login"""
+        try:
+            token_cache.set(token)
+        except OSError as e:
+            console.warning(f"Vault token is not cached: {e}")
+
+    @classmethod
+    def authenticate(cls, hvac_client: hvac.Client,
+                     token_cache: Optional[VaultTokenCache]) -> str:
+        """
+        Returns token from cache, renewing it after half of TTL, or
+        the token of a new login if there is no valid token in cache
+        """
+        token = token_cache and token_cache.get()
+        if not token:
+            return cls.login(hvac_client, token_cache)
+        if token.should_renew():
+            hvac_client.token = token.token
+            try:
+                response = hvac_client.renew_token()
+            except (Forbidden, InvalidRequest):
+                return cls.login(hvac_client, token_cache)
+            token = VaultToken.from_auth(response["auth"])
+            cls.cache_token(token_cache, token)
+        return token.token
+
+    @classmethod
+    def create_hvac_client(cls) -> HvacClient:
+        # one session is shared by all workers, so connections are kept
+        # alive and reused between requests
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(settings.vault_workers.value, 1))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        hvac_client = hvac.Client(url=settings.vault_url.value, session=session)
+        token_cache = cls.create_token_cache()
+        hvac_client.token = cls.authenticate(hvac_client, token_cache)
+        return HvacClient(
+            hvac_client=hvac_client,
+            mount_point="secret",
+            login=lambda: cls.login(hvac_client, token_cache),
+        )
 
 
 class VaultServiceFactory:
     @classmethod
     def create_vault_service(cls) -> VaultService:
         client = HvacClientFactory.create_hvac_client()
-        return VaultService(client)
+        return VaultService(client, max_workers=settings.vault_workers.value)
+
+
+class VaultPathIndexFactory:
+    @classmethod
+    def create_vault_path_index(cls) -> Optional[VaultPathIndex]:
+        secret_id = settings.vault_approle_secret_id.value
+        if not settings.cache_dir.value or not secret_id:
+            return None
+        return VaultPathIndex(
+            filename=Path(settings.cache_dir.value) / "vault" / "index",
+            secret=f"{secret_id}:{settings.vault_secret_prefix.value}",
+        )
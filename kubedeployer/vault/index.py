@@ -0,0 +1,82 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import uuid
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Dict, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from kubedeployer.types import PathLike
+
+
+def create_fernet(secret: str) -> Fernet:
+    key = hashlib.sha256(secret.encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def write_private_file(filename: Path, data: bytes):
+    """
+    Write the file readable by the owner only, the file is replaced
+    atomically, so readers never see partially written data
+
+    Example:
+
+        >>> write_private_file(Path("/cache/vault/index"), fernet.encrypt(data))
+    """
+    tmp_filename = filename.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    fd = os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    tmp_filename.replace(filename)
+
+
+class VaultPathIndex:
+    """
+    Encrypted on-disk index of Vault secret paths by cluster URL
+
+    The file is encrypted by the key derived from `secret`, so it can be
+    read only with the same secret. Unreadable files are considered empty.
+
+    Example:
+
+        >>> index = VaultPathIndex("/cache/vault/index", secret="...")
+        >>> index.set("https://k8s.example.com", "secret/k8s/production/default")
+        >>> index.get("https://k8s.example.com")
+        'secret/k8s/production/default'
+    """
+
+    def __init__(self, filename: PathLike, secret: str):
+        self._filename = Path(filename)
+        self._fernet = create_fernet(secret)
+        # paths of several clusters can be set at the same time
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, str]:
+        try:
+            data = self._fernet.decrypt(self._filename.read_bytes())
+            return json.loads(data)
+        except (OSError, InvalidToken, JSONDecodeError, UnicodeDecodeError):
+            return {}
+
+    def _write(self, index: Dict[str, str]):
+        self._filename.parent.mkdir(parents=True, exist_ok=True)
+        write_private_file(self._filename, self._fernet.encrypt(json.dumps(index).encode()))
+
+    def get(self, url: str) -> Optional[str]:
+        return self._read().get(url)
+
+    def set(self, url: str, path: str):
+        with self._lock:
+            index = self._read()
+            index[url] = path
+            self._write(index)
+
+    def remove(self, url: str):
+        with self._lock:
+            index = self._read()
+            if index.pop(url, None) is not None:
+                self._write(index)
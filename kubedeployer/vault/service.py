@@ -1,20 +1,96 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from difflib import SequenceMatcher
 from pathlib import Path
-from typing import List, Iterator
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from hvac.exceptions import InvalidPath
 
 from kubedeployer.vault.client import VaultClient
 
 
+def order_by_similarity(paths: Iterable[str], text: str) -> List[str]:
+    """
+    Returns paths ordered by similarity to the text, paths containing
+    more words of the text go first
+
+    Example:
+
+        >>> order_by_similarity(
+        ...     ["secret/k8s/alpha/default", "secret/k8s/gamma/default"],
+        ...     "https://gamma.example.com:6443",
+        ... )
+        ['secret/k8s/gamma/default', 'secret/k8s/alpha/default']
+    """
+    text = text.lower()
+    words = set(re.split(r"[^a-z0-9]+", text)) - {"", "http", "https"}
+
+    def similarity(path: str) -> Tuple[int, float]:
+        parts = set(re.split(r"[^a-z0-9]+", path.lower()))
+        return len(words & parts), SequenceMatcher(None, path.lower(), text).ratio()
+
+    return sorted(paths, key=similarity, reverse=True)
+
+
 class VaultService:
     DELIMITER = "/"
     WILDCARD = "*"
 
-    def __init__(self, client: VaultClient):
+    def __init__(self, client: VaultClient, max_workers: int = 8):
         self._client = client
+        self._max_workers = max(max_workers, 1)
 
     def read_secret(self, path: str):
         result = self._client.read_secret(path)
         return result.get('data', {}).get('data')
 
+    def find_secret(
+            self,
+            paths: Iterable[str],
+            predicate: Callable[[Dict[str, Any]], bool],
+            max_workers: int,
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Returns path and data of the first found secret matching predicate
+
+        Secrets are read concurrently, preferring the order of paths, and
+        reading stops as soon as the secret is found. Not existing
+        secrets are skipped.
+
+        Example:
+
+            >>> service.find_secret(
+            ...     ["secret/k8s/alpha/default", "secret/k8s/gamma/default"],
+            ...     lambda data: data.get("url") == "https://gamma.example.com",
+            ...     max_workers=8,
+            ... )
+            ('secret/k8s/gamma/default', {'url': 'https://gamma.example.com', ..})
+        """
+        paths = iter(paths)
+        max_workers = max(max_workers, 1)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        running = {}
+        try:
+            while True:
+                for path in paths:
+                    running[executor.submit(self.read_secret, path)] = path
+                    if len(running) >= max_workers:
+                        break
+                if not running:
+                    return None
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    try:
+                        data = future.result()
+                    except InvalidPath:
+                        continue
+                    if data and predicate(data):
+                        return path, data
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def list_secrets(self, path: str) -> List[str]:
         """
         Returns full paths to secrets
@@ -59,8 +135,8 @@ class VaultService:
         paths = self.get_paths(path)
         return [
             str(Path(p) / i)
-            for p in paths
-            for i in self.__get_items(p)
+            for p, items in zip(paths, self.__get_items_concurrently(paths))
+            for i in items
             if self.is_secret(i) and secret in (i, self.WILDCARD)
         ]
 
@@ -72,20 +148,67 @@ class VaultService:
     def is_secret(cls, path: str) -> bool:
         return not cls.is_path(path)
 
-    def get_paths(self, path: str) -> Iterator:
-        path = path.rstrip(self.DELIMITER)
-        if path and self.WILDCARD in path:
-            location, path = path.split(self.WILDCARD, maxsplit=1)
-            path = path.lstrip(self.DELIMITER)
+    def get_paths(self, *paths: str) -> List[str]:
+        """
+        Returns paths matching templates
 
-            paths = [i for i in self.__get_items(location) if self.is_path(i)]
-            for p in paths:
-                if self.is_path(p):
-                    yield from self.get_paths(str(Path(location) / p / path))
-        if path:
-            yield path
+        Every wildcard matches one level of paths. Templates are expanded
+        breadth-first in a single traversal: all locations of the level
+        are listed concurrently and every location is listed once, even
+        if it is shared by several templates. Paths are returned in the
+        order of templates, paths of one template in the order of listing.
+
+        Example:
+
+            >>> service.get_paths("secret/common/*/*")
+            ['secret/common/development/alpha',
+             'secret/common/development/gamma',
+             'secret/common/production/alpha']
+
+            >>> service.get_paths("secret/common/development/*", "secret/common/production")
+            ['secret/common/development/alpha',
+             'secret/common/development/gamma',
+             'secret/common/production']
+        """
+        results: List[List[str]] = [[] for _ in paths]
+        level = [(i, p.rstrip(self.DELIMITER)) for i, p in enumerate(paths)]
+        listed: Dict[str, List[str]] = {}
+
+        while level:
+            pending = []
+            for i, path in level:
+                if not path:
+                    continue
+                if self.WILDCARD not in path:
+                    results[i].append(path)
+                    continue
+                location, rest = path.split(self.WILDCARD, maxsplit=1)
+                pending.append((i, location, rest.lstrip(self.DELIMITER)))
+
+            locations = list(dict.fromkeys(
+                loc for _, loc, _ in pending if loc not in listed
+            ))
+            listed.update(zip(locations, self.__get_items_concurrently(locations)))
+
+            level = [
+                (i, str(Path(location) / item / rest).rstrip(self.DELIMITER))
+                for i, location, rest in pending
+                for item in listed[location]
+                if self.is_path(item)
+            ]
+
+        return [path for paths_of_template in results for path in paths_of_template]
+
+    def __get_items_concurrently(self, paths: List[str]) -> List[List[str]]:
+        if len(paths) < 2:
+            return [self.__get_items(p) for p in paths]
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(paths))) as executor:
+            return list(executor.map(self.__get_items, paths))
 
     def __get_items(self, path: str) -> List[str]:
         path = path.rstrip(self.DELIMITER)
-        result = self._client.list_secrets(path)
-        return result.get("data", {}).get("keys") or []
+        try:
+            result = self._client.list_secrets(path)
+        except InvalidPath:
+            return []
+        return (result or {}).get("data", {}).get("keys") or []
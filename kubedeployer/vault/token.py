@@ -0,0 +1,85 @@
+import json
+import time
+from dataclasses import dataclass, asdict
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from cryptography.fernet import InvalidToken
+
+from kubedeployer.types import PathLike
+from kubedeployer.vault.index import create_fernet, write_private_file
+
+# Tokens expiring sooner are not taken from cache
+EXPIRATION_MARGIN = 60
+
+
+@dataclass
+class VaultToken:
+    token: str
+    ttl: int
+    renewable: bool
+    expires: Optional[float] = None
+
+    @classmethod
+    def from_auth(cls, auth: Dict[str, Any]) -> "VaultToken":
+        """Create token from `auth` section of Vault response"""
+        ttl = auth.get("lease_duration") or 0
+        return cls(
+            token=auth["client_token"],
+            ttl=ttl,
+            renewable=bool(auth.get("renewable")),
+            expires=time.time() + ttl if ttl else None,
+        )
+
+    def remaining(self) -> float:
+        if self.expires is None:
+            return float("inf")
+        return self.expires - time.time()
+
+    def is_expired(self) -> bool:
+        return self.remaining() < EXPIRATION_MARGIN
+
+    def should_renew(self) -> bool:
+        """Renewable tokens are renewed after half of TTL is passed"""
+        return self.renewable and self.remaining() < self.ttl / 2
+
+
+class VaultTokenCache:
+    """
+    Encrypted file with Vault token kept between runs
+
+    The file is readable by the owner only and encrypted by the key
+    derived from `secret`. Expired tokens are not returned.
+
+    Example:
+
+        >>> cache = VaultTokenCache("/var/cache/kubedeployer/vault-token", secret="...")
+        >>> cache.set(VaultToken.from_auth(response["auth"]))
+        >>> cache.get()
+        VaultToken(token='s.Kf2..', ttl=3600, renewable=True, expires=1660000000.0)
+    """
+
+    def __init__(self, filename: PathLike, secret: str):
+        self._filename = Path(filename)
+        self._fernet = create_fernet(secret)
+
+    def get(self) -> Optional[VaultToken]:
+        try:
+            data = json.loads(self._fernet.decrypt(self._filename.read_bytes()))
+            token = VaultToken(**data)
+        except (OSError, InvalidToken, JSONDecodeError, UnicodeDecodeError, TypeError):
+            return None
+        if token.is_expired():
+            return None
+        return token
+
+    def set(self, token: VaultToken):
+        self._filename.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        write_private_file(self._filename, self._fernet.encrypt(json.dumps(asdict(token)).encode()))
+
+    def clear(self):
+        try:
+            self._filename.unlink()
+        except FileNotFoundError:
+            pass
@@ -3,14 +3,6 @@ import subprocess
 import pytest
 
 from kubedeployer import kubectl
-from kubedeployer.manifests import get_manifests, InvalidRolloutResource
-
-
-@pytest.fixture
-def manifests(data_path):
-    with open(data_path / "manifests/manifests.yaml", "r") as f:
-        content = f.read()
-        return list(get_manifests(content, kind="Service"))
 
 
 def test_configure_kubectl(kube_config):
@@ -55,11 +47,6 @@ def test_raises_applying_with_unsupported_yaml(data_path):
         kubectl.apply_manifests(unsupported_yaml, dry_run=True)
 
 
-def test_raises_rollout_status_for_invalid_resource(manifests):
-    with pytest.raises(InvalidRolloutResource):
-        kubectl.check_rollout_status(manifests.pop())
-
-
 def test_diff_manifests(data_path):
     result = kubectl.diff_manifests(
         data_path / "manifests/manifests.yaml"
@@ -5,6 +5,7 @@ import pytest
 from kubedeployer.files import get_files, YAML_EXTENSIONS
 from kubedeployer.kustomize import KustomizationError, \
     get_kustomization, create_kustomization, add_annotations, build_manifests
+from kubedeployer.kustomize_renderer import normalize_manifests, render_kustomization
 
 
 def is_kustomize_not_found() -> bool:
@@ -35,7 +36,6 @@ def test_raises_to_many_kustomization_files(data_path):
         get_kustomization(data_path / "manifests/apps/kustomize-app/**/")
 
 
-@pytest.mark.skipif(is_kustomize_not_found(), reason="kustomize not found")
 def test_create_kustomization_file(tmp_path, data_path):
     manifests_path = data_path / "manifests/apps/env-app/**"
     manifests_files = get_files(manifests_path, extensions=YAML_EXTENSIONS)
@@ -51,7 +51,6 @@ def test_create_kustomization_file(tmp_path, data_path):
         assert "data/manifests/apps/env-app/production/ingress.yaml" in content
 
 
-@pytest.mark.skipif(is_kustomize_not_found(), reason="kustomize not found")
 def test_add_annotations_into_kustomization_file(tmp_path):
     kustomization = create_kustomization(tmp_path)
 
@@ -77,7 +76,6 @@ def test_add_annotations_into_kustomization_file(tmp_path):
         assert "empty-string-annotation: \"\"" in content
 
 
-@pytest.mark.skipif(is_kustomize_not_found(), reason="kustomize not found")
 def test_raises_on_add_empty_annotations_into_kustomization_file(tmp_path):
     kustomization = create_kustomization(tmp_path)
 
@@ -97,3 +95,18 @@ def test_build_manifests_by_kustomization_file(tmp_path, data_path):
         assert "kind: Deployment" in content
         assert "kind: Service" in content
         assert "kind: ConfigMap" in content
+
+
+@pytest.mark.skipif(is_kustomize_not_found(), reason="kustomize not found")
+@pytest.mark.parametrize("app", [
+    "kustomize-app/base",
+    "kustomize-app/overlays/stage",
+    "kustomize-app-with-env/base",
+    "kustomize-app-with-env/overlays/stage",
+])
+def test_native_renderer_matches_kustomize(data_path, app):
+    path = data_path / "manifests/apps" / app
+    result = subprocess.run(["kustomize", "build", str(path)], capture_output=True, check=True)
+
+    assert normalize_manifests(render_kustomization(path)) == \
+        normalize_manifests(result.stdout.decode("utf-8"))
@@ -1,3 +1,4 @@
+import shutil
 from pathlib import Path
 
 import pytest
@@ -5,6 +6,7 @@ import pytest
 from kubedeployer.security.kubesec.data import KubeSecurityContent, KubeObject, ScoringRecord
 from kubedeployer.security.kubesec.errors import KubeSecurityError
 from kubedeployer.security.kubesec.formatters import KubeSecurityConsoleStringFormatter
+from kubedeployer.security.kubesec.rules import KubeSecurityRuleEngine
 from kubedeployer.security.kubesec.scanner import KubeSecurityScanner
 
 
@@ -51,3 +53,24 @@ def test_format_content_to_console_string():
         "    Id        Selector        Reason        \n"
         "     3            none                      "
     )
+
+
+@pytest.mark.skipif(not shutil.which("kubesec"), reason="kubesec is not installed")
+@pytest.mark.parametrize("filename", [
+    "manifests/manifests.yaml",
+    "manifests/apps/env-app/manifest.yaml",
+    "manifests/apps/non-kustomize-app/deployment.yaml",
+    "manifests/apps/non-kustomize-app/service.yaml",
+])
+def test_rule_engine_is_compatible_with_kubesec(data_path, filename):
+    expected = KubeSecurityScanner().scan(data_path / filename)
+
+    retrieved = KubeSecurityRuleEngine().scan(data_path / filename)
+
+    def get_scoring(content: KubeSecurityContent) -> dict:
+        return {
+            o.object: {level: sorted(r.id for r in records) for level, records in o.scoring.items()}
+            for o in content
+        }
+
+    assert get_scoring(retrieved) == get_scoring(expected)
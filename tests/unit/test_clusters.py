@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+from kubedeployer import deploy
+from kubedeployer.clusters import ClusterSkipped, RolloutPolicy, create_clusters, format_statuses
+from kubedeployer.deployer.abstract_deployer import AbstractDeployer
+from kubedeployer.environ import get_environ
+from kubedeployer.gitlab_ci import specification
+from kubedeployer.manifests import ManifestSet
+from kubedeployer.pipeline import Pipeline, Stage
+
+
+def test_create_clusters(tmp_path):
+    clusters = create_clusters([
+        "https://eu.kube.local",
+        "https://us.kube.local:6443",
+        "https://eu.kube.local",
+    ], tmp_path)
+
+    assert [c.name for c in clusters] == ["eu.kube.local", "us.kube.local:6443"]
+    assert clusters[0].kubeconfig != clusters[1].kubeconfig
+    assert clusters[0].kubeconfig.parent.is_dir()
+    assert clusters[1].get_variables() == {
+        specification.KUBE_URL_ENV_VAR: "https://us.kube.local:6443",
+        "KUBECONFIG": str(clusters[1].kubeconfig),
+    }
+
+
+def test_rollout_policy_limits_clusters():
+    policy = RolloutPolicy(parallelism=2)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def rollout():
+        with policy.slot():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=rollout) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+
+
+@pytest.mark.parametrize("fail_fast", [True, False])
+def test_rollout_policy_skips_clusters_after_failure(fail_fast):
+    policy = RolloutPolicy(parallelism=1, fail_fast=fail_fast)
+    policy.mark_failed()
+
+    if fail_fast:
+        with pytest.raises(ClusterSkipped):
+            with policy.slot():
+                pass
+    else:
+        with policy.slot():
+            pass
+
+
+@pytest.fixture
+def cluster_stages(mocker, tmp_path):
+    kubeconfigs = {}
+
+    def config_kubectl(*_):
+        if get_environ()[specification.KUBE_URL_ENV_VAR] == "https://broken.kube.local":
+            raise ValueError("Token for Kubernetes is not set.")
+
+    def apply_manifests(manifests, manifests_filename, changed_filename=None):
+        environ = get_environ()
+        kubeconfigs[environ[specification.KUBE_URL_ENV_VAR]] = environ["KUBECONFIG"]
+
+    mocker.patch.object(deploy, "config_kubectl", side_effect=config_kubectl)
+    mocker.patch.object(deploy, "print_diff_manifests")
+    mocker.patch.object(deploy, "apply_manifests", side_effect=apply_manifests)
+    mocker.patch.object(deploy, "wait_for_rollouts")
+
+    clusters = create_clusters(
+        ["https://eu.kube.local", "https://broken.kube.local", "https://us.kube.local"],
+        tmp_path,
+    )
+
+    def create(policy):
+        return [
+            Stage("render", lambda _: ("", tmp_path / "manifests.yaml")),
+            Stage("parse", lambda _: ManifestSet([])),
+            Stage("vault", lambda _: (None, None)),
+            *(
+                stage
+                for cluster in clusters
+                for stage in deploy.create_cluster_stages(cluster, policy)
+            ),
+        ]
+
+    return clusters, kubeconfigs, create
+
+
+def test_deploy_to_clusters_with_own_kubeconfig(cluster_stages):
+    clusters, kubeconfigs, create = cluster_stages
+
+    Pipeline(create(RolloutPolicy(fail_fast=False))).run()
+
+    assert [c.status for c in clusters] == ["succeeded", "failed", "succeeded"]
+    assert kubeconfigs == {
+        "https://eu.kube.local": str(clusters[0].kubeconfig),
+        "https://us.kube.local": str(clusters[2].kubeconfig),
+    }
+    assert "Token for Kubernetes is not set." in format_statuses(clusters)
+
+
+def test_deploy_to_clusters_fails_fast(cluster_stages):
+    clusters, _, create = cluster_stages
+
+    with pytest.raises(ValueError, match="Token for Kubernetes is not set."):
+        Pipeline(create(RolloutPolicy(parallelism=1, fail_fast=True))).run()
+
+    assert clusters[1].status == "failed"
+
+
+def test_create_stages_for_clusters(tmp_path):
+    clusters = create_clusters(["https://eu.kube.local", "https://us.kube.local"], tmp_path)
+
+    stages = deploy.create_stages(
+        AbstractDeployer, tmp_path, tmp_path,
+        deploy.DeployOptions(logged_in={"docker_login": True}, clusters=clusters),
+    )
+
+    assert [s.name for s in stages] == [
+        "render", "parse", "docker_login", "scan_images", "scan_manifests", "vault",
+        "diff@eu.kube.local", "rollout@eu.kube.local",
+        "diff@us.kube.local", "rollout@us.kube.local",
+    ]
+    assert stages[2].action({}) is True
+
+
+def test_skipped_cluster_does_not_fail_pipeline(cluster_stages):
+    clusters, kubeconfigs, create = cluster_stages
+    policy = RolloutPolicy(fail_fast=True)
+    policy.mark_failed()
+    stages = [s for s in create(policy) if "broken" not in s.name]
+
+    Pipeline(stages).run()
+
+    assert [c.status for c in clusters] == ["skipped", "pending", "skipped"]
+    assert not kubeconfigs
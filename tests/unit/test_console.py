@@ -18,3 +18,30 @@ def test_write_multiline_message(capsys):
         "example of\n"
         "multiline message\n"
     )
+
+
+def test_write_prefixed_lines(capsys):
+    with console.prefixed("[api] "):
+        console.writeln("example of\nmultiline message")
+    console.writeln("not prefixed")
+
+    captured = capsys.readouterr()
+    assert captured.out == (
+        "[api] example of\n"
+        "[api] multiline message\n"
+        "not prefixed\n"
+    )
+
+
+def test_write_buffered_lines_on_exit(capsys):
+    with console.buffered():
+        with console.prefixed("[api] "):
+            console.writeln("example of")
+        assert capsys.readouterr().out == ""
+        console.writeln("buffered message")
+
+    captured = capsys.readouterr()
+    assert captured.out == (
+        "[api] example of\n"
+        "buffered message\n"
+    )
@@ -5,7 +5,7 @@ import pytest
 import yaml
 
 from kubedeployer.deployer.kustomize_deployer import KustomizeDeployer
-from kubedeployer.deployer.orthodox_deployer import concat_files, OrthodoxDeployer
+from kubedeployer.deployer.orthodox_deployer import concat_files, prepare_manifest_files, OrthodoxDeployer
 from kubedeployer.deployer.smart_deployer import SmartDeployer
 from kubedeployer.gitlab_ci import specification
 from tests.mocks import mock_settings
@@ -34,6 +34,20 @@ def test_concat_files(file_list):
         assert isinstance(element, dict) if element else element is None
 
 
+def test_prepare_manifest_files_with_same_names(tmp_path):
+    (tmp_path / "stage").mkdir()
+    files = [tmp_path / "cm.yaml", tmp_path / "stage" / "cm.yaml"]
+    files[0].write_text("kind: ConfigMap\nmetadata:\n  name: a\n")
+    files[1].write_text("kind: ConfigMap\nmetadata:\n  name: b\n")
+
+    prepared_files = prepare_manifest_files([str(f) for f in files])
+    filename = tmp_path / "manifests.yaml"
+    concat_files(filename, prepared_files)
+
+    objects = [o for o in yaml.safe_load_all(filename.read_text()) if o]
+    assert [o["metadata"]["name"] for o in objects] == ["a", "b"]
+
+
 def get_manifests_path(env_variables: dict) -> Path:
     ci_project_dir_path = Path(env_variables[specification.CI_PROJECT_DIR_ENV_VAR])
     return ci_project_dir_path / env_variables[specification.MANIFEST_FOLDER_ENV_VAR]
@@ -1,6 +1,11 @@
+import glob
+from itertools import product
+from pathlib import Path
+
 import pytest
 
-from kubedeployer.files import get_files
+from kubedeployer import files
+from kubedeployer.files import DirectoryIndex, get_files
 
 
 @pytest.fixture(autouse=True)
@@ -32,3 +37,57 @@ def test_get_files(tmp_path):
         tmp_path / "base/versions/v1.0.0/deployment.yaml",
         tmp_path / "base/versions/v1.0.0/service.yaml",
     }
+
+
+def test_get_files_skips_hidden_and_ignored_directories(tmp_path):
+    for filename in (".git/config.yaml", "base/.hidden.yaml", "node_modules/a/package.yaml"):
+        (tmp_path / filename).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / filename).write_text("")
+
+    retrieved_files = list(get_files(tmp_path / "**", extensions="*.yml|*.yaml"))
+
+    assert sorted(retrieved_files) == [
+        tmp_path / "base/namespace.yml",
+        tmp_path / "base/versions/v1.0.0/deployment.yaml",
+        tmp_path / "base/versions/v1.0.0/service.yaml",
+    ]
+
+
+def test_get_files_by_template(tmp_path):
+    retrieved_files = list(get_files(tmp_path / "base/*", extensions="*.txt|*.yaml"))
+
+    assert retrieved_files == [tmp_path / "base/versions/VERSIONS.txt"]
+
+
+def test_get_files_by_directory_index(tmp_path, mocker):
+    index = DirectoryIndex(tmp_path / "cache/index.json")
+    mocker.patch("kubedeployer.files.INDEX_MTIME_MARGIN", -1)
+    expected = set(get_files(tmp_path / "base/**", extensions="*.yaml", index=index))
+    index.save()
+
+    scan_directory = mocker.spy(files, "scan_directory")
+    index = DirectoryIndex(tmp_path / "cache/index.json")
+    assert set(get_files(tmp_path / "base/**", extensions="*.yaml", index=index)) == expected
+    scan_directory.assert_not_called()
+
+    (tmp_path / "base/versions/v1.0.0/ingress.yaml").write_text("")
+    assert set(get_files(tmp_path / "base/**", extensions="*.yaml", index=index)) == {
+        *expected, tmp_path / "base/versions/v1.0.0/ingress.yaml"
+    }
+    scan_directory.assert_called_once_with(str(tmp_path / "base/versions/v1.0.0"))
+
+
+def test_get_files_keeps_order_of_glob(tmp_path):
+    for filename in ("base/b.yaml", "base/a.yml", "base/versions/v2/c.yml", "base/versions/v2/d.yaml"):
+        (tmp_path / filename).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / filename).write_text("")
+    paths = (tmp_path / "base", tmp_path / "base/versions/**")
+    extensions = "*.yml|*.yaml"
+
+    expected = [
+        Path(f)
+        for path, ext in product(paths, extensions.split("|"))
+        for f in glob.iglob(str(path / ext), recursive=True)
+    ]
+
+    assert list(get_files(*paths, extensions=extensions)) == expected
@@ -0,0 +1,116 @@
+from typing import Dict, Optional, Tuple
+
+from kubernetes.client.rest import ApiException
+
+from kubedeployer.k8s.apply import ApiRequest, ServerSideApplier, APPLY_CONTENT_TYPE
+
+RESOURCES = {
+    "/api/v1": [
+        {"name": "services", "kind": "Service", "namespaced": True},
+        {"name": "services/status", "kind": "Service", "namespaced": True},
+        {"name": "namespaces", "kind": "Namespace", "namespaced": False},
+    ],
+    "/apis/apps/v1": [
+        {"name": "deployments", "kind": "Deployment", "namespaced": True},
+    ],
+}
+
+
+class FakeServerSideApplier(ServerSideApplier):
+
+    def __init__(self, objects: Dict[str, dict]):
+        super().__init__(api_client=None, default_namespace="default")
+        self.objects = objects
+        self.requests = []
+
+    def _request(self, request: ApiRequest) -> Tuple[int, dict]:
+        method, path, body = request.method, request.path, request.body
+        self.requests.append((method, path))
+        if path in RESOURCES:
+            return 200, {"resources": RESOURCES[path]}
+        if method == "GET":
+            items = [o for p, o in self.objects.items() if p.rpartition("/")[0] == path]
+            return 200, {"items": items}
+
+        assert request.headers["Content-Type"] == APPLY_CONTENT_TYPE
+        if body["metadata"]["name"] == "invalid":
+            raise ApiException(status=422, reason="Unprocessable Entity")
+        current = self.objects.get(path)
+        if current is None:
+            self.objects[path] = {"metadata": {"name": body["metadata"]["name"], "resourceVersion": "1"}}
+            return 201, self.objects[path]
+        if body.get("spec") != current.get("spec"):
+            version = str(int(current["metadata"]["resourceVersion"]) + 1)
+            self.objects[path] = {**body, "metadata": {**body["metadata"], "resourceVersion": version}}
+        return 200, self.objects[path]
+
+
+def service(name: str, port: int = 80, namespace: Optional[str] = None) -> dict:
+    metadata = {"name": name, **({"namespace": namespace} if namespace else {})}
+    return {"apiVersion": "v1", "kind": "Service", "metadata": metadata, "spec": {"port": port}}
+
+
+def test_apply_reports_created_configured_and_unchanged():
+    applier = FakeServerSideApplier({
+        "/api/v1/namespaces/default/services/a": {**service("a"), "metadata": {"name": "a", "resourceVersion": "1"}},
+        "/api/v1/namespaces/default/services/b": {**service("b"), "metadata": {"name": "b", "resourceVersion": "1"}},
+    })
+
+    results = list(applier.apply([service("a"), service("b", port=81), service("c")]))
+
+    assert [str(r) for r in results] == [
+        "service/a unchanged",
+        "service/b configured",
+        "service/c created",
+    ]
+
+
+def test_resources_are_discovered_and_listed_once():
+    applier = FakeServerSideApplier({})
+    deployment = {"apiVersion": "apps/v1", "kind": "Deployment", "metadata": {"name": "app"}, "spec": {}}
+
+    results = list(applier.apply([service("a"), service("b"), deployment, service("c", namespace="test")]))
+
+    assert [str(r) for r in results] == [
+        "service/a created",
+        "service/b created",
+        "deployment.apps/app created",
+        "service/c created",
+    ]
+    assert [r for r in applier.requests if r[0] == "GET"] == [
+        ("GET", "/api/v1"),
+        ("GET", "/api/v1/namespaces/default/services"),
+        ("GET", "/apis/apps/v1"),
+        ("GET", "/apis/apps/v1/namespaces/default/deployments"),
+        ("GET", "/api/v1/namespaces/test/services"),
+    ]
+
+
+def test_cluster_scoped_objects_are_applied_without_namespace():
+    applier = FakeServerSideApplier({})
+    namespace = {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": "test", "namespace": "x"}}
+
+    result, = applier.apply([namespace])
+
+    assert result.namespace is None
+    assert ("PATCH", "/api/v1/namespaces/test") in applier.requests
+
+
+def test_failure_of_one_object_keeps_others():
+    applier = FakeServerSideApplier({})
+    unknown = {"apiVersion": "v1", "kind": "Unknown", "metadata": {"name": "x"}}
+
+    results = list(applier.apply([service("invalid"), unknown, service("a")]))
+
+    assert [r.succeeded for r in results] == [False, False, True]
+    assert results[0].message == "Unprocessable Entity"
+    assert results[1].message == 'no matches for kind "Unknown" in version "v1"'
+
+
+def test_apply_object_in_dry_run_mode():
+    applier = FakeServerSideApplier({})
+
+    result = applier.apply_object(service("a"), dry_run=True)
+
+    assert str(result) == "service/a created (server dry run)"
+    assert result.succeeded
@@ -0,0 +1,115 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from kubedeployer.k8s.apply import ServerSideApplier, ApplyError
+from kubedeployer.k8s.diff import ServerSideDiffer, FieldChange, diff_values, \
+    deduplicate, strip_object
+
+
+class FakeServerSideApplier(ServerSideApplier):
+
+    def __init__(self, live: Dict[str, dict]):
+        super().__init__(api_client=None, default_namespace="default")
+        self._live = live
+        self.dry_runs = []
+        self._lock = threading.Lock()
+
+    def get_object_path(self, obj: dict) -> Tuple[str, Optional[str]]:
+        if obj["kind"] == "Unknown":
+            raise ApplyError('no matches for kind "Unknown" in version "v1"')
+        return obj["metadata"]["name"], obj["metadata"].get("namespace") or "default"
+
+    def get_object(self, obj: dict) -> Optional[dict]:
+        return self._live.get(obj["metadata"]["name"])
+
+    def patch_object(self, obj: dict, dry_run: bool = False) -> Tuple[int, dict]:
+        assert dry_run
+        with self._lock:
+            self.dry_runs.append(obj["metadata"]["name"])
+        metadata = {**obj["metadata"], "resourceVersion": "2", "managedFields": []}
+        return 200, {**obj, "metadata": metadata}
+
+
+def deployment(name: str, replicas: int, image: str = "app:1") -> dict:
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": name},
+        "spec": {"replicas": replicas, "template": {"spec": {"containers": [{"image": image}]}}},
+    }
+
+
+def test_diff_values_returns_paths_of_changed_fields():
+    old = {"spec": {"replicas": 1, "ports": [80, 81], "paused": True}}
+    new = {"spec": {"replicas": 2, "ports": [80], "selector": {"app": "a"}}}
+
+    assert list(diff_values(old, new)) == [
+        FieldChange("spec.replicas", "changed", 1, 2),
+        FieldChange("spec.ports[1]", "removed", old=81),
+        FieldChange("spec.paused", "removed", old=True),
+        FieldChange("spec.selector", "added", new={"app": "a"}),
+    ]
+
+
+def test_strip_object_removes_server_fields():
+    obj = {"metadata": {"name": "a", "resourceVersion": "1", "uid": "x"}, "status": {}, "spec": {}}
+
+    assert strip_object(obj) == {"metadata": {"name": "a"}, "spec": {}}
+    assert obj["metadata"]["uid"] == "x"
+
+
+def test_deduplicate_keeps_last_definition():
+    objects = deduplicate([deployment("a", 1), deployment("b", 1), deployment("a", 2)])
+
+    assert [(o["metadata"]["name"], o["spec"]["replicas"]) for o in objects] == [("a", 2), ("b", 1)]
+
+
+def test_diff_objects_against_cluster():
+    applier = FakeServerSideApplier({
+        "app": {**deployment("app", 1), "status": {"replicas": 1}},
+        "worker": deployment("worker", 1),
+    })
+    differ = ServerSideDiffer(applier, max_workers=4)
+    unknown = {"apiVersion": "v1", "kind": "Unknown", "metadata": {"name": "x"}}
+
+    diffs = differ.diff([
+        deployment("app", 1),
+        deployment("app", 2, image="app:2"),
+        deployment("worker", 1),
+        deployment("new", 1),
+        unknown,
+    ])
+
+    assert [d.summary() for d in diffs] == [
+        "deployment.apps/app: 2 changed (spec.replicas, spec.template.spec.containers[0].image)",
+        "deployment.apps/worker: unchanged",
+        "deployment.apps/new: created",
+        'unknown/x: failed, no matches for kind "Unknown" in version "v1"',
+    ]
+    assert "-  replicas: 1\n+  replicas: 2\n" in diffs[0].text
+    assert diffs[1].text == ""
+    assert diffs[2].text.startswith("--- live/Deployment.new\n+++ merged/Deployment.new\n")
+    assert sorted(applier.dry_runs) == ["app", "new", "worker"]
+
+
+def secret(name: str, namespace: Optional[str] = None, **data: str) -> dict:
+    metadata = {"name": name, **({"namespace": namespace} if namespace else {})}
+    return {"apiVersion": "v1", "kind": "Secret", "metadata": metadata, "data": data}
+
+
+def test_deduplicate_objects_of_default_namespace():
+    objects = deduplicate([secret("a", password="MQ=="), secret("a", "default", password="Mg==")], "default")
+
+    assert objects == [secret("a", "default", password="Mg==")]
+
+
+def test_diff_masks_values_of_secrets():
+    applier = FakeServerSideApplier({"db": secret("db", user="YWRtaW4=", password="MQ==")})
+    differ = ServerSideDiffer(applier, max_workers=1)
+
+    diff, = differ.diff([secret("db", user="YWRtaW4=", password="Mg==", token="dA==")])
+
+    assert diff.summary() == "secret/db: 1 changed, 1 added (data.***, data.***)"
+    for value in ("YWRtaW4=", "MQ==", "Mg==", "dA=="):
+        assert value not in diff.text
+    assert "-  password: '*** (before)'\n+  password: '*** (after)'\n" in diff.text
@@ -0,0 +1,90 @@
+from typing import Dict, Optional, Tuple
+
+from kubedeployer.k8s import specifications
+from kubedeployer.k8s.apply import ServerSideApplier, ApplyError
+from kubedeployer.k8s.fingerprint import add_fingerprint, fingerprint_manifests, get_fingerprint, select_changed
+from kubedeployer.manifests import ManifestSet
+
+
+class FakeServerSideApplier(ServerSideApplier):
+
+    def __init__(self, live: Dict[str, dict]):
+        super().__init__(api_client=None, default_namespace="default")
+        self._live = live
+        self.listed = []
+
+    def get_object_path(self, obj: dict) -> Tuple[str, Optional[str]]:
+        if obj["kind"] == "Unknown":
+            raise ApplyError("unknown kind")
+        return obj["metadata"]["name"], "default"
+
+    def _list_metadata(self, api_version: str, kind: str,
+                       namespace: Optional[str]) -> Dict[str, dict]:
+        self.listed.append((kind, namespace))
+        return {n: o["metadata"] for n, o in self._live.items() if o["kind"] == kind}
+
+
+def config_map(name: str, value: str, job: str = "1") -> dict:
+    return {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": {
+            "name": name,
+            "annotations": {
+                specifications.ANNOTATION_CI_JOB_REF: f"https://gitlab/jobs/{job}",
+                specifications.ANNOTATION_CI_COMMIT_REF: "main",
+            },
+        },
+        "data": {"value": value},
+    }
+
+
+def test_fingerprint_ignores_job_annotations():
+    assert get_fingerprint(config_map("a", "1", job="1")) == get_fingerprint(config_map("a", "1", job="2"))
+    assert get_fingerprint(config_map("a", "1")) != get_fingerprint(config_map("a", "2"))
+
+
+def test_fingerprint_depends_on_other_annotations():
+    obj = config_map("a", "1")
+    other = config_map("a", "1")
+    other["metadata"]["annotations"][specifications.ANNOTATION_CI_COMMIT_REF] = "v1.0"
+
+    assert get_fingerprint(obj) != get_fingerprint(other)
+
+
+def test_add_fingerprint_does_not_change_fingerprint():
+    obj = add_fingerprint(config_map("a", "1"))
+
+    assert obj["metadata"]["annotations"][specifications.ANNOTATION_FINGERPRINT] == get_fingerprint(obj)
+
+
+def test_select_only_changed_objects():
+    applier = FakeServerSideApplier({
+        "a": add_fingerprint(config_map("a", "1")),
+        "b": add_fingerprint(config_map("b", "1")),
+        "c": config_map("c", "1"),
+    })
+    unknown = {"apiVersion": "v1", "kind": "Unknown", "metadata": {"name": "x"}}
+
+    changed, unchanged = select_changed([
+        config_map("a", "1", job="2"),
+        config_map("b", "2", job="2"),
+        config_map("c", "1", job="2"),
+        config_map("d", "1", job="2"),
+        unknown,
+    ], applier)
+
+    assert [o["metadata"]["name"] for o in changed] == ["b", "c", "d", "x"]
+    assert [o["metadata"]["name"] for o in unchanged] == ["a"]
+    assert changed[0]["metadata"]["annotations"][specifications.ANNOTATION_CI_JOB_REF] == \
+           "https://gitlab/jobs/2"
+
+
+def test_fingerprint_manifests():
+    manifests = fingerprint_manifests(ManifestSet([config_map("a", "1"), config_map("b", "2")]))
+
+    assert [m.name for m in manifests] == ["a", "b"]
+    assert ManifestSet.parse(manifests.content).by_kind("ConfigMap") == list(manifests)
+    for manifest in manifests:
+        annotations = manifest["metadata"]["annotations"]
+        assert annotations[specifications.ANNOTATION_FINGERPRINT] == get_fingerprint(manifest)
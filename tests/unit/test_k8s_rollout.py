@@ -0,0 +1,171 @@
+from typing import Dict, Iterator, List, Tuple
+
+import pytest
+from kubernetes.client.rest import ApiException
+
+from kubedeployer.k8s.rollout import RolloutTracker, RolloutError, \
+    get_deployment_status, get_daemon_set_status, get_stateful_set_status
+from kubedeployer.manifests import Manifest, InvalidRolloutResource
+
+
+def deployment(name: str, updated: int, available: int, generation: int = 1) -> dict:
+    return {
+        "kind": "Deployment",
+        "metadata": {"name": name, "generation": generation, "resourceVersion": "1"},
+        "spec": {"replicas": 2},
+        "status": {
+            "observedGeneration": 1,
+            "replicas": 2,
+            "updatedReplicas": updated,
+            "availableReplicas": available,
+        },
+    }
+
+
+def manifest(kind: str, name: str) -> Manifest:
+    return Manifest({"kind": kind, "metadata": {"name": name}})
+
+
+class FakeRolloutTracker(RolloutTracker):
+
+    def __init__(self, objects: Dict[str, List[dict]], events: List[dict], timeout: float = 1):
+        # pylint: disable=super-init-not-called
+        self._objects = objects
+        self._events = events
+        self._timeout = timeout
+
+    def _list(self, kind: str, namespace: str) -> Tuple[str, List[dict]]:
+        return "1", self._objects.get(kind, [])
+
+    def _watch(self, kind: str, namespace: str, resource_version: str,
+               timeout: float) -> Iterator[dict]:
+        yield from (e for e in self._events if e["raw_object"]["kind"] == kind)
+        self._events = []
+
+
+def test_deployment_is_rolled_out():
+    done, message = get_deployment_status(deployment("app", 2, 2))
+    assert done
+    assert message == 'deployment "app" successfully rolled out'
+
+
+def test_deployment_waits_for_available_replicas():
+    done, message = get_deployment_status(deployment("app", 2, 1))
+    assert not done
+    assert "1 of 2 updated replicas are available" in message
+
+
+def test_deployment_waits_for_observed_generation():
+    done, message = get_deployment_status(deployment("app", 2, 2, generation=2))
+    assert not done
+    assert message == "Waiting for deployment spec update to be observed..."
+
+
+def test_raises_deployment_exceeded_progress_deadline():
+    obj = deployment("app", 1, 1)
+    obj["status"]["conditions"] = [
+        {"type": "Progressing", "reason": "ProgressDeadlineExceeded"}
+    ]
+    with pytest.raises(RolloutError, match="exceeded its progress deadline"):
+        get_deployment_status(obj)
+
+
+def test_daemon_set_is_rolled_out():
+    obj = {
+        "metadata": {"name": "agent", "generation": 1},
+        "spec": {},
+        "status": {
+            "observedGeneration": 1,
+            "desiredNumberScheduled": 3,
+            "updatedNumberScheduled": 3,
+            "numberAvailable": 3,
+        },
+    }
+    assert get_daemon_set_status(obj) == (True, 'daemon set "agent" successfully rolled out')
+
+
+def test_stateful_set_waits_for_update_revision():
+    obj = {
+        "metadata": {"name": "db", "generation": 1},
+        "spec": {"replicas": 1},
+        "status": {
+            "observedGeneration": 1,
+            "readyReplicas": 1,
+            "updatedReplicas": 1,
+            "currentRevision": "db-1",
+            "updateRevision": "db-2",
+        },
+    }
+    done, _ = get_stateful_set_status(obj)
+    assert not done
+
+
+def test_track_reports_rollouts_as_they_complete():
+    tracker = FakeRolloutTracker(
+        objects={"Deployment": [deployment("api", 2, 2), deployment("worker", 1, 0)]},
+        events=[{"type": "MODIFIED", "raw_object": deployment("worker", 2, 2)}],
+    )
+
+    statuses = list(tracker.track(
+        [manifest("Deployment", "api"), manifest("Deployment", "worker")],
+        default_namespace="default",
+    ))
+
+    assert [s.name for s in statuses] == ["api", "worker"]
+    assert all(s.succeeded for s in statuses)
+
+
+def test_track_reports_missing_and_timed_out_rollouts():
+    tracker = FakeRolloutTracker(
+        objects={"Deployment": [deployment("worker", 1, 0)]},
+        events=[],
+        timeout=0.1,
+    )
+
+    statuses = {
+        s.name: s
+        for s in tracker.track(
+            [manifest("Deployment", "api"), manifest("Deployment", "worker")],
+            default_namespace="default",
+        )
+    }
+
+    assert not statuses["api"].succeeded
+    assert "not found" in statuses["api"].message
+    assert not statuses["worker"].succeeded
+    assert "timed out" in statuses["worker"].message
+
+
+class ExpiredWatchRolloutTracker(FakeRolloutTracker):
+
+    def __init__(self, objects: Dict[str, List[dict]], relisted: Dict[str, List[dict]]):
+        super().__init__(objects, events=[])
+        self._relisted = relisted
+        self.lists = 0
+
+    def _list(self, kind: str, namespace: str) -> Tuple[str, List[dict]]:
+        self.lists += 1
+        return super()._list(kind, namespace)
+
+    def _watch(self, kind: str, namespace: str, resource_version: str,
+               timeout: float) -> Iterator[dict]:
+        self._objects = self._relisted
+        raise ApiException(status=410, reason="Expired: too old resource version")
+
+
+def test_track_lists_again_when_watch_is_expired():
+    tracker = ExpiredWatchRolloutTracker(
+        objects={"Deployment": [deployment("api", 1, 0)]},
+        relisted={"Deployment": [deployment("api", 2, 2)]},
+    )
+
+    statuses = list(tracker.track([manifest("Deployment", "api")], default_namespace="default"))
+
+    assert [(s.name, s.succeeded) for s in statuses] == [("api", True)]
+    assert tracker.lists == 2
+
+
+def test_raises_track_invalid_resource():
+    tracker = FakeRolloutTracker(objects={}, events=[])
+    with pytest.raises(InvalidRolloutResource):
+        list(tracker.track([manifest("Service", "api")], default_namespace="default"))
@@ -0,0 +1,196 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+import yaml
+
+from kubedeployer.k8s.specifications import ANNOTATION_CI_COMMIT_REF, ANNOTATION_CI_JOB_AUTHOR, \
+    ANNOTATION_CI_JOB_REF
+from kubedeployer.kustomize import KustomizationError, KustomizeBuildCache, \
+    create_kustomization, add_annotations, build_manifests, get_build_key, get_reachable_files, \
+    read_kustomization
+
+
+def test_create_kustomization(tmp_path):
+    kustomization = create_kustomization(tmp_path / "app", "service.yaml", "stage/deployment.yaml")
+
+    assert kustomization == tmp_path / "app/kustomization.yaml"
+    assert kustomization.read_text() == (
+        "apiVersion: kustomize.config.k8s.io/v1beta1\n"
+        "kind: Kustomization\n"
+        "resources:\n"
+        "- service.yaml\n"
+        "- stage/deployment.yaml\n"
+    )
+
+
+def test_raises_on_existing_kustomization(tmp_path):
+    create_kustomization(tmp_path)
+
+    with pytest.raises(KustomizationError, match="already exists"):
+        create_kustomization(tmp_path)
+
+
+def test_add_annotations(tmp_path):
+    kustomization = create_kustomization(tmp_path)
+    add_annotations(tmp_path, {"commit-ref": "a228d15c7", "digit-annotation": "1"})
+
+    add_annotations(tmp_path, {
+        "digit-annotation": "123",
+        "bool-annotation": "true",
+        "empty-annotation": None,
+        "empty-string-annotation": "",
+    })
+
+    content = kustomization.read_text()
+    assert "commonAnnotations:\n  commit-ref: a228d15c7\n" in content
+    assert 'digit-annotation: "123"' in content
+    assert 'bool-annotation: "true"' in content
+    assert 'empty-annotation: ""' in content
+    assert 'empty-string-annotation: ""' in content
+    assert yaml.safe_load(content)["commonAnnotations"]["digit-annotation"] == "123"
+
+
+def test_raises_on_add_empty_annotations(tmp_path):
+    create_kustomization(tmp_path)
+
+    with pytest.raises(KustomizationError, match="must specify annotation"):
+        add_annotations(tmp_path, annotations={})
+
+
+@pytest.fixture
+def overlay(tmp_path):
+    base = tmp_path / "base"
+    base.mkdir()
+    (base / "deployment.yaml").write_text("kind: Deployment\n")
+    (base / "application.properties").write_text("key=value\n")
+    (base / "unused.yaml").write_text("kind: Service\n")
+    create_kustomization(base, "deployment.yaml")
+    with open(base / "kustomization.yaml", "a") as f:
+        f.write("configMapGenerator:\n- name: config\n  files:\n  - app=application.properties\n")
+
+    stage = tmp_path / "overlays" / "stage"
+    stage.mkdir(parents=True)
+    (stage / "patch.yaml").write_text("kind: Deployment\nspec:\n  replicas: 2\n")
+    create_kustomization(stage, "../../base")
+    with open(stage / "kustomization.yaml", "a") as f:
+        f.write("patches:\n- path: patch.yaml\n")
+    return stage
+
+
+def test_get_reachable_files(tmp_path, overlay):
+    assert get_reachable_files(overlay) == {
+        tmp_path / "base/kustomization.yaml",
+        tmp_path / "base/deployment.yaml",
+        tmp_path / "base/application.properties",
+        overlay / "kustomization.yaml",
+        overlay / "patch.yaml",
+    }
+
+
+def test_get_reachable_files_of_remote_resources(tmp_path):
+    create_kustomization(tmp_path, "https://github.com/example/manifests//base?ref=v1")
+
+    assert get_reachable_files(tmp_path) is None
+    assert get_build_key(tmp_path) is None
+
+
+def test_build_key_depends_on_reachable_files(tmp_path, overlay):
+    key = get_build_key(overlay)
+    (tmp_path / "base/unused.yaml").write_text("kind: ConfigMap\n")
+    assert get_build_key(overlay) == key
+
+    (tmp_path / "base/application.properties").write_text("key=other\n")
+    assert get_build_key(overlay) != key
+
+
+def test_build_manifests_from_cache(tmp_path, overlay, mocker):
+    cache = KustomizeBuildCache(tmp_path / "cache")
+    cache_output = tmp_path / "cached.yaml"
+    cache_output.write_text("kind: Deployment\n")
+    cache.set(get_build_key(overlay), cache_output)
+    run = mocker.patch("kubedeployer.kustomize.subprocess.run")
+
+    build_manifests(overlay, tmp_path / "manifests.yaml", cache=cache)
+
+    run.assert_not_called()
+    assert (tmp_path / "manifests.yaml").read_text() == "kind: Deployment\n"
+
+
+def test_build_key_ignores_volatile_annotations(tmp_path, overlay, mocker):
+    add_annotations(overlay, {ANNOTATION_CI_JOB_REF: "https://ci/jobs/1", ANNOTATION_CI_COMMIT_REF: "main"})
+    cache = KustomizeBuildCache(tmp_path / "cache")
+    cache_output = tmp_path / "cached.yaml"
+    cache_output.write_text(
+        "kind: Deployment\n"
+        "metadata:\n"
+        "  annotations:\n"
+        f"    {ANNOTATION_CI_COMMIT_REF}: main\n"
+        f"    {ANNOTATION_CI_JOB_REF}: https://ci/jobs/1\n"
+    )
+    cache.set(get_build_key(overlay), cache_output)
+    key = get_build_key(overlay)
+
+    add_annotations(overlay, {ANNOTATION_CI_JOB_REF: "https://ci/jobs/2"})
+    assert get_build_key(overlay) == key
+    run = mocker.patch("kubedeployer.kustomize.subprocess.run")
+    build_manifests(overlay, tmp_path / "manifests.yaml", cache=cache)
+
+    run.assert_not_called()
+    annotations = yaml.safe_load((tmp_path / "manifests.yaml").read_text())["metadata"]["annotations"]
+    assert annotations == {ANNOTATION_CI_COMMIT_REF: "main", ANNOTATION_CI_JOB_REF: "https://ci/jobs/2"}
+
+    add_annotations(overlay, {ANNOTATION_CI_COMMIT_REF: "release"})
+    assert get_build_key(overlay) != key
+
+
+def fake_kustomize_build(overlay):
+    def run(cmd, **_):
+        annotations = read_kustomization(overlay / "kustomization.yaml")["commonAnnotations"]
+        lines = "".join(f"    {k}: {v}\n" for k, v in annotations.items())
+        Path(cmd.rsplit("> ", 1)[1].rstrip(")")).write_text(
+            "kind: Deployment\n"
+            "metadata:\n"
+            f"  annotations:\n{lines}"
+            "  name: app\n"
+            "spec:\n"
+            "  template:\n"
+            "    metadata:\n"
+            f"      annotations:\n{lines.replace('    ', '        ')}"
+            "---\n"
+            "kind: Service\n"
+            "metadata:\n"
+            f"  annotations:\n{lines}"
+            "  name: app\n"
+        )
+        return subprocess.CompletedProcess(cmd, returncode=0, stdout=b"", stderr=b"")
+    return run
+
+
+def test_build_manifests_from_cache_as_built(tmp_path, overlay, mocker):
+    cache = KustomizeBuildCache(tmp_path / "cache")
+    run = mocker.patch("kubedeployer.kustomize.subprocess.run", side_effect=fake_kustomize_build(overlay))
+    add_annotations(overlay, {ANNOTATION_CI_JOB_REF: "https://ci/jobs/1", ANNOTATION_CI_JOB_AUTHOR: "Jane <j@ci>"})
+    build_manifests(overlay, tmp_path / "first.yaml", cache=cache)
+
+    add_annotations(overlay, {ANNOTATION_CI_JOB_REF: "https://ci/jobs/2", ANNOTATION_CI_JOB_AUTHOR: "John <j@ci>"})
+    run.reset_mock()
+    build_manifests(overlay, tmp_path / "cached.yaml", cache=cache)
+    run.assert_not_called()
+    build_manifests(overlay, tmp_path / "built.yaml")
+
+    assert (tmp_path / "cached.yaml").read_bytes() == (tmp_path / "built.yaml").read_bytes()
+
+
+def test_build_manifests_when_cached_output_could_not_be_annotated(tmp_path, overlay, mocker):
+    add_annotations(overlay, {ANNOTATION_CI_JOB_REF: "https://ci/jobs/2"})
+    cache = KustomizeBuildCache(tmp_path / "cache")
+    cache_output = tmp_path / "cached.yaml"
+    cache_output.write_text("kind: Deployment\nmetadata: [\n")
+    cache.set(get_build_key(overlay), cache_output)
+    run = mocker.patch("kubedeployer.kustomize.subprocess.run", side_effect=fake_kustomize_build(overlay))
+
+    build_manifests(overlay, tmp_path / "manifests.yaml", cache=cache)
+
+    run.assert_called_once()
+    assert "https://ci/jobs/2" in (tmp_path / "manifests.yaml").read_text()
@@ -0,0 +1,180 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from kubedeployer.gitlab_ci import specification
+from kubedeployer.kustomize import build_manifests
+from kubedeployer.kustomize_renderer import UnsupportedKustomization, render_kustomization, \
+    normalize_manifests
+from tests.mocks import mock_settings
+
+DEPLOYMENT = """
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: app
+spec:
+  selector:
+    matchLabels:
+      app: app
+  template:
+    metadata:
+      labels:
+        app: app
+    spec:
+      containers:
+      - name: app
+        image: registry.local/app:1.0
+        env:
+        - name: A
+          value: "1"
+      - name: sidecar
+        image: nginx
+"""
+
+SERVICE = """
+apiVersion: v1
+kind: Service
+metadata:
+  name: app
+spec:
+  ports:
+  - port: 80
+"""
+
+
+def write(path: Path, **files: str) -> Path:
+    path.mkdir(parents=True, exist_ok=True)
+    for name, content in files.items():
+        (path / name.replace("__", ".")).write_text(content)
+    return path
+
+
+@pytest.fixture
+def base(tmp_path) -> Path:
+    return write(
+        tmp_path / "base",
+        deployment__yaml=DEPLOYMENT,
+        service__yaml=SERVICE,
+        kustomization__yaml="resources:\n- deployment.yaml\n- service.yaml\n",
+    )
+
+
+def render(path: Path) -> list:
+    return list(yaml.safe_load_all(render_kustomization(path)))
+
+
+def test_render_test_apps(data_path):
+    path = data_path / "manifests/apps/kustomize-app/overlays/stage"
+
+    objects = render(path)
+
+    assert [o["kind"] for o in objects] == ["ConfigMap", "Service", "Deployment"]
+    annotations = objects[2]["spec"]["template"]["metadata"]["annotations"]
+    assert annotations["ci.itlabs.io/commit-ref"] == "fake-commit"
+    assert annotations["ci.itlabs.io/commit-tag"] == ""
+    assert 'NGINX_PORT: "80"' in render_kustomization(path)
+
+
+def test_render_transformers(tmp_path, base):
+    overlay = write(
+        tmp_path / "overlay",
+        patch__yaml=(
+            "apiVersion: apps/v1\nkind: Deployment\nmetadata:\n  name: app\nspec:\n"
+            "  template:\n    spec:\n      containers:\n      - name: app\n        env:\n"
+            "        - name: B\n          value: b\n      - name: sidecar\n        $patch: delete\n"
+        ),
+        kustomization__yaml="""
+resources:
+- ../base
+namespace: stage
+commonLabels:
+  tier: web
+commonAnnotations:
+  ci.itlabs.io/commit-ref: main
+images:
+- name: registry.local/app
+  newTag: "2.0"
+patchesStrategicMerge:
+- patch.yaml
+patchesJson6902:
+- target:
+    kind: Service
+    name: app
+  patch: |-
+    - op: replace
+      path: /spec/ports/0/port
+      value: 8080
+""",
+    )
+
+    service, deployment = render(overlay)
+
+    assert service["metadata"] == {
+        "annotations": {"ci.itlabs.io/commit-ref": "main"},
+        "labels": {"tier": "web"},
+        "name": "app",
+        "namespace": "stage",
+    }
+    assert service["spec"] == {"ports": [{"port": 8080}], "selector": {"tier": "web"}}
+    assert deployment["spec"]["selector"]["matchLabels"] == {"app": "app", "tier": "web"}
+    template = deployment["spec"]["template"]
+    assert template["metadata"]["labels"] == {"app": "app", "tier": "web"}
+    assert template["metadata"]["annotations"] == {"ci.itlabs.io/commit-ref": "main"}
+    assert template["spec"]["containers"] == [{
+        "name": "app",
+        "image": "registry.local/app:2.0",
+        "env": [{"name": "A", "value": "1"}, {"name": "B", "value": "b"}],
+    }]
+
+
+def test_render_patches_by_target(tmp_path, base):
+    overlay = write(tmp_path / "overlay", kustomization__yaml="""
+resources:
+- ../base
+patches:
+- target:
+    kind: Deploy.*
+  patch: |-
+    apiVersion: apps/v1
+    kind: Deployment
+    metadata:
+      name: any
+    spec:
+      replicas: 3
+""")
+
+    _, deployment = render(overlay)
+
+    assert deployment["spec"]["replicas"] == 3
+
+
+@pytest.mark.parametrize("kustomization", [
+    "resources:\n- ../base\nnamePrefix: test-\n",
+    "resources:\n- ../base\nconfigMapGenerator:\n- name: config\n  literals:\n  - a=b\n",
+    "resources:\n- ../base/deployment.yaml\n",
+    "resources:\n- https://github.com/example/manifests//base\n",
+    "resources:\n- ../base\nimages:\n- name: nginx\n  newTag: 1.20\n",
+])
+def test_render_unsupported_kustomization(tmp_path, base, kustomization):
+    overlay = write(tmp_path / "overlay", kustomization__yaml=kustomization)
+
+    with pytest.raises(UnsupportedKustomization):
+        render_kustomization(overlay)
+
+
+def test_build_manifests_falls_back_to_kustomize(tmp_path, base, mocker):
+    overlay = write(tmp_path / "overlay", kustomization__yaml="resources:\n- ../base\nnamePrefix: a-\n")
+    run = mocker.patch("kubedeployer.kustomize.subprocess.run")
+    run.return_value.returncode = 0
+
+    with mock_settings({specification.KUSTOMIZE_ENGINE_ENV_VAR: "native"}):
+        build_manifests(overlay, tmp_path / "manifests.yaml")
+        run.assert_called_once()
+
+        run.reset_mock()
+        build_manifests(base, tmp_path / "manifests.yaml")
+        run.assert_not_called()
+    assert normalize_manifests((tmp_path / "manifests.yaml").read_text()) == \
+        normalize_manifests(render_kustomization(base))
@@ -1,6 +1,7 @@
 import pytest
 
-from kubedeployer.manifests import get_images, get_manifests
+from kubedeployer.manifests import get_images, get_manifests, ManifestSet, \
+    compile_selector, InvalidSelector, IMAGES
 
 
 @pytest.fixture
@@ -55,3 +56,58 @@ def test_get_manifests_by_kind(content):
         "application-worker",
         "application-sync",
     }
+
+
+def test_manifest_set_indexes_objects(content):
+    manifests = ManifestSet.parse(content + "\n---\napiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: config\n")
+
+    assert len(manifests) == 6
+    assert [m.name for m in manifests.by_kind("Deployment", "CronJob")] == [
+        "application",
+        "application-worker",
+        "application-sync",
+    ]
+    assert manifests.get("Service", "application").kind == "Service"
+    assert manifests.get("Service", "application", namespace="other") is None
+    assert len(manifests.by_namespace(None)) == 6
+    assert len(list(manifests.get_manifests())) == 5
+
+
+def test_manifest_set_is_accepted_instead_of_content(content):
+    manifests = ManifestSet.parse(content)
+
+    assert list(get_images(manifests, unique=True)) == list(get_images(content, unique=True))
+    assert len(list(get_manifests(manifests, kind="Job"))) == 1
+
+
+def test_compiled_selector():
+    obj = {
+        "spec": {
+            "replicas": 0,
+            "template": {"spec": {"containers": [{"image": "a"}, {"name": "b"}, {"image": "c"}]}},
+        },
+    }
+
+    assert compile_selector("spec.replicas")(obj) == 0
+    assert compile_selector("spec.template.spec.containers[*].image")(obj) == ["a", "c"]
+    assert compile_selector("spec.template.spec.containers[-1].image")(obj) == "c"
+    assert compile_selector("spec.template.spec.containers[5].image")(obj) is None
+    assert compile_selector("spec.replicas.value")(obj) is None
+    assert compile_selector("status.replicas|spec.replicas")(obj) == 0
+    assert compile_selector("spec.replicas") is compile_selector("spec.replicas")
+
+
+@pytest.mark.parametrize("path", ["", "spec..replicas", "spec[x]", "spec.[0]", "spec|"])
+def test_invalid_selector(path):
+    with pytest.raises(InvalidSelector):
+        compile_selector(path)
+
+
+def test_manifest_set_columns(content):
+    manifests = ManifestSet.parse(content)
+
+    kinds, names, images = manifests.columns("kind", "metadata.name", IMAGES)
+    assert kinds == ["Service", "Deployment", "Deployment", "Job", "CronJob"]
+    assert names[1] == "application"
+    assert images[0] == []
+    assert images[4] == ["registry.local/application:latest"]
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from kubedeployer import console
+from kubedeployer.environ import override_environ
+from kubedeployer.gitlab_ci.environment_variables import settings
+from kubedeployer.pipeline import Pipeline, Stage, PipelineError
+
+
+def test_run_stages_by_dependencies():
+    pipeline = Pipeline([
+        Stage("scan", lambda r: f"scan {r['render']}", requires=("render",)),
+        Stage("render", lambda r: "manifests"),
+    ])
+
+    assert pipeline.run() == {"render": "manifests", "scan": "scan manifests"}
+
+
+def test_run_independent_stages_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    pipeline = Pipeline([
+        Stage("render", lambda r: barrier.wait()),
+        Stage("login", lambda r: barrier.wait()),
+        Stage("apply", lambda r: "applied", requires=("render", "login")),
+    ])
+
+    assert pipeline.run()["apply"] == "applied"
+
+
+def test_failed_stage_skips_dependent_stages():
+    started = []
+
+    def fail(_):
+        raise ValueError("render failed")
+
+    pipeline = Pipeline([
+        Stage("render", fail),
+        Stage("login", lambda r: started.append("login")),
+        Stage("apply", lambda r: started.append("apply"), requires=("render",)),
+    ])
+
+    with pytest.raises(ValueError, match="render failed"):
+        pipeline.run()
+    assert started == ["login"]
+
+
+def test_print_stage_title(capsys):
+    Pipeline([Stage("render", lambda r: None, title="Building manifests..")]).run()
+
+    assert "Building manifests.." in capsys.readouterr().out
+
+
+def test_print_output_of_concurrent_stages_under_their_titles(capsys):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def action(name):
+        def run(_):
+            console.writeln(f"{name} started")
+            barrier.wait()
+            console.writeln(f"{name} finished")
+        return run
+
+    Pipeline([
+        Stage("render", action("render"), title="Building manifests.."),
+        Stage("login", action("login"), title="Logging in.."),
+    ]).run()
+
+    lines = [line for line in capsys.readouterr().out.splitlines() if line]
+    for title, name in (("Building manifests..", "render"), ("Logging in..", "login")):
+        i = next(i for i, line in enumerate(lines) if title in line)
+        assert lines[i + 1:i + 3] == [f"{name} started", f"{name} finished"]
+
+
+def test_raises_on_unknown_required_stage():
+    with pytest.raises(PipelineError, match="unknown stages: render"):
+        Pipeline([Stage("apply", lambda r: None, requires=("render",))])
+
+
+def test_raises_on_cycle():
+    with pytest.raises(PipelineError, match="cycle"):
+        Pipeline([
+            Stage("a", lambda r: None, requires=("b",)),
+            Stage("b", lambda r: None, requires=("a",)),
+        ])
+
+
+def test_stages_see_overrides_of_caller():
+    with override_environ({"MANIFEST_FOLDER": "apps/api"}):
+        results = Pipeline([
+            Stage("render", lambda r: settings.manifest_folder.value),
+        ]).run()
+
+    assert results["render"] == "apps/api"
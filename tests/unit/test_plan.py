@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from kubedeployer import plan
+from kubedeployer.gitlab_ci import specification
+from kubedeployer.gitlab_ci.environment_variables import settings
+from kubedeployer.plan import Application, Plan, PlanError, deploy_applications, format_results
+from kubedeployer.text import Envsubst
+from tests.mocks import mock_settings
+
+
+def test_load_plan(tmp_path):
+    filename = tmp_path / "plan.yaml"
+    filename.write_text(
+        "workers: 2\n"
+        "applications:\n"
+        "  - manifest_folder: apps/api\n"
+        "    environment: production\n"
+        "    variables:\n"
+        "      REPLICAS: 3\n"
+        "  - name: worker\n"
+        "    manifest_folder: apps/worker\n"
+        "    deployer: kustomize\n"
+    )
+
+    deploy_plan = Plan.load(filename)
+
+    assert deploy_plan.workers == 2
+    assert [a.title for a in deploy_plan.applications] == ["apps/api", "worker"]
+    assert deploy_plan.applications[0].get_variables() == {
+        "REPLICAS": "3",
+        specification.MANIFEST_FOLDER_ENV_VAR: "apps/api",
+        specification.ENVIRONMENT_ENV_VAR: "production",
+    }
+    assert deploy_plan.applications[1].deployer == "kustomize"
+
+
+@pytest.mark.parametrize("content", [
+    "applications:\n  - manifest_folder: apps/api\n    deployer: helm\n",
+    "applications:\n  - manifest_folder: apps/api\n  - manifest_folder: apps/api\n",
+    "applications: [",
+])
+def test_load_invalid_plan(tmp_path, content):
+    filename = tmp_path / "plan.yaml"
+    filename.write_text(content)
+
+    with pytest.raises(PlanError):
+        Plan.load(filename)
+
+
+def test_variables_of_env_files_are_overridden(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("IMAGE_TAG=1.0.0\nREPLICAS=1\n")
+    application = Application(
+        manifest_folder="apps/api",
+        env_files=[str(env_file)],
+        variables={"REPLICAS": "2"},
+    )
+
+    variables = application.get_variables()
+
+    assert variables["IMAGE_TAG"] == "1.0.0"
+    assert variables["REPLICAS"] == "2"
+
+
+class RecordingDeployer:
+    barrier = threading.Barrier(2, timeout=5)
+    rendered = {}
+
+    @staticmethod
+    def deploy(tmp_path, manifests_path):
+        RecordingDeployer.barrier.wait()
+        content = Envsubst()("replicas: $REPLICAS")
+        RecordingDeployer.rendered[settings.manifest_folder.value] = (manifests_path.name, content)
+        if settings.manifest_folder.value == "broken":
+            raise FileExistsError("Manifest folder broken doesn't exist")
+        return content, tmp_path / "manifests.yaml"
+
+
+def test_deploy_applications_concurrently_with_own_variables(monkeypatch, capsys):
+    monkeypatch.setitem(plan.DEPLOYERS, "smart", RecordingDeployer)
+    applications = [
+        Application(manifest_folder="api", variables={"REPLICAS": "2"}),
+        Application(manifest_folder="broken", variables={"REPLICAS": "1"}),
+    ]
+
+    with mock_settings({specification.MANIFEST_FOLDER_ENV_VAR: "devops/manifests"}):
+        results = deploy_applications(applications, dry_run=True, max_workers=2)
+        assert settings.manifest_folder.value == "devops/manifests"
+
+    assert RecordingDeployer.rendered == {
+        "api": ("api", "replicas: 2"),
+        "broken": ("broken", "replicas: 1"),
+    }
+    assert [(r.name, r.succeeded) for r in results] == [("api", True), ("broken", False)]
+    assert "doesn't exist" in results[1].error
+
+    out = capsys.readouterr().out
+    assert "[broken] " in out
+    assert all(line.startswith(("[api] ", "[broken] ")) for line in out.splitlines())
+
+    table = format_results(results)
+    assert "succeeded" in table and "failed" in table
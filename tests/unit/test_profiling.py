@@ -0,0 +1,69 @@
+import json
+import subprocess
+import tracemalloc
+
+import pytest
+
+from kubedeployer.profiling import Profiler
+
+
+@pytest.fixture
+def profiler() -> Profiler:
+    return Profiler()
+
+
+def test_measure_stage(profiler):
+    with profiler.measure("render"):
+        sum(i * i for i in range(100000))
+
+    [measurement] = profiler.measurements
+    assert measurement.name == "render"
+    assert measurement.wall_time > 0
+    assert measurement.cpu_time > 0
+    assert measurement.memory_peak == 0
+
+
+def test_measure_subprocess_time(profiler):
+    with profiler.measure("kubectl"):
+        subprocess.run("i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done", shell=True, check=True)
+
+    [measurement] = profiler.measurements
+    assert measurement.subprocess_time > 0
+
+
+def test_measure_memory_peak(profiler):
+    tracemalloc.start()
+    try:
+        with profiler.measure("parse"):
+            data = [bytearray(1024) for _ in range(1024)]
+            del data
+    finally:
+        tracemalloc.stop()
+
+    [measurement] = profiler.measurements
+    assert measurement.memory_peak >= 2 ** 20
+
+
+def test_measure_failed_stage(profiler):
+    with pytest.raises(ValueError):
+        with profiler.measure("apply"):
+            raise ValueError()
+
+    assert [m.name for m in profiler.measurements] == ["apply"]
+
+
+def test_format_and_dump_measurements(profiler, tmp_path):
+    with profiler.measure("render"):
+        pass
+    with profiler.measure("apply"):
+        pass
+
+    table = profiler.format()
+    assert "Stage" in table
+    assert "render" in table
+    assert "apply" in table
+
+    profiler.dump(tmp_path / "report.json")
+    data = json.loads((tmp_path / "report.json").read_text())
+    assert [m["name"] for m in data] == ["render", "apply"]
+    assert set(data[0]) == {"name", "wall_time", "cpu_time", "subprocess_time", "memory_peak"}
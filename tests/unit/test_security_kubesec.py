@@ -0,0 +1,144 @@
+from typing import List
+
+import pytest
+
+from kubedeployer.manifests import ManifestSet
+from kubedeployer.security.kubesec.cache import KubeSecurityCache, get_object_hash
+from kubedeployer.security.kubesec.data import KubeObject, KubeSecurityContent
+from kubedeployer.security.kubesec.errors import KubeSecurityError, KubeSecurityContentError
+from kubedeployer.security.kubesec.rules import KubeSecurityRuleEngine
+from kubedeployer.security.kubesec.scanner import KubeSecurityScanner
+
+
+class FakeKubeSecurityScanner(KubeSecurityScanner):
+
+    def __init__(self, cache: KubeSecurityCache):
+        super().__init__(cache=cache)
+        self.scanned = []
+
+    def scan_objects(self, objects: List[dict]) -> List[KubeObject]:
+        self.scanned.extend(o["kind"] for o in objects)
+        return [
+            KubeObject(object=f"{o['kind']}/{o['metadata']['name']}", scoring={})
+            for o in objects
+        ]
+
+
+@pytest.fixture
+def cache(tmp_path) -> KubeSecurityCache:
+    return KubeSecurityCache(tmp_path / "cache", version="v2.11.5")
+
+
+def test_object_hash_does_not_depend_on_order_of_keys():
+    assert get_object_hash({"kind": "Service", "metadata": {"name": "a", "namespace": "b"}}) == \
+           get_object_hash({"metadata": {"namespace": "b", "name": "a"}, "kind": "Service"})
+
+
+def test_scan_only_changed_objects(cache, data_path):
+    filename = data_path / "manifests/manifests.yaml"
+
+    first = FakeKubeSecurityScanner(cache)
+    first.scan(filename)
+    assert first.scanned == ["Service", "Deployment", "Deployment", "Job", "CronJob"]
+
+    filename.write_text(filename.read_text().replace("replicas: 1", "replicas: 2", 1))
+    second = FakeKubeSecurityScanner(cache)
+    content = second.scan(filename)
+
+    assert second.scanned == ["Deployment"]
+    assert [o.object for o in content] == [
+        "Service/application",
+        "Deployment/application",
+        "Deployment/application-worker",
+        "Job/application-migrations",
+        "CronJob/application-sync",
+    ]
+
+
+def get_scoring_ids(kube_object) -> dict:
+    return {level: [r.id for r in records] for level, records in kube_object.scoring.items()}
+
+
+def test_rule_engine_scores_objects_like_kubesec(data_path):
+    content = KubeSecurityRuleEngine().scan(data_path / "manifests/manifests.yaml")
+
+    assert [o.object for o in content] == [
+        "Service/application.default",
+        "Deployment/application.default",
+        "Deployment/application-worker.default",
+        "Job/application-migrations.default",
+        "CronJob/application-sync.default",
+    ]
+    assert content[0].scoring == {}
+    assert set(content[1].scoring) == {"advise"}
+
+
+def test_rule_engine_reports_critical_passed_and_advise():
+    obj = {
+        "apiVersion": "v1",
+        "kind": "Pod",
+        "metadata": {"name": "pod", "namespace": "test"},
+        "spec": {
+            "hostNetwork": True,
+            "securityContext": {"runAsNonRoot": True},
+            "containers": [{
+                "name": "app",
+                "image": "app",
+                "securityContext": {"privileged": True, "capabilities": {"drop": ["ALL"]}},
+                "resources": {"limits": {"cpu": "1", "memory": "1Gi"}},
+            }],
+        },
+    }
+
+    kube_object, = KubeSecurityRuleEngine().scan_objects([obj])
+    scoring = get_scoring_ids(kube_object)
+
+    assert kube_object.object == "Pod/pod.test"
+    assert scoring["critical"] == ["HostNetwork", "Privileged"]
+    assert scoring["passed"] == ["CapDropAll", "CapDropAny", "LimitsCPU", "LimitsMemory", "RunAsNonRoot"]
+    assert "RequestsCPU" in scoring["advise"]
+    assert "VolumeClaimRequestsStorage" not in scoring["advise"]
+
+
+def test_rule_engine_raises_scanning_unsupported_file():
+    with pytest.raises(KubeSecurityError):
+        KubeSecurityRuleEngine().scan(__file__)
+
+
+def test_scan_parsed_manifests(data_path):
+    manifests = ManifestSet.parse((data_path / "manifests/manifests.yaml").read_text())
+
+    content = KubeSecurityRuleEngine().scan_manifests(manifests)
+
+    assert len(content) == 5
+    assert content[1].object == "Deployment/application.default"
+
+
+class BundleKubeSecurityScanner(FakeKubeSecurityScanner):
+
+    def scan_objects(self, objects: List[dict]) -> List[KubeObject]:
+        raise KubeSecurityContentError("kubesec returned 4 results for 5 objects")
+
+    def scan_bundle(self, objects: List[dict]) -> KubeSecurityContent:
+        self.scanned.append("bundle")
+        return KubeSecurityContent.parse_obj([])
+
+
+def test_scan_manifests_falls_back_to_bundle(cache, data_path):
+    manifests = ManifestSet.parse((data_path / "manifests/manifests.yaml").read_text())
+    scanner = BundleKubeSecurityScanner(cache)
+
+    scanner.scan_manifests(manifests)
+
+    assert scanner.scanned == ["bundle"]
+
+
+def test_failure_of_cache_keeps_scanned_objects(cache, data_path, mocker):
+    manifests = ManifestSet.parse((data_path / "manifests/manifests.yaml").read_text())
+    mocker.patch.object(cache, "set", side_effect=OSError("No space left on device"))
+    scanner = FakeKubeSecurityScanner(cache)
+
+    content = scanner.scan_manifests(manifests)
+
+    assert len(content) == 5
+    assert scanner.scanned == ["Service", "Deployment", "Deployment", "Job", "CronJob"]
@@ -0,0 +1,173 @@
+import time
+from unittest import mock
+
+import pytest
+
+from kubedeployer.security.trivy.cache import TrivyCache
+from kubedeployer.security.trivy.data import TrivyContent, TrivyResult, \
+    TrivyVulnerability
+from kubedeployer.security.trivy.errors import TrivyError, TrivyTimeoutError
+from kubedeployer.security.trivy.formatters import TrivyConsoleStringFormatter
+from kubedeployer.security.trivy.report import TrivyReport
+from kubedeployer.security.trivy.scanner import TrivyScanner
+
+
+class FakeTrivyScanner(TrivyScanner):
+
+    def __init__(self, delays: dict):
+        self._delays = delays
+        self.scanned = []
+
+    def scan(self, image: str, subprocess_timeout) -> TrivyContent:
+        self.scanned.append(image)
+        delay = self._delays[image]
+        if delay is None:
+            raise TrivyError(f"{image} not found")
+        if delay > subprocess_timeout:
+            time.sleep(subprocess_timeout)
+            raise TrivyTimeoutError(f"{image} timeout")
+        time.sleep(delay)
+        return TrivyContent()
+
+
+def create_report(delays: dict) -> TrivyReport:
+    return TrivyReport(
+        scanner=FakeTrivyScanner(delays),
+        formatter=TrivyConsoleStringFormatter(),
+    )
+
+
+def test_build_reports_concurrently_in_completion_order():
+    report = create_report({"slow": 0.3, "fast": 0.01})
+
+    results = list(report.build_concurrently(["slow", "fast"], 2, timeout=5))
+
+    assert [r.image for r in results] == ["fast", "slow"]
+    assert all(r.report and r.error is None for r in results)
+
+
+def test_failure_of_one_image_keeps_others():
+    report = create_report({"missing": None, "nginx": 0.01})
+
+    results = {
+        r.image: r
+        for r in report.build_concurrently(["missing", "nginx"], 2, timeout=5)
+    }
+
+    assert isinstance(results["missing"].error, TrivyError)
+    assert "Scan image: nginx" in results["nginx"].report
+
+
+def test_images_exceeding_time_budget_are_reported_as_timeout():
+    report = create_report({"a": 0.01, "b": 5, "c": 5})
+
+    started = time.monotonic()
+    results = {
+        r.image: r
+        for r in report.build_concurrently(["a", "b", "c"], 1, timeout=0.5)
+    }
+
+    assert time.monotonic() - started < 2
+    assert results["a"].error is None
+    assert isinstance(results["b"].error, TrivyTimeoutError)
+    assert isinstance(results["c"].error, TrivyTimeoutError)
+
+
+@pytest.fixture
+def trivy_content() -> TrivyContent:
+    return TrivyContent(results=[TrivyResult(vulnerabilities=[
+        TrivyVulnerability(
+            severity="CRITICAL",
+            vulnerability_id="CVE-2022-0001",
+            pkg_name="openssl",
+            title="example",
+        )
+    ])])
+
+
+def test_cache_returns_stored_content(tmp_path, trivy_content):
+    cache = TrivyCache(tmp_path, ttl=60, version="0.30.4/db-1")
+    cache.set("sha256:1", trivy_content)
+
+    assert cache.get("sha256:1") == trivy_content
+    assert cache.get("sha256:2") is None
+
+
+def test_cache_ignores_other_database_version(tmp_path, trivy_content):
+    TrivyCache(tmp_path, ttl=60, version="0.30.4/db-1").set("sha256:1", trivy_content)
+
+    assert TrivyCache(tmp_path, ttl=60, version="0.30.4/db-2").get("sha256:1") is None
+
+
+def test_cache_ignores_expired_content(tmp_path, trivy_content):
+    cache = TrivyCache(tmp_path, ttl=60, version="0.30.4/db-1")
+    cache.set("sha256:1", trivy_content)
+
+    with mock.patch("time.time", return_value=time.time() + 61):
+        assert cache.get("sha256:1") is None
+
+
+def test_images_with_same_digest_are_scanned_once():
+    scanner = FakeTrivyScanner({"app:1.0": 0, "app:latest": 0, "nginx": 0})
+    digests = {"app:1.0": "sha256:1", "app:latest": "sha256:1", "nginx": "sha256:2"}
+    report = TrivyReport(
+        scanner=scanner,
+        formatter=TrivyConsoleStringFormatter(),
+        digest_resolver=lambda image, _: digests.get(image),
+    )
+
+    results = list(report.build_concurrently(digests, 2, timeout=5))
+
+    assert sorted(r.image for r in results) == ["app:1.0, app:latest", "nginx"]
+    assert sorted(scanner.scanned) == ["app:1.0", "nginx"]
+
+
+def test_cached_images_are_not_scanned(tmp_path, trivy_content):
+    cache = TrivyCache(tmp_path, ttl=60, version="0.30.4/db-1")
+    cache.set("sha256:1", trivy_content)
+    scanner = FakeTrivyScanner({"app": 0, "nginx": 0})
+    report = TrivyReport(
+        scanner=scanner,
+        formatter=TrivyConsoleStringFormatter(),
+        cache=cache,
+        digest_resolver=lambda image, _: {"app": "sha256:1", "nginx": "sha256:2"}.get(image),
+    )
+
+    results = {r.image: r for r in report.build_concurrently(["app", "nginx"], 2, timeout=5)}
+
+    assert scanner.scanned == ["nginx"]
+    assert "CVE-2022-0001" in results["app"].report
+    assert cache.get("sha256:2") == TrivyContent()
+
+
+def test_failure_of_cache_keeps_scanned_image(tmp_path):
+    cache = TrivyCache(tmp_path, ttl=60, version="0.30.4/db-1")
+    report = TrivyReport(
+        scanner=FakeTrivyScanner({"app": 0}),
+        formatter=TrivyConsoleStringFormatter(),
+        cache=cache,
+        digest_resolver=lambda image, _: "sha256:1",
+    )
+
+    with mock.patch.object(cache, "set", side_effect=OSError("Read-only file system")):
+        results = list(report.build_concurrently(["app"], 1, timeout=5))
+
+    assert [(r.image, r.error) for r in results] == [("app", None)]
+
+
+def test_digests_are_resolved_within_time_budget():
+    timeouts = []
+
+    def resolve(image: str, timeout: float) -> str:
+        timeouts.append(timeout)
+        return f"sha256:{image}"
+
+    report = TrivyReport(
+        scanner=FakeTrivyScanner({"app": 0}),
+        formatter=TrivyConsoleStringFormatter(),
+        digest_resolver=resolve,
+    )
+
+    list(report.build_concurrently(["app"], 1, timeout=5))
+
+    assert len(timeouts) == 1 and 0 < timeouts[0] <= 5
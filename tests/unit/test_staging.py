@@ -0,0 +1,38 @@
+from kubedeployer.staging import stage_files, staging_area
+from kubedeployer.text import Envsubst
+
+
+def test_stage_files(tmp_path):
+    source = tmp_path / "manifests"
+    (source / "stage").mkdir(parents=True)
+    plain = source / "service.yaml"
+    plain.write_text("kind: Service\nmetadata:\n  name: $$ESCAPED\n")
+    templated = source / "stage" / "deployment.yaml"
+    templated.write_text("kind: Deployment\nmetadata:\n  name: ${NAME}\n")
+
+    with staging_area(root=tmp_path) as staging:
+        staged = stage_files(source, staging, [plain, templated], Envsubst({"NAME": "app"}))
+
+        assert staged == [staging / "service.yaml", staging / "stage" / "deployment.yaml"]
+        assert staged[0].stat().st_ino == plain.stat().st_ino
+        assert staged[1].read_text() == "kind: Deployment\nmetadata:\n  name: app\n"
+
+    assert not staging.exists()
+    assert templated.read_text() == "kind: Deployment\nmetadata:\n  name: ${NAME}\n"
+
+
+def test_stage_files_writes_content_if_not_linked(tmp_path, mocker):
+    source = tmp_path / "manifests"
+    source.mkdir()
+    plain = source / "service.yaml"
+    plain.write_text("kind: Service\n")
+    link = mocker.patch("kubedeployer.staging.os.link", side_effect=OSError(18, "Invalid cross-device link"))
+    copy = mocker.patch("kubedeployer.staging.shutil.copyfile")
+
+    with staging_area(root=tmp_path) as staging:
+        staged = stage_files(source, staging, [plain], Envsubst())
+
+        link.assert_called_once()
+        copy.assert_not_called()
+        assert staged[0].read_text() == "kind: Service\n"
+        assert staged[0].stat().st_ino != plain.stat().st_ino
@@ -3,7 +3,7 @@ import os
 import pytest
 from unittest import mock
 
-from kubedeployer.text import envsubst
+from kubedeployer.text import envsubst, Envsubst
 
 
 @pytest.fixture(autouse=True)
@@ -87,3 +87,29 @@ def test_envsubst_replace_variables_in_file(data_path):
         assert "- host: host.local" in retrieved
         assert "- path: /example" in retrieved
         assert "name: example" in retrieved
+
+
+def test_envsubst_uses_frozen_variables():
+    substitute = Envsubst()
+    os.environ["VARIABLE"] = "changed"
+
+    assert substitute("$VARIABLE ${VARIABLE} $$VARIABLE") == "test test $$VARIABLE"
+
+
+def test_envsubst_file_by_chunks(data_path, tmp_path):
+    src = data_path / "manifests/env-manifest.yaml"
+    dst = tmp_path / "manifest.yaml"
+
+    Envsubst().file(src, dst, chunk_size=7)
+
+    assert dst.read_text() == envsubst(src.read_text())
+
+
+def test_envsubst_file_with_lines_longer_than_chunk(tmp_path):
+    filename = tmp_path / "manifest.yaml"
+    filename.write_text("$VARIABLE-" * 10 + "\n$$VARIABLE $DIGIT_VARIABLE")
+
+    Envsubst().file(filename, chunk_size=4)
+
+    assert filename.read_text() == "test-" * 10 + "\n$$VARIABLE 123"
+    assert list(tmp_path.iterdir()) == [filename]
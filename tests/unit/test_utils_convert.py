@@ -1,6 +1,6 @@
 import pytest
 
-from kubedeployer.utils.convert import str_to_bool
+from kubedeployer.utils.convert import str_to_bool, duration_to_seconds
 
 
 @pytest.mark.parametrize(
@@ -26,3 +26,18 @@ def test_raises_str_to_bool_on_get_invalid_value_type(value):
 def test_raises_str_to_bool_on_invalid_value(value):
     with pytest.raises(ValueError):
         str_to_bool(value)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (("10m", 600), ("1h", 3600), ("1m30s", 90), ("45s", 45), ("1.5m", 90),
+     ("600", 600), ("0", 0), (" 90 ", 90)),
+)
+def test_duration_to_seconds(value, expected):
+    assert duration_to_seconds(value) == expected
+
+
+@pytest.mark.parametrize("value", ("", "10x", "m10", "-10", "10 m"))
+def test_raises_duration_to_seconds_on_invalid_value(value):
+    with pytest.raises(ValueError):
+        duration_to_seconds(value)
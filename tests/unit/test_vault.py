@@ -1,9 +1,19 @@
+import time
 from typing import Any, Dict, Optional
+from unittest import mock
 
 import pytest
+from hvac.exceptions import Forbidden, InvalidPath
 
-from kubedeployer.vault.client import VaultClient
-from kubedeployer.vault.service import VaultService
+from kubedeployer.deploy import read_kube_token
+from kubedeployer.gitlab_ci import specification
+from kubedeployer.vault.client import VaultClient, HvacClient
+from kubedeployer.vault.factory import VaultServiceFactory, VaultPathIndexFactory, \
+    HvacClientFactory
+from kubedeployer.vault.index import VaultPathIndex
+from kubedeployer.vault.service import VaultService, order_by_similarity
+from kubedeployer.vault.token import VaultToken, VaultTokenCache
+from tests.mocks import mock_settings
 
 
 class FakeVaultClient(VaultClient):
@@ -86,3 +96,259 @@ def test_list_secrets_by_complex_template_path(vault_client):
         "secret/common/development/gamma/default",
         "secret/common/production/alpha/default",
     ]
+
+
+class FakeKvClient(VaultClient):
+
+    def __init__(self, secrets: Dict[str, Dict[str, Any]]):
+        self._secrets = secrets
+        self.read = []
+
+    def read_secret(self, path: str) -> Dict[str, Any]:
+        self.read.append(path)
+        if path not in self._secrets:
+            raise InvalidPath()
+        return {"data": {"data": self._secrets[path]}}
+
+
+def test_order_paths_by_similarity():
+    paths = [
+        "secret/k8s/alpha/default",
+        "secret/k8s/gamma-stage/default",
+        "secret/k8s/gamma/default",
+    ]
+
+    ordered = order_by_similarity(paths, "https://gamma.k8s.example.com:6443")
+
+    assert ordered[0] == "secret/k8s/gamma/default"
+    assert ordered[-1] == "secret/k8s/alpha/default"
+
+
+def test_find_secret_stops_when_secret_is_found():
+    secrets = {f"secret/{i}": {"url": f"https://{i}"} for i in range(100)}
+    client = FakeKvClient(secrets)
+    service = VaultService(client)
+
+    found = service.find_secret(
+        ["secret/missing", *secrets],
+        predicate=lambda data: data["url"] == "https://3",
+        max_workers=2,
+    )
+
+    assert found == ("secret/3", {"url": "https://3"})
+    assert len(client.read) < 10
+
+
+def test_find_secret_returns_none_if_secret_not_found():
+    service = VaultService(FakeKvClient({"secret/a": {"url": "https://a"}}))
+
+    assert service.find_secret(["secret/a", "secret/b"], lambda d: False, max_workers=4) is None
+
+
+def test_vault_path_index_keeps_paths_encrypted(tmp_path):
+    filename = tmp_path / "vault" / "index"
+    index = VaultPathIndex(filename, secret="secret-id")
+
+    index.set("https://k8s.example.com", "secret/k8s/production/default")
+
+    assert index.get("https://k8s.example.com") == "secret/k8s/production/default"
+    assert b"secret/k8s" not in filename.read_bytes()
+    assert filename.stat().st_mode & 0o777 == 0o600
+
+
+def test_vault_path_index_is_empty_for_other_secret(tmp_path):
+    filename = tmp_path / "index"
+    VaultPathIndex(filename, secret="secret-id").set("https://k8s", "secret/k8s/default")
+
+    index = VaultPathIndex(filename, secret="other-secret-id")
+
+    assert index.get("https://k8s") is None
+    index.set("https://other", "secret/other/default")
+    assert index.get("https://other") == "secret/other/default"
+
+
+def test_vault_path_index_removes_path(tmp_path):
+    index = VaultPathIndex(tmp_path / "index", secret="secret-id")
+    index.set("https://k8s", "secret/k8s/default")
+
+    index.remove("https://k8s")
+
+    assert index.get("https://k8s") is None
+
+
+def test_read_kube_token_uses_warm_index(mocker, tmp_path):
+    client = FakeKvClient({
+        "secret/k8s/alpha/default": {"url": "https://alpha", "token": "t1"},
+        "secret/k8s/gamma/default": {"url": "https://gamma", "token": "t2"},
+    })
+    mocker.patch.object(VaultService, "get_paths", return_value=["secret/k8s/alpha", "secret/k8s/gamma"])
+    mocker.patch.object(VaultServiceFactory, "create_vault_service", return_value=VaultService(client))
+    variables = {
+        specification.CACHE_DIR_ENV_VAR: str(tmp_path),
+        specification.VAULT_APPROLE_SECRET_ENV_VAR: "secret-id",
+        specification.VAULT_SECRETS_PREFIX_ENV_VAR: "secret/k8s/*/default",
+    }
+
+    with mock_settings(variables):
+        assert read_kube_token("https://gamma") == "t2"
+        client.read.clear()
+
+        assert read_kube_token("https://gamma") == "t2"
+        assert client.read == ["secret/k8s/gamma/default"]
+
+
+def test_read_kube_token_rebuilds_stale_index(mocker, tmp_path):
+    client = FakeKvClient({
+        "secret/k8s/alpha/default": {"url": "https://alpha", "token": "t1"},
+        "secret/k8s/gamma/default": {"url": "https://gamma", "token": "t2"},
+    })
+    mocker.patch.object(VaultService, "get_paths", return_value=["secret/k8s/alpha", "secret/k8s/gamma"])
+    mocker.patch.object(VaultServiceFactory, "create_vault_service", return_value=VaultService(client))
+    variables = {
+        specification.CACHE_DIR_ENV_VAR: str(tmp_path),
+        specification.VAULT_APPROLE_SECRET_ENV_VAR: "secret-id",
+        specification.VAULT_SECRETS_PREFIX_ENV_VAR: "secret/k8s/*/default",
+    }
+
+    with mock_settings(variables):
+        VaultPathIndexFactory.create_vault_path_index().set("https://gamma", "secret/k8s/alpha/default")
+
+        assert read_kube_token("https://gamma") == "t2"
+        assert VaultPathIndexFactory.create_vault_path_index().get("https://gamma") == \
+               "secret/k8s/gamma/default"
+
+
+def test_read_kube_token_when_index_could_not_be_written(mocker, tmp_path):
+    client = FakeKvClient({"secret/k8s/gamma/default": {"url": "https://gamma", "token": "t2"}})
+    mocker.patch.object(VaultService, "get_paths", return_value=["secret/k8s/gamma"])
+    index = VaultPathIndex(tmp_path / "index", secret="secret-id")
+    mocker.patch.object(index, "set", side_effect=PermissionError("read-only file system"))
+
+    with mock_settings({specification.VAULT_SECRETS_PREFIX_ENV_VAR: "secret/k8s/*/default"}):
+        assert read_kube_token("https://gamma", VaultService(client), index) == "t2"
+
+
+class CountingVaultClient(FakeVaultClient):
+
+    def __init__(self, secret_store: Dict[str, Any]):
+        super().__init__(secret_store)
+        self.listed = []
+
+    def list_secrets(self, path: str) -> Dict[str, Any]:
+        self.listed.append(path)
+        return super().list_secrets(path)
+
+
+def test_get_paths_by_double_template(vault_client):
+    service = VaultService(vault_client)
+    paths = service.get_paths("secret/common/*/*")
+    assert paths == [
+        "secret/common/development/alpha",
+        "secret/common/development/gamma",
+        "secret/common/production/alpha",
+    ]
+
+
+def test_get_paths_by_several_templates_lists_every_location_once(vault_client):
+    client = CountingVaultClient({"secret/": vault_client._secret_store["secret/"]})
+    service = VaultService(client, max_workers=4)
+
+    paths = service.get_paths(
+        "secret/common/*/alpha",
+        "secret/common/*/*",
+        "secret/common/production",
+    )
+
+    assert paths == [
+        "secret/common/development/alpha",
+        "secret/common/production/alpha",
+        "secret/common/development/alpha",
+        "secret/common/development/gamma",
+        "secret/common/production/alpha",
+        "secret/common/production",
+    ]
+    assert sorted(client.listed) == [
+        "secret/common",
+        "secret/common/development",
+        "secret/common/production",
+    ]
+
+
+class FakeHvacClient:
+
+    def __init__(self, lease_duration: int = 3600):
+        self.token = None
+        self.logins = 0
+        self.renewals = 0
+        self._lease_duration = lease_duration
+
+    def auth_approle(self, role_id: str, secret_id: str) -> Dict[str, Any]:
+        self.logins += 1
+        return {"auth": {
+            "client_token": f"token-{self.logins}",
+            "lease_duration": self._lease_duration,
+            "renewable": True,
+        }}
+
+    def renew_token(self) -> Dict[str, Any]:
+        self.renewals += 1
+        return {"auth": {
+            "client_token": self.token,
+            "lease_duration": self._lease_duration,
+            "renewable": True,
+        }}
+
+
+def test_vault_token_cache_keeps_token_between_runs(tmp_path):
+    filename = tmp_path / "vault-token"
+    token = VaultToken(token="s.1", ttl=3600, renewable=True, expires=time.time() + 3600)
+
+    VaultTokenCache(filename, secret="secret-id").set(token)
+
+    assert VaultTokenCache(filename, secret="secret-id").get() == token
+    assert VaultTokenCache(filename, secret="other-secret-id").get() is None
+    assert filename.stat().st_mode & 0o777 == 0o600
+
+
+def test_vault_token_cache_ignores_expired_token(tmp_path):
+    cache = VaultTokenCache(tmp_path / "vault-token", secret="secret-id")
+    cache.set(VaultToken(token="s.1", ttl=3600, renewable=True, expires=time.time() + 10))
+
+    assert cache.get() is None
+
+
+def test_authenticate_reuses_and_renews_cached_token(tmp_path):
+    cache = VaultTokenCache(tmp_path / "vault-token", secret="secret-id")
+    hvac_client = FakeHvacClient()
+
+    assert HvacClientFactory.authenticate(hvac_client, cache) == "token-1"
+    assert HvacClientFactory.authenticate(hvac_client, cache) == "token-1"
+    assert (hvac_client.logins, hvac_client.renewals) == (1, 0)
+
+    with mock.patch("time.time", return_value=time.time() + 2000):
+        assert HvacClientFactory.authenticate(hvac_client, cache) == "token-1"
+    assert (hvac_client.logins, hvac_client.renewals) == (1, 1)
+
+    with mock.patch("time.time", return_value=time.time() + 6000):
+        assert HvacClientFactory.authenticate(hvac_client, cache) == "token-2"
+    assert hvac_client.logins == 2
+
+
+def test_authenticate_when_token_could_not_be_cached(tmp_path):
+    cache = VaultTokenCache(tmp_path / "vault-token", secret="secret-id")
+    hvac_client = FakeHvacClient()
+
+    with mock.patch.object(cache, "set", side_effect=PermissionError("read-only file system")):
+        assert HvacClientFactory.authenticate(hvac_client, cache) == "token-1"
+    assert hvac_client.logins == 1
+
+
+def test_hvac_client_logs_in_again_on_forbidden():
+    hvac_client = mock.Mock(token="expired")
+    read = hvac_client.secrets.kv.v2.read_secret_version
+    read.side_effect = [Forbidden(), {"data": {"data": {"url": "https://k8s"}}}]
+    client = HvacClient(hvac_client, mount_point="secret", login=lambda: "new-token")
+
+    assert client.read_secret("secret/k8s/default") == {"data": {"data": {"url": "https://k8s"}}}
+    assert hvac_client.token == "new-token"
+    assert read.call_count == 2